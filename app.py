@@ -1,9 +1,21 @@
 import streamlit as st
 import pandas as pd
-import joblib
 from datetime import datetime
 import os
 import tempfile
+from urllib.parse import urlsplit
+
+from dataset import load_dataset
+from attribution import ATTRIBUTION_METHODS, explain_top_k
+from inference import LiveArtifacts
+from metrics import METRICS, profile_request
+from model_bundle import BundleError
+from prediction_cache import PredictionCache
+from prediction_server import PredictionClient
+from record_export import EXPORT_FORMATS, RecordExporter, available_formats
+from record_search import RecordSearchIndex
+from record_store import open_record_store
+from symptoms import display_name
 
 # Set page config as the very first Streamlit command
 st.set_page_config(
@@ -14,15 +26,23 @@ st.set_page_config(
 )
 
 # Load the model and necessary files - after page config
+# Set MEDISCAN_MODEL=fast to serve the distilled fast model instead of the hybrid one.
+# A new bundle version (e.g. from online_update.py) is picked up without a restart;
+# MEDISCAN_RELOAD_INTERVAL sets how often, in seconds, the bundle is checked.
+# With MEDISCAN_PREDICTION_URL set, predictions go to a prediction_server.py
+# instance and this process only loads the encoders and recommendations.
+PREDICTION_URL = os.environ.get("MEDISCAN_PREDICTION_URL")
+
 @st.cache_resource
 def load_model_files():
-    model = joblib.load("hybrid_model.pkl")
-    vectorizer = joblib.load("vectorizer.pkl")
-    encoder = joblib.load("encoder.pkl")
-    data = pd.read_csv("merged_df.csv")
-    return model, vectorizer, encoder, data
+    return LiveArtifacts(check_interval=float(os.environ.get("MEDISCAN_RELOAD_INTERVAL", 5)),
+                         with_model=not PREDICTION_URL)
 
-model, vectorizer, encoder, data = load_model_files()
+try:
+    model_version, (model, symptom_encoder, encoder, recommendations) = load_model_files().current()
+except BundleError as e:
+    st.error(f"Could not load the model bundle: {e}")
+    st.stop()
 
 # Define path for data storage with Streamlit Cloud compatibility
 def get_data_path():
@@ -39,62 +59,100 @@ def get_data_path():
         return os.path.join(temp_dir, "patient_records.csv")
 
 PATIENT_DATA_FILE = get_data_path()
+METRICS_FILE = os.environ.get("MEDISCAN_METRICS_FILE")
+
+RECORD_STORE = open_record_store(PATIENT_DATA_FILE)
 
-# Function to save patient data to CSV with improved error handling and validation
+# Function to save patient data with improved error handling and validation.
+# Records are appended to the store, so a save costs the same no matter how
+# many patients are already on file.
 def save_patient_data(patient_name, patient_age, selected_symptoms, predicted_disease, medications, diet, workout, precautions):
     try:
         # Use local time instead of UTC to match the patient's actual check-in time
         timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         
-        # Create a dataframe for the new record
-        new_record = pd.DataFrame({
-            'Timestamp': [timestamp],
-            'Patient Name': [patient_name],
-            'Patient Age': [patient_age],
-            'Symptoms': [", ".join(selected_symptoms)],
-            'Predicted Disease': [predicted_disease],
-            'Medications': [medications],
-            'Diet Recommendations': [diet],
-            'Workout Recommendations': [workout],
-            'Precautions': [precautions]
-        })
-        
-        # Check if file exists and load it, or create a new DataFrame
-        if os.path.exists(PATIENT_DATA_FILE):
-            try:
-                existing_data = pd.read_csv(PATIENT_DATA_FILE)
-                # Validate the loaded data
-                if len(existing_data) == 0 or not all(col in existing_data.columns for col in new_record.columns):
-                    st.warning("Existing data file has incorrect format. Creating a new file.")
-                    updated_data = new_record
-                else:
-                    updated_data = pd.concat([existing_data, new_record], ignore_index=True)
-            except Exception as e:
-                st.warning(f"Could not read existing data file: {str(e)}. Creating a new file.")
-                updated_data = new_record
-        else:
-            updated_data = new_record
-        
-        # Save to CSV (primary storage)
-        updated_data.to_csv(PATIENT_DATA_FILE, index=False)
-        
-        # Also save to Excel for better formatting (if openpyxl is installed)
-        try:
-            excel_file = PATIENT_DATA_FILE.replace('.csv', '.xlsx')
-            updated_data.to_excel(excel_file, index=False, engine='openpyxl')
-        except Exception as e:
-            pass  # Silently fail if Excel export isn't available
+        new_record = {
+            'Timestamp': timestamp,
+            'Patient Name': patient_name,
+            'Patient Age': patient_age,
+            'Symptoms': ", ".join(selected_symptoms),
+            'Predicted Disease': predicted_disease,
+            'Medications': str(medications),
+            'Diet Recommendations': str(diet),
+            'Workout Recommendations': workout,
+            'Precautions': precautions
+        }
         
-        return True, updated_data
+        with METRICS.timer("save_record"):
+            RECORD_STORE.append(new_record)
+        return True, new_record
     except Exception as e:
         import traceback
         st.error(f"Error saving data: {str(e)}")
         st.error(traceback.format_exc())
         return False, None
 
-# Extract symptom options
+# Extract symptom options once; every widget interaction reruns this script
 symptom_columns = ["Symptom_1", "Symptom_2", "Symptom_3", "Symptom_4"]
-symptom_options = sorted(data[symptom_columns].stack().dropna().unique())
+
+@st.cache_data
+def load_symptom_catalog():
+    return len(load_dataset()["symptoms"])
+
+symptom_record_count = load_symptom_catalog()
+
+# One option per canonical symptom ID, so spelling variants in the raw data
+# (" skin_rash", "dischromic _patches") no longer show up as separate entries
+symptom_options = list(symptom_encoder.get_feature_names_out())
+symptom_index = symptom_encoder.symptom_index
+
+# Number of diagnoses shown in the differential
+DIFFERENTIAL_SIZE = 3
+# How "why this disease" weighs the symptoms: occlusion (exact, same model call) or table (lookup)
+ATTRIBUTION_METHOD = os.environ.get("MEDISCAN_ATTRIBUTION", "occlusion")
+if ATTRIBUTION_METHOD not in ATTRIBUTION_METHODS:
+    ATTRIBUTION_METHOD = "occlusion"
+
+def predict_symptom_sets(symptom_sets):
+    # (predicted label, [(label, probability), ...], [(symptom, weight), ...]) per symptom set,
+    # from one model pass
+    if PREDICTION_URL:
+        return predict_remote(symptom_sets)
+    labels, top_labels, top_scores, attributions = explain_top_k(
+        symptom_sets, model, symptom_encoder, k=DIFFERENTIAL_SIZE, method=ATTRIBUTION_METHOD
+    )
+    return [
+        (int(label), list(zip(top.tolist(), scores.tolist())), attribution)
+        for label, top, scores, attribution in zip(labels, top_labels, top_scores, attributions)
+    ]
+
+def predict_remote(symptom_sets):
+    url = urlsplit(PREDICTION_URL)
+    client = PredictionClient(url.hostname, url.port or 80)
+    try:
+        predictions = client.predict_many(symptom_sets)
+    finally:
+        client.close()
+    return [
+        (p["label"], [(d["label"], d["score"]) for d in p.get("differential", [])][:DIFFERENTIAL_SIZE],
+         [(a["symptom"], a["weight"]) for a in p.get("attribution", [])])
+        for p in predictions
+    ]
+
+# Prediction cache shared by all sessions, keyed on model version and symptom set.
+# Set MEDISCAN_CACHE_WARMUP=1 to pre-populate it with every training combination.
+@st.cache_resource
+def load_prediction_cache():
+    cache = PredictionCache(model_version, maxsize=int(os.environ.get("MEDISCAN_CACHE_SIZE", 4096)))
+    if os.environ.get("MEDISCAN_CACHE_WARMUP"):
+        data = load_dataset()["symptoms"]
+        cache.warm(data[symptom_columns].itertuples(index=False), predict_symptom_sets, model_version)
+    METRICS.register_collector("prediction_cache", lambda: {
+        f"prediction_cache_{name}": value for name, value in cache.stats().items()
+    })
+    return cache
+
+prediction_cache = load_prediction_cache()
 
 # Custom CSS for enhanced styling
 st.markdown("""
@@ -280,13 +338,26 @@ with tab1:
         for i in range(4):
             symptom = st.selectbox(
                 f"Symptom {i+1}",
-                options=["None"] + list(symptom_options),
+                options=["None"] + symptom_options,
                 index=0,
+                format_func=lambda s: s if s == "None" else display_name(s),
                 key=f"symptom_{i}"
             )
-            if symptom != "None":
+            if symptom != "None" and symptom not in selected_symptoms:
                 selected_symptoms.append(symptom)
         
+        # Free text is resolved through the symptom index: synonyms and typos map to symptom IDs
+        typed_symptoms = st.text_input("Other symptoms", placeholder="Type symptoms, separated by commas")
+        if typed_symptoms:
+            resolved, unresolved = symptom_index.resolve_all(typed_symptoms.split(","))
+            selected_symptoms += [s for s in resolved if s not in selected_symptoms]
+            if resolved:
+                st.caption("Recognized: " + ", ".join(display_name(s) for s in resolved))
+            for text in unresolved:
+                suggestions = symptom_index.complete(text, limit=3) or [s for s, _ in symptom_index.suggest(text, limit=3)]
+                hint = f" Did you mean: {', '.join(display_name(s) for s in suggestions)}?" if suggestions else ""
+                st.caption(f"Not recognized: \"{text}\".{hint}")
+        
         # Add animation class to the button container
         st.markdown('<div class="animate-pulse">', unsafe_allow_html=True)
         examine_button = st.button("Examine Symptoms", use_container_width=True)
@@ -294,15 +365,18 @@ with tab1:
         
         # Quick stats
         st.markdown('<div class="section-title">System Stats</div>', unsafe_allow_html=True)
-        st.markdown(f"**Database Records:** {len(data):,}")
+        st.markdown(f"**Database Records:** {symptom_record_count:,}")
         st.markdown(f"**Symptoms in Database:** {len(symptom_options):,}")
-        st.markdown(f"**Diseases Covered:** {data['Disease'].nunique():,}")
+        st.markdown(f"**Diseases Covered:** {len(recommendations):,}")
+        st.markdown(f"**Model Version:** {model_version.split(':')[0]}")
+        cache_stats = prediction_cache.stats()
+        st.markdown(f"**Prediction Cache:** {cache_stats['hits']:,} hits / {cache_stats['misses']:,} misses")
         
         # Patient records info
-        if os.path.exists(PATIENT_DATA_FILE):
+        # Record count comes from store metadata, not from reading the records
+        if RECORD_STORE.exists():
             try:
-                patient_records = pd.read_csv(PATIENT_DATA_FILE)
-                st.markdown(f"**Patients in Database:** {len(patient_records):,}")
+                st.markdown(f"**Patients in Database:** {RECORD_STORE.count():,}")
             except:
                 st.markdown("**Patients in Database:** 0")
         else:
@@ -319,16 +393,14 @@ with tab1:
                 st.warning("⚠️ Please select at least one symptom for analysis.")
             else:
                 # Add a spinner for processing effect
-                with st.spinner("Analyzing symptoms... Please wait."):
-                    combined_symptoms = " ".join(selected_symptoms)
-                    input_vec = vectorizer.transform([combined_symptoms])
-                    
+                with st.spinner("Analyzing symptoms... Please wait."), profile_request("predict"), METRICS.timer("request"):
                     # Predict disease using the hybrid model
-                    predicted_encoded_disease = model.predict(input_vec)[0]
-                    predicted_disease = encoder.inverse_transform([predicted_encoded_disease])[0]
+                    predicted_label, differential, attribution = prediction_cache.predict([selected_symptoms], predict_symptom_sets, model_version)[0]
                     
                     # Fetch disease details
-                    disease_info = data[data["Disease"] == predicted_disease].iloc[0]
+                    with METRICS.timer("lookup"):
+                        disease_info = recommendations.by_label(predicted_label)
+                    predicted_disease = disease_info["Disease"]
                 
                 # Display the results with enhanced styling
                 st.markdown('<div class="result-card">', unsafe_allow_html=True)
@@ -337,7 +409,7 @@ with tab1:
                 st.markdown(f'<div class="section-title">Patient</div>', unsafe_allow_html=True)
                 st.markdown(f"**Name:** {patient_name}")
                 st.markdown(f"**Age:** {patient_age} years")
-                st.markdown(f"**Reported Symptoms:** {', '.join(selected_symptoms)}")
+                st.markdown(f"**Reported Symptoms:** {', '.join(display_name(s) for s in selected_symptoms)}")
                 
                 # Disease name with colored background
                 st.markdown(f'<div class="disease-title">🩺 {predicted_disease}</div>', unsafe_allow_html=True)
@@ -346,18 +418,31 @@ with tab1:
                 st.markdown('<div class="section-title">Description</div>', unsafe_allow_html=True)
                 st.markdown(f"{disease_info['Description']}")
                 
+                # Differential diagnosis: most likely conditions with the ensemble's calibrated
+                # probability; the diagnosis above is always the first entry
+                st.markdown('<div class="section-title">Differential Diagnosis</div>', unsafe_allow_html=True)
+                for rank, (label, score) in enumerate(differential, start=1):
+                    st.markdown(f"{rank}. **{recommendations.by_label(label)['Disease']}**")
+                    st.progress(min(max(score, 0.0), 1.0), text=f"{score:.1%}")
+                
+                # Why this disease: how much each entered symptom supports the prediction
+                if attribution:
+                    st.markdown('<div class="section-title">Why This Disease</div>', unsafe_allow_html=True)
+                    for symptom, weight in attribution:
+                        st.progress(min(max(weight, 0.0), 1.0), text=f"{display_name(symptom)}: {weight:+.1%}")
+                
                 # Create tabs for different information categories
                 result_tab1, result_tab2, result_tab3 = st.tabs(["Treatment", "Lifestyle", "Precautions"])
                 
                 with result_tab1:
                     st.markdown('<div class="info-label">Recommended Medication:</div>', unsafe_allow_html=True)
                     medications = disease_info['Medication']
-                    st.write(medications)
+                    st.markdown("\n".join(f"- {item}" for item in medications) or "No medication listed for this condition.")
                 
                 with result_tab2:
                     st.markdown('<div class="info-label">Dietary Recommendations:</div>', unsafe_allow_html=True)
                     diet = disease_info['Diet']
-                    st.write(diet)
+                    st.markdown("\n".join(f"- {item}" for item in diet) or "No diet recommendations listed for this condition.")
                     
                     st.markdown('<div class="info-label">Exercise Recommendations:</div>', unsafe_allow_html=True)
                     workout = disease_info['workout']
@@ -373,7 +458,7 @@ with tab1:
                     precaution_list = []
                     has_precautions = False
                     for col in precaution_columns:
-                        if col in disease_info.index and pd.notna(disease_info[col]) and disease_info[col].strip() != "":
+                        if col in disease_info and pd.notna(disease_info[col]) and disease_info[col].strip() != "":
                             has_precautions = True
                             precaution_list.append(disease_info[col])
                             # Using clearer text styling for precautions
@@ -400,13 +485,16 @@ with tab1:
                     if save_success:
                         st.success("Patient record saved successfully!")
                         # Show the data storage location
-                        st.info(f"Patient data saved to: {PATIENT_DATA_FILE}")
+                        st.info(f"Patient data saved to: {RECORD_STORE.path}")
                     else:
                         st.error("Failed to save patient record.")
                 except Exception as e:
                     st.error(f"Could not save patient data: {str(e)}")
                     st.info("You can still view the results, but the record wasn't saved to the database.")
                 
+                if METRICS_FILE:
+                    METRICS.write_prometheus(METRICS_FILE)
+                
                 # Disclaimer
                 st.info("⚠️ **Medical Disclaimer**: This prediction is based on symptoms only and is not a substitute for professional medical advice. Please consult a healthcare professional for proper diagnosis and treatment.")
                 
@@ -459,71 +547,116 @@ with tab1:
                 """)
                 st.markdown('</div>', unsafe_allow_html=True)
 
+# Search index over the record store, shared by all sessions and caught up
+# incrementally with new records on each search
+@st.cache_resource
+def load_record_index():
+    return RecordSearchIndex(RECORD_STORE)
+
+RECORDS_PAGE_SIZE = 50
+
+# Exports are written in the background, in chunks, and cached per record
+# store version and filters, so a download never re-reads the whole history
+# during a render
+@st.cache_resource
+def load_record_exporter():
+    return RecordExporter(load_record_index())
+
+EXPORT_LABELS = {"csv": "CSV", "parquet": "Parquet", "xlsx": "Excel"}
+
+@st.fragment(run_every=1)
+def show_export_progress(job):
+    if job.done:
+        st.rerun()
+    st.progress(job.progress, text=f"Exporting {job.rows_written:,} of {job.total:,} records...")
+
 # Patient Records Tab
 with tab2:
     st.markdown('<div class="section-title">📋 Patient Records Database</div>', unsafe_allow_html=True)
     
-    if os.path.exists(PATIENT_DATA_FILE):
+    if RECORD_STORE.exists():
         try:
-            patient_records = pd.read_csv(PATIENT_DATA_FILE)
-            if len(patient_records) > 0:
+            record_index = load_record_index()
+            record_index.refresh()
+            # Archive stores keep running aggregates; otherwise aggregate over the index
+            summary = RECORD_STORE.summary() or record_index.summary(refresh=False)
+            if summary["total"] > 0:
                 # Add search/filter functionality
                 search_term = st.text_input("Search by patient name or disease:", placeholder="Type to search...")
+                col1, col2, col3 = st.columns(3)
+                with col1:
+                    date_from = st.date_input("From date", value=None)
+                with col2:
+                    date_to = st.date_input("To date", value=None)
+                with col3:
+                    page = st.number_input("Page", min_value=1, step=1, value=1)
                 
-                filtered_records = patient_records
-                if search_term:
-                    filtered_records = patient_records[
-                        patient_records['Patient Name'].str.contains(search_term, case=False) | 
-                        patient_records['Predicted Disease'].str.contains(search_term, case=False)
-                    ]
+                page_records, total_matches = record_index.search(
+                    search_term, date_from, date_to, page=page, page_size=RECORDS_PAGE_SIZE, refresh=False
+                )
                 
                 # Display the records
                 st.markdown('<div class="table-wrapper">', unsafe_allow_html=True)
-                st.dataframe(filtered_records, use_container_width=True)
+                st.dataframe(page_records, use_container_width=True)
                 st.markdown('</div>', unsafe_allow_html=True)
+                total_pages = max((total_matches + RECORDS_PAGE_SIZE - 1) // RECORDS_PAGE_SIZE, 1)
+                if len(page_records):
+                    first = (page - 1) * RECORDS_PAGE_SIZE + 1
+                    st.caption(f"Showing {first:,}–{first + len(page_records) - 1:,} of {total_matches:,} matching records (page {page} of {total_pages})")
+                else:
+                    st.caption(f"No records on page {page}; {total_matches:,} matching records over {total_pages} page(s)")
                 
                 # Record stats
                 col1, col2, col3 = st.columns(3)
                 with col1:
-                    st.metric("Total Patients", len(patient_records))
+                    st.metric("Total Patients", summary["total"])
                 with col2:
-                    unique_diseases = patient_records['Predicted Disease'].nunique()
-                    st.metric("Unique Diseases", unique_diseases)
+                    st.metric("Unique Diseases", summary["unique_diseases"])
                 with col3:
-                    avg_age = round(patient_records['Patient Age'].mean(), 1)
+                    avg_age = round(summary["mean_age"], 1) if summary["mean_age"] is not None else 0
                     st.metric("Average Age", avg_age)
+                if summary.get("by_day"):
+                    st.bar_chart(pd.Series(summary["by_day"], name="Patients"))
                 
-                # Download buttons for records
+                # Download the records matching the current filters
                 st.markdown('### Download Records')
+                export_filters = (search_term, date_from, date_to)
                 col1, col2 = st.columns(2)
-                
                 with col1:
-                    csv_data = patient_records.to_csv(index=False).encode('utf-8')
-                    st.download_button(
-                        label="📥 Download as CSV",
-                        data=csv_data,
-                        file_name="patient_records.csv",
-                        mime="text/csv",
-                        use_container_width=True
-                    )
-                
+                    export_format = st.selectbox("Format", available_formats(), format_func=EXPORT_LABELS.get)
                 with col2:
-                    try:
-                        # Try to create Excel data for download
-                        from io import BytesIO
-                        buffer = BytesIO()
-                        patient_records.to_excel(buffer, index=False, engine='openpyxl')
-                        excel_data = buffer.getvalue()
-                        
+                    st.write("")
+                    if st.button("Prepare download", use_container_width=True):
+                        st.session_state["export"] = (
+                            export_filters,
+                            load_record_exporter().export(export_format, *export_filters),
+                        )
+                
+                prepared_filters, export_job = st.session_state.get("export", (None, None))
+                if export_job is not None and prepared_filters == export_filters:
+                    if not export_job.done:
+                        show_export_progress(export_job)
+                    elif export_job.status == "done" and not export_job.available:
+                        # Removed from disk since it was prepared (e.g. by hand)
+                        del st.session_state["export"]
+                        st.info("The prepared file is no longer available. Prepare the download again.")
+                    elif export_job.status == "done":
+                        # The file is only read when the button is clicked
                         st.download_button(
-                            label="📥 Download as Excel",
-                            data=excel_data,
-                            file_name="patient_records.xlsx",
-                            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                            label=f"📥 Download {EXPORT_LABELS[export_job.format]} ({export_job.total:,} records)",
+                            data=export_job.read,
+                            file_name=export_job.file_name,
+                            mime=export_job.mime,
                             use_container_width=True
                         )
-                    except:
-                        st.info("Excel download requires openpyxl package. Install with: pip install openpyxl")
+                    else:
+                        st.error(f"Export failed: {export_job.error}")
+                missing = [
+                    f"{EXPORT_LABELS[fmt]} needs `pip install {spec['requires']}`"
+                    for fmt, spec in EXPORT_FORMATS.items() if fmt not in available_formats()
+                ]
+                if missing:
+                    st.caption("Unavailable formats: " + "; ".join(missing))
             else:
                 st.info("No patient records found. Use the Disease Prediction tab to analyze symptoms and save records.")
         except Exception as e:
@@ -532,6 +665,27 @@ with tab2:
     else:
         st.info("No patient records file exists yet. Use the Disease Prediction tab to analyze symptoms and save records.")
 
+# Admin panel: per-stage latency histograms and cache hit rate.
+# Enabled with MEDISCAN_METRICS=1; MEDISCAN_METRICS_FILE also writes them in
+# Prometheus text format after every prediction, and MEDISCAN_PROFILE_DIR
+# keeps a cProfile dump of each prediction request.
+if METRICS.enabled:
+    with st.sidebar.expander("⚙️ Performance Metrics", expanded=True):
+        gauges = METRICS.gauges()
+        if "prediction_cache_hit_rate" in gauges:
+            st.metric("Prediction cache hit rate", f"{gauges['prediction_cache_hit_rate']:.1%}",
+                      help=f"{gauges['prediction_cache_hits']:,.0f} hits / {gauges['prediction_cache_misses']:,.0f} misses")
+        stages = METRICS.snapshot()
+        if stages:
+            st.dataframe(pd.DataFrame.from_dict(stages, orient="index").round(3), use_container_width=True)
+        else:
+            st.caption("No requests timed yet.")
+        st.download_button("📥 Prometheus metrics", data=METRICS.prometheus_text, file_name="mediscan_metrics.prom",
+                           mime="text/plain", use_container_width=True)
+        if st.button("Reset metrics", use_container_width=True):
+            METRICS.reset()
+            st.rerun()
+
 # Footer
 st.markdown("""
 <div class="footer">
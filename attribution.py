@@ -0,0 +1,116 @@
+"""Symptom attribution for MediScan predictions ("why this disease").
+
+Each prediction comes with a weight for every symptom that was entered,
+computed in one of two ways:
+
+* ``occlusion`` - the model scores the input and, in the same call, the
+  input with each symptom left out. A symptom's weight is how much the
+  predicted disease's probability drops without it. This is exact for the
+  model being served, hard-voting ensemble included. With 1-4 symptoms
+  the call scores 2-5 rows instead of one, which costs little next to the
+  per-call overhead of the three members.
+* ``table``     - a lookup in the per-disease symptom importance table that
+  model_training.py stores on the model as ``symptom_importance_``: the
+  probability the model gives each disease when the symptom is the only one
+  entered. This costs microseconds and suits large batches, but it ignores
+  how the entered symptoms interact.
+
+Attributions are returned as ``[(symptom, weight), ...]``, highest weight first.
+"""
+
+import numpy as np
+from scipy import sparse
+
+from inference import _predict_with_proba, encode_symptoms, predict_proba, predict_top_k, top_k_from_proba
+from metrics import METRICS
+
+ATTRIBUTION_METHODS = ("occlusion", "table")
+
+
+def symptom_importance(model, symptom_encoder):
+    """``(n_classes, n_features)`` table: each disease's probability given each symptom alone."""
+    vocabulary = symptom_encoder.get_feature_names_out()
+    proba = predict_proba(model, symptom_encoder.transform([[symptom] for symptom in vocabulary]))
+    return proba.T.astype(np.float32)
+
+
+def importance_table(model, symptom_encoder):
+    """The model's ``symptom_importance_``, computed and kept on the model if it predates this module."""
+    table = getattr(model, "symptom_importance_", None)
+    if table is None:
+        table = model.symptom_importance_ = symptom_importance(model, symptom_encoder)
+    return table
+
+
+def _occlusion_matrix(X):
+    # Per input row: the row itself, then one copy with each active symptom removed
+    X = X.tocsr()
+    indptr, indices = [0], []
+    for i in range(X.shape[0]):
+        active = X.indices[X.indptr[i]:X.indptr[i + 1]]
+        indices.extend(active)
+        indptr.append(len(indices))
+        for position in range(len(active)):
+            indices.extend(np.delete(active, position))
+            indptr.append(len(indices))
+    data = np.ones(len(indices), dtype=X.dtype)
+    matrix = sparse.csr_matrix((data, np.asarray(indices, dtype=np.int32), np.asarray(indptr)),
+                               shape=(len(indptr) - 1, X.shape[1]))
+    return X, matrix
+
+
+def _weights(features, gains, names):
+    order = np.argsort(-gains, kind="stable")
+    return [(names[features[j]], float(gains[j])) for j in order]
+
+
+def explain_top_k(symptom_sets, model, symptom_encoder, k=3, method="occlusion", chunk_size=2000):
+    """``predict_top_k`` plus a symptom attribution for every set.
+
+    Returns ``(labels, top_labels, top_scores, attributions)``; the first
+    three are exactly what ``predict_top_k`` returns.
+    """
+    if method not in ATTRIBUTION_METHODS:
+        raise ValueError(f"Unknown attribution method {method!r}; expected one of: {', '.join(ATTRIBUTION_METHODS)}")
+    names = symptom_encoder.get_feature_names_out()
+    if method == "table":
+        labels, top_labels, top_scores = predict_top_k(symptom_sets, model, symptom_encoder, k, chunk_size)
+        with METRICS.timer("attribution"):
+            table = importance_table(model, symptom_encoder)
+            X = encode_symptoms(symptom_sets, symptom_encoder).tocsr()
+            position = {label: i for i, label in enumerate(model.classes_)}
+            attributions = []
+            for i, label in enumerate(labels):
+                features = X.indices[X.indptr[i]:X.indptr[i + 1]]
+                attributions.append(_weights(features, table[position[label], features], names))
+        return labels, top_labels, top_scores, attributions
+
+    if len(symptom_sets) == 0:
+        return np.array([], dtype=int), np.empty((0, k), dtype=int), np.empty((0, k)), []
+    classes = np.asarray(model.classes_)
+    labels, top_labels, top_scores, attributions = [], [], [], []
+    X = encode_symptoms(symptom_sets, symptom_encoder)
+    for start in range(0, X.shape[0], chunk_size):
+        with METRICS.timer("attribution"):
+            chunk, expanded = _occlusion_matrix(X[start:start + chunk_size])
+        _, proba = _predict_with_proba(model, expanded)
+        with METRICS.timer("attribution"):
+            # Row of each input within the expanded matrix
+            full = np.concatenate([[0], np.cumsum(np.diff(chunk.indptr) + 1)[:-1]])
+            top, scores = top_k_from_proba(proba[full], k)
+            # Soft vote, as in predict_top_k: the label heads its own differential
+            chunk_labels = classes[top[:, 0]]
+            columns = np.searchsorted(classes, chunk_labels)
+            for i, row in enumerate(full):
+                features = chunk.indices[chunk.indptr[i]:chunk.indptr[i + 1]]
+                gains = proba[row, columns[i]] - proba[row + 1:row + 1 + len(features), columns[i]]
+                attributions.append(_weights(features, gains, names))
+        labels.append(chunk_labels)
+        top_labels.append(classes[top])
+        top_scores.append(scores)
+    return np.concatenate(labels), np.concatenate(top_labels), np.concatenate(top_scores), attributions
+
+
+def format_attribution(attribution):
+    """``"itching:+0.412; skin_rash:+0.305"`` for tabular output."""
+    return "; ".join(f"{symptom}:{weight:+.3f}" for symptom, weight in attribution)
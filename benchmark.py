@@ -0,0 +1,304 @@
+"""Benchmarks for MediScan's training and inference hot paths.
+
+Runs each stage on synthetic symptom sets drawn from ``symtoms_df.csv`` and
+writes the timings to JSON so runs can be compared across commits::
+
+    python benchmark.py --output bench/$(git rev-parse --short HEAD).json
+    python benchmark.py --stages inference --model-kind fast
+    python benchmark.py --compare bench/old.json bench/new.json
+
+Stages:
+    training   load / preprocess, vectorize and per-member fit times
+    inference  single-request latency percentiles (vectorize, predict,
+               decode) and batch throughput at several batch sizes
+    records    record save latency as the store grows (1 to 1M rows)
+
+Peak RSS is recorded after every stage.
+"""
+
+import argparse
+import csv
+import json
+import os
+import platform
+import resource
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from dataset import load_dataset
+from inference import SYMPTOM_COLUMNS, artifacts_version, encode_symptoms, load_artifacts, predict_labels
+from record_store import RECORD_COLUMNS, open_record_store
+from symptoms import canonical_symptom_set
+
+STAGES = ("training", "inference", "records")
+BATCH_SIZES = (1, 10, 100, 1000, 10000)
+RECORD_SIZES = (1, 1000, 10000, 100000, 1000000)
+PERCENTILES = (50, 90, 99)
+
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1 << 20) if sys.platform == "darwin" else peak / 1024
+
+
+def latency_summary(seconds, percentiles=PERCENTILES):
+    ms = np.asarray(seconds) * 1000
+    summary = {f"p{p}_ms": float(np.percentile(ms, p)) for p in percentiles}
+    summary["mean_ms"] = float(ms.mean())
+    summary["max_ms"] = float(ms.max())
+    return summary
+
+
+def synthetic_symptom_sets(n, random_state=0, base_dir="."):
+    """``n`` symptom sets: half resampled training rows, half random 1-4 symptom combinations."""
+    rng = np.random.default_rng(random_state)
+    symptoms = load_dataset(base_dir)["symptoms"]
+    rows = [canonical_symptom_set(row) for row in symptoms[SYMPTOM_COLUMNS].itertuples(index=False)]
+    vocabulary = sorted({symptom for row in rows for symptom in row})
+    symptom_sets = [list(rows[i]) for i in rng.integers(len(rows), size=n - n // 2)]
+    for size in rng.integers(1, 5, size=n // 2):
+        symptom_sets.append(list(rng.choice(vocabulary, size=size, replace=False)))
+    rng.shuffle(symptom_sets)
+    return symptom_sets
+
+
+def bench_training(log=print):
+    # Imported here so the other stages do not pay for xgboost's import
+    from sklearn.preprocessing import LabelEncoder
+    from model_training import build_symptom_frame, deduplicate, load_tables, make_hybrid_model
+    from symptoms import SymptomEncoder
+
+    results = {}
+    start = time.perf_counter()
+    dfs = load_tables()
+    results["load_s"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    symptom_frame = build_symptom_frame(dfs["symptoms"])
+    y = LabelEncoder().fit_transform(symptom_frame["Disease"])
+    X, y, sample_weight = deduplicate(symptom_frame["Symptoms"], pd.Series(y))
+    results["preprocess_s"] = time.perf_counter() - start
+    results["training_rows"] = len(X)
+
+    start = time.perf_counter()
+    X_vec = SymptomEncoder().fit_transform(X)
+    results["vectorize_s"] = time.perf_counter() - start
+
+    # Members are fitted one after another so each time is the member's own cost
+    results["fit_s"] = {}
+    for name, estimator in make_hybrid_model().estimators:
+        start = time.perf_counter()
+        estimator.fit(X_vec, y.to_numpy(), sample_weight=sample_weight)
+        results["fit_s"][name] = time.perf_counter() - start
+        log(f"[training] {name} fit {results['fit_s'][name]:.2f}s")
+    return results
+
+
+def bench_inference(kind=None, requests=1000, batch_sizes=BATCH_SIZES, min_seconds=0.5, log=print):
+    start = time.perf_counter()
+    model, symptom_encoder, _, recommendations = load_artifacts(kind)
+    results = {"load_s": time.perf_counter() - start, "model_version": artifacts_version(kind)}
+
+    symptom_sets = synthetic_symptom_sets(max(requests, max(batch_sizes)), random_state=1)
+
+    # One request at a time, split into the three steps the app performs
+    stages = {"vectorize": [], "predict": [], "decode": [], "total": []}
+    for symptoms in symptom_sets[:requests]:
+        t0 = time.perf_counter()
+        X = encode_symptoms([symptoms], symptom_encoder)
+        t1 = time.perf_counter()
+        label = model.predict(X)[0]
+        t2 = time.perf_counter()
+        recommendations.by_label(label)
+        t3 = time.perf_counter()
+        stages["vectorize"].append(t1 - t0)
+        stages["predict"].append(t2 - t1)
+        stages["decode"].append(t3 - t2)
+        stages["total"].append(t3 - t0)
+    results["single_request"] = {stage: latency_summary(times) for stage, times in stages.items()}
+    log(f"[inference] single request p50 {results['single_request']['total']['p50_ms']:.2f}ms")
+
+    results["batch_throughput"] = {}
+    for batch_size in batch_sizes:
+        batch = symptom_sets[:batch_size]
+        calls, elapsed = 0, 0.0
+        while elapsed < min_seconds or calls < 3:
+            start = time.perf_counter()
+            predict_labels(batch, model, symptom_encoder)
+            elapsed += time.perf_counter() - start
+            calls += 1
+        results["batch_throughput"][str(batch_size)] = {
+            "sets_per_s": batch_size * calls / elapsed,
+            "ms_per_batch": elapsed / calls * 1000,
+        }
+        log(f"[inference] batch {batch_size}: {batch_size * calls / elapsed:,.0f} sets/s")
+    return results
+
+
+def _sample_record(i):
+    return {
+        "Timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "Patient Name": f"Patient {i}",
+        "Patient Age": 20 + i % 60,
+        "Symptoms": "itching, skin_rash, nodal_skin_eruptions",
+        "Predicted Disease": "Fungal infection",
+        "Medications": "['Antifungal Cream', 'Fluconazole', 'Terbinafine']",
+        "Diet Recommendations": "['Antifungal Diet', 'Probiotics', 'Garlic']",
+        "Workout Recommendations": "Avoid sugary foods",
+        "Precautions": "bath twice, use detol or neem in bathing water, keep infected area dry",
+    }
+
+
+def _bulk_fill(store, start, stop):
+    # Grow the store without going through append, which is what is being measured
+    rows = ([_sample_record(i).get(col, "") for col in RECORD_COLUMNS] for i in range(start, stop))
+    if hasattr(store, "append_many"):
+        store.append_many(_sample_record(i) for i in range(start, stop))
+    elif store.path.endswith(".db"):
+        columns = ", ".join(f'"{col}"' for col in RECORD_COLUMNS)
+        with sqlite3.connect(store.path) as conn:
+            conn.executemany(f"INSERT INTO patient_records ({columns}) VALUES ({', '.join('?' for _ in RECORD_COLUMNS)})", rows)
+    else:
+        with open(store.path, "a", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            if start == 0:
+                writer.writerow(RECORD_COLUMNS)
+            writer.writerows(rows)
+    store.count()  # resync any metadata kept next to the records
+
+
+def bench_records(backends=("csv", "sqlite", "archive"), sizes=RECORD_SIZES, appends=200, log=print):
+    """Append latency (what ``save_patient_data`` does per save) at each store size.
+
+    Sizes are measured smallest first on one growing store; a size the store
+    has already passed (its rows plus the timed appends) is skipped.
+    """
+    results = {}
+    directory = tempfile.mkdtemp(prefix="mediscan-bench-")
+    try:
+        for backend in backends:
+            store = open_record_store(os.path.join(directory, "patient_records.csv"), backend)
+            results[backend] = {}
+            filled = 0
+            for size in sorted(set(sizes)):
+                if size < filled:
+                    log(f"[records] {backend}: skipping {size:,} rows, the store already holds {filled:,}")
+                    continue
+                _bulk_fill(store, filled, size)
+                timings = []
+                for i in range(appends):
+                    record = _sample_record(size + i)
+                    start = time.perf_counter()
+                    store.append(record)
+                    timings.append(time.perf_counter() - start)
+                filled = size + appends
+                results[backend][str(size)] = latency_summary(timings)
+                log(f"[records] {backend} at {size:,} rows: p50 {results[backend][str(size)]['p50_ms']:.3f}ms")
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    return results
+
+
+def environment():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    versions = {"python": platform.python_version(), "numpy": np.__version__, "pandas": pd.__version__}
+    for module in ("sklearn", "xgboost"):
+        try:
+            versions[module] = __import__(module).__version__
+        except ImportError:
+            pass
+    return {
+        "commit": commit,
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "libraries": versions,
+    }
+
+
+def run(stages=STAGES, kind=None, requests=1000, batch_sizes=BATCH_SIZES, record_sizes=RECORD_SIZES,
+        appends=200, log=print):
+    report = {"environment": environment(), "stages": {}, "peak_rss_mb": {}}
+    for stage in stages:
+        start = time.perf_counter()
+        if stage == "training":
+            result = bench_training(log=log)
+        elif stage == "inference":
+            result = bench_inference(kind, requests, batch_sizes, log=log)
+        elif stage == "records":
+            result = bench_records(sizes=record_sizes, appends=appends, log=log)
+        else:
+            raise ValueError(f"Unknown benchmark stage: {stage}")
+        result["wall_s"] = time.perf_counter() - start
+        report["stages"][stage] = result
+        report["peak_rss_mb"][stage] = peak_rss_mb()
+    return report
+
+
+def _flatten(value, prefix=""):
+    if isinstance(value, dict):
+        items = {}
+        for key, item in value.items():
+            items.update(_flatten(item, f"{prefix}{key}."))
+        return items
+    return {prefix[:-1]: value} if isinstance(value, (int, float)) else {}
+
+
+def compare(old_path, new_path):
+    """Relative change of every numeric metric between two result files."""
+    with open(old_path) as f:
+        old = _flatten(json.load(f)["stages"])
+    with open(new_path) as f:
+        new = _flatten(json.load(f)["stages"])
+    rows = [
+        {"metric": key, "old": old[key], "new": new[key],
+         "change": (new[key] - old[key]) / old[key] if old[key] else float("nan")}
+        for key in sorted(old.keys() & new.keys())
+    ]
+    return pd.DataFrame(rows, columns=["metric", "old", "new", "change"])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark MediScan training and inference")
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=list(STAGES))
+    parser.add_argument("--output", default="benchmark_results.json", help="Where to write the JSON results")
+    parser.add_argument("--model-kind", choices=["hybrid", "fast"], help="hybrid (default) or fast")
+    parser.add_argument("--requests", type=int, default=1000, help="Single requests timed for latency percentiles")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=list(BATCH_SIZES))
+    parser.add_argument("--record-sizes", type=int, nargs="+", default=list(RECORD_SIZES),
+                        help="Store sizes at which save latency is measured")
+    parser.add_argument("--appends", type=int, default=200, help="Saves timed at each store size")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"),
+                        help="Compare two result files instead of running benchmarks")
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        with pd.option_context("display.max_rows", None, "display.width", 200):
+            print(compare(*args.compare).to_string(index=False))
+        return 0
+
+    report = run(args.stages, args.model_kind, args.requests, args.batch_sizes, args.record_sizes, args.appends)
+    directory = os.path.dirname(args.output)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Peak RSS: {max(report['peak_rss_mb'].values()):.1f} MB")
+    print(f"Wrote benchmark results to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,235 @@
+"""Compiled, binary copy of MediScan's source CSVs.
+
+``load_dataset()`` validates and normalizes the six source tables once and
+stores them as Feather files under ``.dataset_cache/<content hash>/``. Later
+calls hash the CSVs, find the matching cache and memory-map it instead of
+parsing CSV again. Editing any source file changes the hash and triggers a
+rebuild. Normalization:
+
+* the Medication and Diet columns become real lists of strings instead of
+  stringified Python lists (``"['Antifungal Cream', ...]"``)
+* leftover index columns (``Unnamed: 0``) are dropped
+* ``workout_df.csv``'s ``disease`` column is renamed to ``Disease``
+
+Disease names are kept as they are; they are the model's class labels.
+The source files do not spell them consistently (``"Diabetes "`` with a
+trailing space, ``"Peptic ulcer diseae"``), so tables are matched on
+``disease_key()`` rather than on the raw name. Compiling fails if a disease
+in the symptom table has no row in one of the other tables.
+
+Without pyarrow, the tables are parsed from the CSVs on every call::
+
+    python dataset.py            # compile (or reuse) the cache
+    python dataset.py --rebuild
+"""
+
+import argparse
+import ast
+import hashlib
+import json
+import os
+import re
+import shutil
+import sys
+import tempfile
+import time
+from importlib.util import find_spec
+
+import pandas as pd
+
+SOURCE_FILES = {
+    "symptoms": "symtoms_df.csv",
+    "description": "description.csv",
+    "medications": "medications.csv",
+    "diets": "diets.csv",
+    "precautions": "precautions_df.csv",
+    "workout": "workout_df.csv",
+}
+
+# Columns each table must have after normalization
+REQUIRED_COLUMNS = {
+    "symptoms": ["Disease", "Symptom_1", "Symptom_2", "Symptom_3", "Symptom_4"],
+    "description": ["Disease", "Description"],
+    "medications": ["Disease", "Medication"],
+    "diets": ["Disease", "Diet"],
+    "precautions": ["Disease", "Precaution_1", "Precaution_2", "Precaution_3", "Precaution_4"],
+    "workout": ["Disease", "workout"],
+}
+
+LIST_COLUMNS = {"medications": ["Medication"], "diets": ["Diet"]}
+
+DATASET_CACHE_DIR = ".dataset_cache"
+MANIFEST_FILE = "manifest.json"
+# Bump when normalization changes, so caches built by older code are not reused
+DATASET_FORMAT = 2
+
+# Known misspellings in the source files, after whitespace is collapsed
+DISEASE_ALIASES = {
+    "Peptic ulcer diseae": "Peptic ulcer disease",
+    "(vertigo) Paroymsal Positional Vertigo": "(vertigo) Paroxysmal Positional Vertigo",
+}
+
+
+def parse_list(value):
+    """A list of strings from a stringified list such as ``"['a', 'b']"``; lists pass through."""
+    if value is None or (isinstance(value, float) and value != value):
+        return []
+    if not isinstance(value, str):
+        return [str(item).strip() for item in value]
+    text = value.strip()
+    if text.startswith("["):
+        try:
+            items = ast.literal_eval(text)
+        except (ValueError, SyntaxError):
+            items = text.strip("[]").split(",")
+    else:
+        items = text.split(",")
+    return [str(item).strip().strip("'\"") for item in items if str(item).strip()]
+
+
+def disease_key(name):
+    """Join key for a disease name: surrounding whitespace stripped, inner runs collapsed, aliases resolved."""
+    key = re.sub(r"\s+", " ", str(name)).strip()
+    return DISEASE_ALIASES.get(key, key)
+
+
+def source_hash(base_dir="."):
+    digest = hashlib.sha256(f"format={DATASET_FORMAT}".encode())
+    for name, filename in sorted(SOURCE_FILES.items()):
+        with open(os.path.join(base_dir, filename), "rb") as f:
+            digest.update(name.encode())
+            digest.update(hashlib.sha256(f.read()).digest())
+    return digest.hexdigest()
+
+
+def normalize_table(name, table):
+    table = table.drop(columns=[col for col in table.columns if str(col).startswith("Unnamed:")])
+    if name == "workout":
+        table = table.rename(columns={"disease": "Disease"})
+    for col in LIST_COLUMNS.get(name, []):
+        if col in table.columns:
+            table[col] = table[col].map(parse_list)
+    return table.reset_index(drop=True)
+
+
+def validate_tables(tables):
+    """Raise ValueError on schema problems or diseases missing from a table; return warnings about unused rows."""
+    errors = []
+    for name, columns in REQUIRED_COLUMNS.items():
+        missing = [col for col in columns if col not in tables[name].columns]
+        if missing:
+            errors.append(f"{SOURCE_FILES[name]} is missing column(s): {', '.join(missing)}")
+        elif tables[name]["Disease"].isna().any():
+            errors.append(f"{SOURCE_FILES[name]} has rows without a Disease")
+    if errors:
+        raise ValueError("Invalid dataset: " + "; ".join(errors))
+    diseases = {disease_key(disease): disease for disease in tables["symptoms"]["Disease"]}
+    warnings = []
+    for name in REQUIRED_COLUMNS:
+        if name == "symptoms":
+            continue
+        keys = set(tables[name]["Disease"].map(disease_key))
+        uncovered = sorted(disease for key, disease in diseases.items() if key not in keys)
+        if uncovered:
+            errors.append(f"{SOURCE_FILES[name]} has no rows for: {', '.join(map(repr, uncovered))}")
+        unused = sorted(keys - set(diseases))
+        if unused:
+            warnings.append(f"{SOURCE_FILES[name]} has rows for unknown diseases: {', '.join(map(repr, unused))}")
+    if errors:
+        raise ValueError("Invalid dataset: " + "; ".join(errors))
+    return warnings
+
+
+def read_sources(base_dir="."):
+    """Parse, normalize and validate the source CSVs. Returns ``(tables, warnings)``."""
+    tables = {
+        name: normalize_table(name, pd.read_csv(os.path.join(base_dir, filename)))
+        for name, filename in SOURCE_FILES.items()
+    }
+    return tables, validate_tables(tables)
+
+
+def _read_cache(directory):
+    tables = {}
+    for name in SOURCE_FILES:
+        try:
+            table = pd.read_feather(os.path.join(directory, f"{name}.feather"), memory_map=True)
+        except TypeError:  # older pandas without memory_map
+            table = pd.read_feather(os.path.join(directory, f"{name}.feather"))
+        for col in LIST_COLUMNS.get(name, []):
+            # Arrow list cells come back as numpy arrays
+            table[col] = table[col].map(list)
+        tables[name] = table
+    return tables
+
+
+def compile_dataset(base_dir=".", cache_dir=None, rebuild=False, log=print):
+    """Build the cache for the current sources unless it exists. Returns its directory."""
+    cache_dir = cache_dir or os.path.join(base_dir, DATASET_CACHE_DIR)
+    key = source_hash(base_dir)
+    directory = os.path.join(cache_dir, key[:16])
+    if not rebuild and os.path.exists(os.path.join(directory, MANIFEST_FILE)):
+        return directory
+
+    tables, warnings = read_sources(base_dir)
+    os.makedirs(cache_dir, exist_ok=True)
+    staging = tempfile.mkdtemp(prefix=".staging-", dir=cache_dir)
+    try:
+        for name, table in tables.items():
+            table.to_feather(os.path.join(staging, f"{name}.feather"))
+        with open(os.path.join(staging, MANIFEST_FILE), "w") as f:
+            json.dump({"source_hash": key, "format": DATASET_FORMAT,
+                       "rows": {name: len(table) for name, table in tables.items()}, "warnings": warnings}, f, indent=2)
+        if os.path.exists(directory):
+            shutil.rmtree(directory)
+        os.replace(staging, directory)
+    except OSError:
+        # Another process published the same cache first
+        if not os.path.exists(os.path.join(directory, MANIFEST_FILE)):
+            raise
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+    for warning in warnings:
+        log(f"Warning: {warning}")
+    # Caches of older sources are never read again
+    for name in os.listdir(cache_dir):
+        path = os.path.join(cache_dir, name)
+        if path != directory and not name.startswith(".staging-") and os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+    return directory
+
+
+def load_dataset(base_dir=".", cache_dir=None):
+    """``{table name: DataFrame}`` for every source file, from the compiled cache when possible."""
+    if not find_spec("pyarrow"):
+        return read_sources(base_dir)[0]
+    return _read_cache(compile_dataset(base_dir, cache_dir))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compile the MediScan source CSVs into a binary cache")
+    parser.add_argument("--base-dir", default=".", help="Directory holding the source CSVs")
+    parser.add_argument("--cache-dir", default=None, help=f"Cache directory (default: <base-dir>/{DATASET_CACHE_DIR})")
+    parser.add_argument("--rebuild", action="store_true", help="Rebuild even if the cache is current")
+    args = parser.parse_args(argv)
+
+    if not find_spec("pyarrow"):
+        parser.error("the dataset cache requires the pyarrow package")
+    start = time.perf_counter()
+    directory = compile_dataset(args.base_dir, args.cache_dir, args.rebuild)
+    print(f"Dataset cache: {directory} ({time.perf_counter() - start:.2f}s)")
+
+    start = time.perf_counter()
+    read_sources(args.base_dir)
+    csv_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    tables = _read_cache(directory)
+    cache_seconds = time.perf_counter() - start
+    for name, table in tables.items():
+        print(f"  {name:<12} {len(table):>6,} rows")
+    print(f"Load time: {cache_seconds * 1000:.1f}ms from the cache, {csv_seconds * 1000:.1f}ms from CSV")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,259 @@
+"""Cross-validated evaluation of the hybrid model and its members.
+
+Runs stratified k-fold cross-validation and writes, in one command, a JSON
+report with overall and per-class metrics for the hybrid model and for
+each ensemble member on its own, plus the hybrid model's confusion matrix
+image::
+
+    python evaluate.py --folds 5
+    python evaluate.py --folds 10 --workers 4 --no-group
+
+The symptom table is vectorized once and every fold indexes into that
+matrix. Each (fold, member) fit is an independent task spread over
+``--workers`` processes and cached like a training fit, so a re-run only
+refits what changed. The hybrid model of a fold is assembled from that
+fold's fitted members, so it costs no extra training.
+
+The symptom table repeats each symptom combination many times. By default
+folds are grouped on the symptom combination, so a test fold never holds
+rows identical to training rows; ``--no-group`` evaluates plain
+stratified folds (the setting of the single 80/20 split in training).
+
+The report also times single-request and batch inference for every model,
+to weigh the ensemble's accuracy against what it costs to serve.
+"""
+
+import argparse
+import io
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.metrics import accuracy_score, confusion_matrix, f1_score, precision_recall_fscore_support
+from sklearn.model_selection import StratifiedGroupKFold, StratifiedKFold
+from sklearn.preprocessing import LabelEncoder
+
+from model_training import build_symptom_frame, deduplicate, load_tables, make_hybrid_model
+from symptoms import SymptomEncoder
+from train_members import (MEMBER_CACHE_DIR, _fit_member, _set_thread_budget, assemble_voting_classifier,
+                           member_cache_key, timed)
+
+EVALUATION_REPORT_PATH = "evaluation_report.json"
+CONFUSION_MATRIX_PATH = "Confusion_matrix.png"
+HYBRID = "hybrid"
+
+
+def make_folds(y, groups=None, n_folds=5, random_state=42):
+    """``[(train_index, test_index), ...]``; grouped folds keep each group on one side."""
+    if groups is None:
+        splitter = StratifiedKFold(n_splits=n_folds, shuffle=True, random_state=random_state)
+        return list(splitter.split(np.zeros(len(y)), y))
+    splitter = StratifiedGroupKFold(n_splits=n_folds, shuffle=True, random_state=random_state)
+    return list(splitter.split(np.zeros(len(y)), y, groups))
+
+
+def fit_folds(folds, symptom_sets, y, symptom_encoder, n_workers=None, use_cache=True,
+              cache_dir=MEMBER_CACHE_DIR, log=print):
+    """Fit every ensemble member on every fold's (deduplicated, weighted) training rows.
+
+    Returns ``(members, train_labels)``: per fold, ``{name: fitted_member}``
+    and the encoded labels the members were trained on.
+    """
+    members = [{} for _ in folds]
+    train_labels = []
+    tasks = []
+    for fold, (train_index, _) in enumerate(folds):
+        rows, y_train, weight = deduplicate(symptom_sets.iloc[train_index], y.iloc[train_index])
+        X_train, y_train = symptom_encoder.transform(rows), y_train.to_numpy()
+        train_labels.append(y_train)
+        for name, estimator in make_hybrid_model().estimators:
+            key = member_cache_key(name, estimator, X_train, y_train, weight)
+            path = os.path.join(cache_dir, f"{name}-{key}.pkl")
+            if use_cache and os.path.exists(path):
+                members[fold][name] = joblib.load(path)
+            else:
+                tasks.append((fold, name, estimator, X_train, y_train, weight, path))
+
+    cpus = os.cpu_count() or 1
+    n_workers = max(1, min(n_workers or cpus, len(tasks) or 1))
+    threads = max(1, cpus // n_workers)
+    log(f"{len(folds)} folds: {len(tasks)} member fit(s) on {n_workers} worker(s), "
+        f"{sum(len(fold) for fold in members)} loaded from cache")
+    if tasks:
+        with ProcessPoolExecutor(max_workers=n_workers) as pool:
+            futures = [
+                (fold, path, pool.submit(_fit_member, name, _set_thread_budget(estimator, threads), X, y_fit, weight))
+                for fold, name, estimator, X, y_fit, weight, path in tasks
+            ]
+            for fold, path, future in futures:
+                name, estimator, seconds = future.result()
+                log(f"[fold {fold + 1}] {name} fit {seconds:.2f}s")
+                members[fold][name] = estimator
+                if use_cache:
+                    os.makedirs(cache_dir, exist_ok=True)
+                    joblib.dump(estimator, path)
+    return members, train_labels
+
+
+def inference_cost(model, X, requests=200):
+    """Median single-request latency, batch throughput and pickled size of ``model``."""
+    rows = [X[i] for i in range(min(requests, X.shape[0]))]
+    latencies = []
+    for row in rows:
+        start = time.perf_counter()
+        model.predict(row)
+        latencies.append(time.perf_counter() - start)
+    start = time.perf_counter()
+    model.predict(X)
+    batch_seconds = time.perf_counter() - start
+    buffer = io.BytesIO()
+    joblib.dump(model, buffer)
+    return {
+        "single_request_ms": float(np.median(latencies) * 1000),
+        "batch_sets_per_s": float(X.shape[0] / batch_seconds),
+        "size_mb": buffer.tell() / (1 << 20),
+    }
+
+
+def summarize(y_true, y_pred, fold_scores, class_names):
+    """Pooled out-of-fold metrics, fold mean/std and per-class precision/recall/F1."""
+    labels = np.arange(len(class_names))
+    report = {"accuracy": float(accuracy_score(y_true, y_pred))}
+    for average in ("weighted", "macro"):
+        precision, recall, f1, _ = precision_recall_fscore_support(
+            y_true, y_pred, labels=labels, average=average, zero_division=0
+        )
+        report[average] = {"precision": float(precision), "recall": float(recall), "f1": float(f1)}
+    for metric in ("accuracy", "macro_f1"):
+        values = [scores[metric] for scores in fold_scores]
+        report[f"fold_{metric}"] = {"mean": float(np.mean(values)), "std": float(np.std(values)), "folds": values}
+    precision, recall, f1, support = precision_recall_fscore_support(
+        y_true, y_pred, labels=labels, zero_division=0
+    )
+    report["per_class"] = {
+        name: {"precision": float(p), "recall": float(r), "f1": float(f), "support": int(s)}
+        for name, p, r, f, s in zip(class_names, precision, recall, f1, support)
+    }
+    return report
+
+
+def plot_confusion_matrix(matrix, class_names, path=CONFUSION_MATRIX_PATH, title="Confusion Matrix"):
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    fig, ax = plt.subplots(figsize=(16, 14))
+    image = ax.imshow(matrix, cmap="coolwarm")
+    fig.colorbar(image, ax=ax)
+    ticks = np.arange(len(class_names))
+    ax.set_xticks(ticks)
+    ax.set_xticklabels(class_names, rotation=90)
+    ax.set_yticks(ticks)
+    ax.set_yticklabels(class_names)
+    for i, j in zip(*np.nonzero(matrix)):
+        ax.text(j, i, int(matrix[i, j]), ha="center", va="center", fontsize=7, color="white")
+    ax.set_title(title)
+    ax.set_xlabel("Predicted label")
+    ax.set_ylabel("True label")
+    fig.tight_layout()
+    fig.savefig(path, dpi=100)
+    plt.close(fig)
+
+
+def evaluate(n_folds=5, group=True, n_workers=None, use_cache=True, random_state=42, log=print):
+    with timed("prepare", log=log):
+        symptom_frame = build_symptom_frame(load_tables()["symptoms"])
+        label_encoder = LabelEncoder()
+        y = pd.Series(label_encoder.fit_transform(symptom_frame["Disease"]), index=symptom_frame.index)
+        symptom_sets = symptom_frame["Symptoms"]
+        # Vectorized once; every fold's test rows are slices of this matrix
+        symptom_encoder = SymptomEncoder().fit(symptom_sets)
+        X = symptom_encoder.transform(symptom_sets)
+        # factorize, not hash(): string hashes change between runs, and so would the folds and cache keys
+        groups = pd.factorize(symptom_sets.map(",".join))[0] if group else None
+        folds = make_folds(y.to_numpy(), groups, n_folds, random_state)
+
+    with timed("fit", log=log):
+        members, train_labels = fit_folds(folds, symptom_sets, y, symptom_encoder, n_workers, use_cache, log=log)
+
+    names = [HYBRID] + list(members[0])
+    predictions = {name: np.empty(len(y), dtype=int) for name in names}
+    fold_scores = {name: [] for name in names}
+    cost = {}
+    with timed("predict", log=log):
+        for fold, (_, test_index) in enumerate(folds):
+            models = {HYBRID: assemble_voting_classifier(make_hybrid_model(), members[fold], train_labels[fold])}
+            models.update(members[fold])
+            X_test, y_test = X[test_index], y.to_numpy()[test_index]
+            for name, model in models.items():
+                y_pred = model.predict(X_test)
+                predictions[name][test_index] = y_pred
+                fold_scores[name].append({
+                    "accuracy": float(accuracy_score(y_test, y_pred)),
+                    "macro_f1": float(f1_score(y_test, y_pred, average="macro", zero_division=0)),
+                })
+                if fold == 0:
+                    cost[name] = inference_cost(model, X_test)
+
+    class_names = [str(name) for name in label_encoder.classes_]
+    y_true = y.to_numpy()
+    report = {
+        "folds": n_folds,
+        "grouped": group,
+        "rows": len(y_true),
+        "distinct_symptom_sets": int(symptom_sets.nunique()),
+        "models": {
+            name: {**summarize(y_true, predictions[name], fold_scores[name], class_names),
+                   "inference": cost[name]}
+            for name in names
+        },
+    }
+    hybrid = report["models"][HYBRID]
+    report["comparison"] = {
+        name: {
+            "accuracy_vs_hybrid": report["models"][name]["accuracy"] - hybrid["accuracy"],
+            "macro_f1_vs_hybrid": report["models"][name]["macro"]["f1"] - hybrid["macro"]["f1"],
+            "latency_vs_hybrid": cost[name]["single_request_ms"] / cost[HYBRID]["single_request_ms"],
+        }
+        for name in names if name != HYBRID
+    }
+    matrix = confusion_matrix(y_true, predictions[HYBRID], labels=np.arange(len(class_names)))
+    report["confusion_matrix"] = {"labels": class_names, "matrix": matrix.tolist()}
+    return report, matrix, class_names
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Cross-validate the MediScan hybrid model and its members")
+    parser.add_argument("--folds", type=int, default=5)
+    parser.add_argument("--workers", type=int, default=None, help="Processes fitting folds (default: one per core)")
+    parser.add_argument("--no-group", action="store_true",
+                        help="Plain stratified folds; identical symptom sets may fall on both sides")
+    parser.add_argument("--no-cache", action="store_true", help="Refit every member instead of reusing cached fits")
+    parser.add_argument("--output", default=EVALUATION_REPORT_PATH, help="Where to write the JSON report")
+    parser.add_argument("--confusion-matrix", default=CONFUSION_MATRIX_PATH, help="Where to write the image")
+    args = parser.parse_args(argv)
+
+    report, matrix, class_names = evaluate(args.folds, not args.no_group, args.workers, not args.no_cache)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Saved the evaluation report to {args.output}")
+    try:
+        plot_confusion_matrix(matrix, class_names, args.confusion_matrix)
+        print(f"Saved the confusion matrix to {args.confusion_matrix}")
+    except ImportError:
+        print("matplotlib is not installed; skipped the confusion matrix image (the matrix is in the report)")
+
+    print(f"{'model':<20}{'accuracy':>10}{'macro F1':>10}{'fold std':>10}{'ms/request':>12}")
+    for name, result in report["models"].items():
+        print(f"{name:<20}{result['accuracy']:>10.4f}{result['macro']['f1']:>10.4f}"
+              f"{result['fold_accuracy']['std']:>10.4f}{result['inference']['single_request_ms']:>12.3f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
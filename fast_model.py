@@ -0,0 +1,171 @@
+"""Fast-inference model for MediScan.
+
+The app accepts at most four symptoms from a fixed vocabulary, so the set
+of inputs that matter in practice is small. ``LookupClassifier`` is
+distilled from the hybrid model: every symptom combination seen in
+training, and every non-empty subset of one, is labelled by the hybrid
+model and stored in a dictionary keyed on the row's active columns.
+Anything not in the table falls through to a single decision tree trained
+on hybrid-model labels for those combinations plus random symptom picks.
+
+Built by ``python model_training.py --fast-model``, which stores it in the
+model bundle, and selected in the app with ``MEDISCAN_MODEL=fast``.
+"""
+
+import itertools
+import time
+
+import numpy as np
+from scipy import sparse
+from sklearn.tree import DecisionTreeClassifier
+
+from inference import predict_proba
+
+FAST_MODEL_REPORT_PATH = "fast_model_report.json"
+
+
+def _row_keys(X):
+    # One bytes key per CSR row: the sorted active column indices
+    X = X.tocsr()
+    if not X.has_sorted_indices:
+        X = X.copy()
+        X.sort_indices()
+    indices = X.indices.astype(np.int32, copy=False)
+    return [indices[X.indptr[i]:X.indptr[i + 1]].tobytes() for i in range(X.shape[0])]
+
+
+def _random_symptom_rows(n_rows, n_features, max_symptoms=4, random_state=42):
+    # Arbitrary 1-4 symptom picks, as a user could make in the app
+    rng = np.random.default_rng(random_state)
+    sizes = rng.integers(1, max_symptoms + 1, size=n_rows)
+    rows = [np.sort(rng.choice(n_features, size=size, replace=False)) for size in sizes]
+    indptr = np.cumsum([0] + [len(r) for r in rows])
+    indices = np.concatenate(rows).astype(np.int32)
+    return sparse.csr_matrix((np.ones(len(indices), dtype=np.float32), indices, indptr), shape=(n_rows, n_features))
+
+
+class LookupClassifier:
+    """Dictionary lookup over symptom combinations with a decision-tree fallback."""
+
+    def __init__(self, table, fallback, classes, proba_table=None):
+        self.table = table
+        self.fallback = fallback
+        self.classes_ = classes
+        # Teacher's (soft-vote) class probabilities for every table entry
+        self.proba_table = proba_table or {}
+
+    @staticmethod
+    def _combinations(symptom_encoder, symptom_sets):
+        # Every non-empty subset of every symptom set, one multi-hot row each
+        combinations = set()
+        for symptoms in symptom_sets:
+            columns = symptom_encoder.indices(symptoms)
+            for size in range(1, len(columns) + 1):
+                combinations.update(itertools.combinations(columns, size))
+        combinations = sorted(combinations)
+
+        indptr = np.cumsum([0] + [len(c) for c in combinations])
+        indices = np.fromiter(itertools.chain.from_iterable(combinations), dtype=np.int32)
+        return sparse.csr_matrix(
+            (np.ones(len(indices), dtype=np.float32), indices, indptr),
+            shape=(len(combinations), len(symptom_encoder.vocabulary_)),
+        )
+
+    @classmethod
+    def distill(cls, teacher, symptom_encoder, symptom_sets, synthetic_rows=20000, random_state=42):
+        """Label every seen combination and its subsets with ``teacher`` and build the table.
+
+        ``synthetic_rows`` random 1-4 symptom picks, also labelled by ``teacher``,
+        are added to the fallback tree's training data only.
+        """
+        X = cls._combinations(symptom_encoder, symptom_sets)
+        labels = teacher.predict(X)
+
+        keys = _row_keys(X)
+        table = dict(zip(keys, labels.tolist()))
+        proba_table = dict(zip(keys, predict_proba(teacher, X).astype(np.float32)))
+
+        X_fallback, y_fallback = X, labels
+        if synthetic_rows:
+            X_synthetic = _random_symptom_rows(synthetic_rows, X.shape[1], random_state=random_state)
+            X_fallback = sparse.vstack([X, X_synthetic]).tocsr()
+            y_fallback = np.concatenate([labels, teacher.predict(X_synthetic)])
+        fallback = DecisionTreeClassifier(random_state=random_state).fit(X_fallback, y_fallback)
+        return cls(table, fallback, np.asarray(teacher.classes_), proba_table)
+
+    def update(self, teacher, symptom_encoder, symptom_sets):
+        """Relabel the combinations of ``symptom_sets`` (and add new ones) with an updated ``teacher``.
+
+        Costs grow with the number of symptom sets given, not the table size;
+        other entries and the fallback tree keep their labels until the next distill.
+        """
+        X = self._combinations(symptom_encoder, symptom_sets)
+        if X.shape[0] == 0:
+            return self
+        keys = _row_keys(X)
+        self.table.update(zip(keys, teacher.predict(X).tolist()))
+        self.proba_table.update(zip(keys, predict_proba(teacher, X).astype(np.float32)))
+        return self
+
+    def predict(self, X):
+        X = sparse.csr_matrix(X)
+        keys = _row_keys(X)
+        labels = np.empty(len(keys), dtype=self.classes_.dtype)
+        missing = []
+        table = self.table
+        for i, key in enumerate(keys):
+            label = table.get(key)
+            if label is None:
+                missing.append(i)
+            else:
+                labels[i] = label
+        if missing:
+            labels[missing] = self.fallback.predict(X[missing])
+        return labels
+
+    def predict_proba(self, X):
+        X = sparse.csr_matrix(X)
+        keys = _row_keys(X)
+        proba = np.zeros((len(keys), len(self.classes_)), dtype=np.float32)
+        missing = []
+        for i, key in enumerate(keys):
+            row = self.proba_table.get(key)
+            if row is None:
+                missing.append(i)
+            else:
+                proba[i] = row
+        if missing:
+            # The fallback tree may have seen only some classes; place its columns
+            columns = np.searchsorted(self.classes_, self.fallback.classes_)
+            proba[np.ix_(missing, columns)] = self.fallback.predict_proba(X[missing])
+        return proba
+
+
+def _single_request_latency_ms(model, X, repeats=200):
+    rows = [X[i] for i in range(min(repeats, X.shape[0]))]
+    start = time.perf_counter()
+    for row in rows:
+        model.predict(row)
+    return (time.perf_counter() - start) / len(rows) * 1000
+
+
+def parity_report(fast_model, hybrid_model, X_test, y_test, random_rows=2000):
+    """Compare the fast model against the hybrid model on held-out data.
+
+    ``random_agreement_with_hybrid`` covers arbitrary symptom picks, most of
+    which miss the lookup table and exercise the decision-tree fallback.
+    """
+    fast_pred = fast_model.predict(X_test)
+    hybrid_pred = hybrid_model.predict(X_test)
+    X_random = _random_symptom_rows(random_rows, X_test.shape[1], random_state=0)
+    random_agreement = np.mean(fast_model.predict(X_random) == hybrid_model.predict(X_random))
+    return {
+        "test_rows": int(X_test.shape[0]),
+        "lookup_entries": len(fast_model.table),
+        "agreement_with_hybrid": float(np.mean(fast_pred == hybrid_pred)),
+        "random_agreement_with_hybrid": float(random_agreement),
+        "fast_accuracy": float(np.mean(fast_pred == np.asarray(y_test))),
+        "hybrid_accuracy": float(np.mean(hybrid_pred == np.asarray(y_test))),
+        "fast_latency_ms": _single_request_latency_ms(fast_model, X_test),
+        "hybrid_latency_ms": _single_request_latency_ms(hybrid_model, X_test),
+    }
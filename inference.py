@@ -0,0 +1,443 @@
+"""Headless disease prediction for MediScan.
+
+Scores many symptom sets at once: every input chunk is vectorized into a
+single sparse matrix, predicted through the hybrid model in one call,
+decoded in bulk and joined with the per-disease recommendations.
+
+Usage:
+    python inference.py patients.jsonl predictions.csv
+    python inference.py patients.csv predictions.parquet --chunk-size 50000
+
+Input may be JSONL (one object per line with a "symptoms" list or comma
+separated string) or CSV (either Symptom_1..Symptom_4 columns or a
+"Symptoms" column as written to the patient records). Any other input
+columns are carried through to the output.
+
+Rows without symptoms, or whose symptoms the model does not recognize,
+are not predicted: their "Status" column says why and the prediction
+columns are left empty.
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from metrics import METRICS
+from model_bundle import BUNDLE_ROOT, MODEL_FILES, BundleError, load_bundle, resolve_bundle
+
+SYMPTOM_COLUMNS = ["Symptom_1", "Symptom_2", "Symptom_3", "Symptom_4"]
+
+
+def model_kind(kind=None):
+    """Validated model kind ("hybrid" or "fast"), defaulting to $MEDISCAN_MODEL or "hybrid"."""
+    kind = (kind or os.environ.get("MEDISCAN_MODEL") or "hybrid").lower()
+    if kind not in MODEL_FILES:
+        raise ValueError(f"Unknown model kind {kind!r}; expected one of: {', '.join(MODEL_FILES)}")
+    return kind
+
+
+def _load_versioned(kind, bundle_root, with_model=True):
+    # Version tag and artifacts taken from the same bundle, so they always agree
+    with METRICS.timer("load_artifacts"):
+        bundle = load_bundle(bundle_root)
+        kind = model_kind(kind)
+        model = bundle.model_for(kind) if with_model else None
+        artifacts = model, bundle.symptom_encoder, bundle.label_encoder, bundle.recommendations
+        return f"{bundle.version}:{kind}", artifacts
+
+
+def load_artifacts(kind=None, bundle_root=BUNDLE_ROOT):
+    """Load (model, symptom_encoder, label_encoder, recommendations) from the current bundle."""
+    return _load_versioned(kind, bundle_root)[1]
+
+
+def artifacts_version(kind=None, bundle_root=BUNDLE_ROOT):
+    """Version tag of the model that ``load_artifacts`` would serve, e.g. for cache keys."""
+    return f"{load_bundle(bundle_root, verify=False).version}:{model_kind(kind)}"
+
+
+class LiveArtifacts:
+    """The current bundle's artifacts, swapped for a new version when ``LATEST`` moves.
+
+    ``current()`` returns ``(version, artifacts)`` and checks the ``LATEST``
+    pointer at most every ``check_interval`` seconds (``None`` never checks).
+    A new version is loaded in a background thread while the old one keeps
+    serving, then swapped in with a single assignment. Callers that already
+    hold the old artifacts finish with them undisturbed. A version that
+    fails to load is skipped and the old one stays in place.
+
+    With ``with_model=False`` the model itself is not loaded (it is None in
+    the artifacts), for processes that send predictions to a server.
+    """
+
+    def __init__(self, kind=None, bundle_root=BUNDLE_ROOT, check_interval=5.0, log=print, with_model=True):
+        self.kind = model_kind(kind)
+        self.bundle_root = bundle_root
+        self.check_interval = check_interval
+        self.log = log
+        self.with_model = with_model
+        self._state = _load_versioned(self.kind, bundle_root, with_model)
+        self._lock = threading.Lock()
+        self._next_check = time.monotonic() + (check_interval or 0)
+        self._loading = None
+        self._failed = None
+
+    @property
+    def version(self):
+        return self._state[0]
+
+    def current(self):
+        if self.check_interval is not None and time.monotonic() >= self._next_check:
+            self._check()
+        return self._state
+
+    def _check(self):
+        with self._lock:
+            if time.monotonic() < self._next_check or self._loading is not None:
+                return
+            self._next_check = time.monotonic() + self.check_interval
+            try:
+                latest = os.path.basename(resolve_bundle(self.bundle_root))
+            except BundleError:
+                return
+            latest = f"{latest}:{self.kind}"
+            if latest in (self.version, self._failed):
+                return
+            self._loading = threading.Thread(target=self._reload, args=(latest,), name="bundle-reload", daemon=True)
+            self._loading.start()
+
+    def _reload(self, latest):
+        try:
+            state = _load_versioned(self.kind, self.bundle_root, self.with_model)
+            if state[0] != self.version:
+                self.log(f"Swapping model {self.version} -> {state[0]}")
+            self._state = state
+        except (BundleError, OSError) as e:
+            self._failed = latest
+            self.log(f"Keeping model {self.version}; could not load the new bundle: {e}")
+        finally:
+            self._loading = None
+
+    def wait(self, timeout=None):
+        """Block until a reload in progress (if any) has finished."""
+        loading = self._loading
+        if loading is not None:
+            loading.join(timeout)
+
+
+def parse_symptoms(value):
+    if isinstance(value, str):
+        value = value.split(",")
+    if value is None or (not isinstance(value, (list, tuple, np.ndarray)) and pd.isna(value)):
+        return []
+    return [str(s).strip() for s in value if pd.notna(s) and str(s).strip()]
+
+
+def encode_symptoms(symptom_sets, symptom_encoder):
+    """Feature matrix for ``symptom_sets``.
+
+    Models trained before the multi-hot ``SymptomEncoder`` ship a text
+    CountVectorizer instead; those still get the space-joined symptom string.
+    """
+    with METRICS.timer("vectorize"):
+        return _encode(symptom_sets, symptom_encoder)
+
+
+def _encode(symptom_sets, symptom_encoder):
+    if hasattr(symptom_encoder, "build_analyzer"):
+        return symptom_encoder.transform([" ".join(parse_symptoms(s)) for s in symptom_sets])
+    return symptom_encoder.transform(symptom_sets)
+
+
+def recognized(symptom_sets, symptom_encoder):
+    """Boolean array: whether each symptom set has at least one symptom the encoder knows.
+
+    A set without one encodes to an all-zero row, which the model would
+    still map to some disease.
+    """
+    if len(symptom_sets) == 0:
+        return np.array([], dtype=bool)
+    return _encode(symptom_sets, symptom_encoder).getnnz(axis=1) > 0
+
+
+def predict_labels(symptom_sets, model, symptom_encoder, chunk_size=10000):
+    """Predict the encoded disease label for every symptom set in ``symptom_sets``."""
+    if len(symptom_sets) == 0:
+        return np.array([], dtype=int)
+    matrix = encode_symptoms(symptom_sets, symptom_encoder)
+    if getattr(model, "voting", None) == "hard":
+        # Same vote as model.predict, but each member's time is recorded separately
+        predict = lambda X: _predict_with_proba(model, X)[0]
+    else:
+        predict = model.predict
+    with METRICS.timer("predict"):
+        return np.concatenate([
+            predict(matrix[start:start + chunk_size])
+            for start in range(0, matrix.shape[0], chunk_size)
+        ])
+
+
+def predict_proba(model, X):
+    """Class probabilities for feature matrix ``X``, columns in ``model.classes_`` order.
+
+    A hard-voting VotingClassifier has no ``predict_proba``; its members'
+    probabilities are averaged instead (a soft vote), one pass per member.
+    Probabilities are calibrated with ``calibrate_proba``.
+    """
+    if getattr(model, "voting", None) == "hard":
+        weights = model.weights
+        proba = np.average([member.predict_proba(X) for member in model.estimators_], axis=0, weights=weights)
+    else:
+        proba = model.predict_proba(X)
+    return calibrate_proba(model, proba)
+
+
+def calibrate_proba(model, proba):
+    """``proba`` temperature-scaled by ``model.score_temperature_``; unchanged for models without one.
+
+    Averaged member probabilities are not probabilities of being right: the
+    members agree on easy cases and spread out on hard ones. model_training.py
+    fits the temperature on held-out rows (``fit_temperature``). Scaling keeps
+    each row's ranking, so the top class does not change.
+    """
+    temperature = getattr(model, "score_temperature_", None)
+    if not temperature or temperature == 1:
+        return proba
+    scaled = np.power(np.clip(proba, 1e-12, 1.0), 1.0 / temperature)
+    return scaled / scaled.sum(axis=1, keepdims=True)
+
+
+def fit_temperature(proba, y):
+    """Temperature minimizing the log loss of ``proba`` (uncalibrated) for true column indices ``y``."""
+    from scipy.optimize import minimize_scalar
+
+    log_proba = np.log(np.clip(proba, 1e-12, 1.0))
+    rows = np.arange(len(y))
+
+    def log_loss(log_temperature):
+        scaled = log_proba / np.exp(log_temperature)
+        scaled -= scaled.max(axis=1, keepdims=True)
+        return -np.mean(scaled[rows, y] - np.log(np.exp(scaled).sum(axis=1)))
+
+    return float(np.exp(minimize_scalar(log_loss, bounds=(-4.0, 4.0), method="bounded").x))
+
+
+def top_k_from_proba(proba, k):
+    """Indices and scores of the ``k`` most probable columns per row, best first.
+
+    Uses argpartition so each row costs O(n_classes) plus a sort of only k items.
+    """
+    k = max(1, min(k, proba.shape[1]))
+    if k < proba.shape[1]:
+        top = np.argpartition(-proba, k - 1, axis=1)[:, :k]
+    else:
+        top = np.tile(np.arange(k), (proba.shape[0], 1))
+    order = np.argsort(-np.take_along_axis(proba, top, axis=1), axis=1, kind="stable")
+    top = np.take_along_axis(top, order, axis=1)
+    return top, np.take_along_axis(proba, top, axis=1)
+
+
+def _predict_with_proba(model, X):
+    # Predicted labels and class probabilities from a single pass over the model.
+    # For a hard-voting ensemble each member's vote is the argmax of its own
+    # probabilities, so the hard vote is recovered from the same member outputs.
+    if getattr(model, "voting", None) == "hard":
+        member_proba = []
+        for (name, _), member in zip(model.estimators, model.estimators_):
+            with METRICS.timer(f"predict.{name}"):
+                member_proba.append(member.predict_proba(X))
+        member_proba = np.asarray(member_proba)
+        weights = np.ones(len(member_proba)) if model.weights is None else np.asarray(model.weights, dtype=float)
+        votes = np.zeros(member_proba.shape[1:])
+        rows = np.arange(member_proba.shape[1])
+        for weight, member_votes in zip(weights, member_proba.argmax(axis=2)):
+            votes[rows, member_votes] += weight
+        labels = np.asarray(model.classes_)[votes.argmax(axis=1)]
+        return labels, calibrate_proba(model, np.average(member_proba, axis=0, weights=weights))
+    with METRICS.timer("predict"):
+        return model.predict(X), calibrate_proba(model, model.predict_proba(X))
+
+
+def predict_top_k(symptom_sets, model, symptom_encoder, k=3, chunk_size=10000):
+    """Predicted label plus a top-``k`` differential for every symptom set.
+
+    Returns ``(labels, top_labels, top_scores)``; the top-k arrays are shaped
+    ``(n_sets, k)``, best first. Scores are the ensemble's mean member
+    probabilities, calibrated (``calibrate_proba``). ``labels`` is the soft
+    vote, i.e. always the first entry of the differential; for a
+    hard-voting ensemble it can differ from ``predict_labels`` when the
+    members disagree.
+    """
+    if len(symptom_sets) == 0:
+        return np.array([], dtype=int), np.empty((0, k), dtype=int), np.empty((0, k))
+    matrix = encode_symptoms(symptom_sets, symptom_encoder)
+    classes = np.asarray(model.classes_)
+    labels, top_labels, top_scores = [], [], []
+    for start in range(0, matrix.shape[0], chunk_size):
+        _, proba = _predict_with_proba(model, matrix[start:start + chunk_size])
+        top, scores = top_k_from_proba(proba, k)
+        labels.append(classes[top[:, 0]])
+        top_labels.append(classes[top])
+        top_scores.append(scores)
+    return np.concatenate(labels), np.concatenate(top_labels), np.concatenate(top_scores)
+
+
+def predict_diseases(symptom_sets, model, symptom_encoder, encoder, chunk_size=10000):
+    """Predict a disease name for every symptom set in ``symptom_sets``."""
+    if len(symptom_sets) == 0:
+        return np.array([], dtype=object)
+    return encoder.inverse_transform(predict_labels(symptom_sets, model, symptom_encoder, chunk_size))
+
+
+def read_symptom_sets(path, chunk_size):
+    """Yield input chunks as DataFrames with a ``symptoms`` list column."""
+    if path.endswith((".jsonl", ".json")):
+        reader = pd.read_json(path, lines=True, chunksize=chunk_size)
+    else:
+        reader = pd.read_csv(path, chunksize=chunk_size)
+
+    for chunk in reader:
+        if "symptoms" in chunk.columns:
+            symptoms = chunk["symptoms"].map(parse_symptoms)
+            chunk = chunk.drop(columns="symptoms")
+        elif "Symptoms" in chunk.columns:
+            symptoms = chunk["Symptoms"].map(parse_symptoms)
+        elif any(col in chunk.columns for col in SYMPTOM_COLUMNS):
+            present = [col for col in SYMPTOM_COLUMNS if col in chunk.columns]
+            symptoms = pd.Series(
+                [parse_symptoms(row) for row in chunk[present].itertuples(index=False)],
+                index=chunk.index,
+            )
+        else:
+            raise ValueError(f"{path}: no 'symptoms', 'Symptoms' or Symptom_1..4 columns found")
+        chunk = chunk.copy()
+        chunk["symptoms"] = symptoms.map(", ".join)
+        yield chunk, symptoms.tolist()
+
+
+def _parquet_frame(frame):
+    """``frame`` with object columns holding lists or mixed types turned into text, as in the CSV output.
+
+    Numeric, boolean and plain string columns keep their dtypes.
+    """
+    frame = frame.copy()
+    for col in frame.columns[frame.dtypes == object]:
+        present = frame[col].notna()
+        if not frame.loc[present, col].map(type).eq(str).all():
+            frame[col] = frame[col].astype(str).where(present, None)
+    return frame
+
+
+class _OutputWriter:
+    """Streams result chunks to CSV or Parquet without holding them all."""
+
+    def __init__(self, path):
+        self.path = path
+        self.parquet = path.endswith(".parquet")
+        self._writer = None
+        self._first = True
+
+    def write(self, frame):
+        if self.parquet:
+            try:
+                import pyarrow as pa
+                import pyarrow.parquet as pq
+            except ImportError:
+                raise RuntimeError("Parquet output requires pyarrow. Install with: pip install pyarrow")
+            table = pa.Table.from_pandas(_parquet_frame(frame), preserve_index=False)
+            if self._writer is None:
+                # A column that is empty in the first chunk has no type yet; store it as text
+                schema = pa.schema([
+                    field.with_type(pa.string()) if pa.types.is_null(field.type) else field for field in table.schema
+                ])
+                self._writer = pq.ParquetWriter(self.path, schema)
+            if not table.schema.equals(self._writer.schema):
+                # Later chunks can differ, e.g. an integer column with a missing value becomes float
+                try:
+                    table = table.cast(self._writer.schema)
+                except (pa.ArrowInvalid, pa.ArrowNotImplementedError) as e:
+                    raise ValueError(f"{self.path}: chunk columns do not match the first chunk: {e}") from e
+            self._writer.write_table(table)
+        else:
+            frame.to_csv(self.path, mode="w" if self._first else "a", header=self._first, index=False)
+        self._first = False
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+
+
+def run_batch(input_path, output_path, artifacts, chunk_size=10000, top_k=0, attribution=None):
+    model, symptom_encoder, encoder, recommendations = artifacts
+    if attribution:
+        # Imported here: attribution.py builds on this module
+        from attribution import explain_top_k, format_attribution
+    diseases = np.asarray(recommendations.diseases, dtype=object)
+    ranks = min(top_k, len(diseases))
+    writer = _OutputWriter(output_path)
+    total = 0
+    try:
+        for chunk, symptom_sets in read_symptom_sets(input_path, chunk_size):
+            # An all-zero feature row would still be given a disease; such rows are only reported
+            known = recognized(symptom_sets, symptom_encoder)
+            status = np.where(known, "ok", "no recognized symptoms").astype(object)
+            status[[not symptoms for symptoms in symptom_sets]] = "no symptoms"
+            kept = [symptoms for symptoms, keep in zip(symptom_sets, known) if keep]
+            if attribution:
+                labels, top_labels, top_scores, attributions = explain_top_k(
+                    kept, model, symptom_encoder, max(top_k, 1), attribution, chunk_size
+                ) if kept else ([], None, None, [])
+            elif top_k:
+                labels, top_labels, top_scores = predict_top_k(
+                    kept, model, symptom_encoder, top_k, chunk_size
+                ) if kept else ([], None, None)
+            else:
+                labels = predict_labels(kept, model, symptom_encoder, chunk_size)
+            details = recommendations.lookup(labels).rename(columns={"Disease": "Predicted Disease"})
+            details.index = chunk.index[known]
+            if attribution:
+                details["Attribution"] = [format_attribution(weights) for weights in attributions]
+            for rank in range(ranks):
+                details[f"Top_{rank + 1}"] = diseases[top_labels[:, rank]] if kept else []
+                details[f"Top_{rank + 1}_Score"] = top_scores[:, rank].round(4) if kept else []
+            details = details.reindex(chunk.index)
+            details.insert(0, "Status", status)
+            writer.write(pd.concat([chunk, details], axis=1))
+            total += len(chunk)
+    finally:
+        writer.close()
+    return total
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Batch disease prediction for MediScan")
+    parser.add_argument("input", help="CSV or JSONL file of symptom sets")
+    parser.add_argument("output", help="Output .csv or .parquet file")
+    parser.add_argument("--chunk-size", type=int, default=10000, help="Rows scored per model call")
+    parser.add_argument("--model-kind", choices=sorted(MODEL_FILES), help="hybrid (default) or fast")
+    parser.add_argument("--bundle", default=BUNDLE_ROOT, help="Model bundle directory")
+    parser.add_argument("--top-k", type=int, default=0, help="Also output the K most probable diseases with scores")
+    parser.add_argument("--attribution", choices=["table", "occlusion"],
+                        help="Also output each symptom's weight in the prediction (table is fastest)")
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.input):
+        parser.error(f"input file not found: {args.input}")
+
+    start = time.perf_counter()
+    artifacts = load_artifacts(args.model_kind, args.bundle)
+    loaded = time.perf_counter()
+    total = run_batch(args.input, args.output, artifacts, args.chunk_size, args.top_k, args.attribution)
+    elapsed = time.perf_counter() - loaded
+    print(f"Loaded artifacts in {loaded - start:.2f}s")
+    print(f"Scored {total:,} symptom sets in {elapsed:.2f}s -> {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,441 @@
+"""Load test for MediScan's Examine path under concurrent sessions.
+
+Every simulated session does what app.py does when a clinician clicks
+Examine: predict the symptom set (differential and attribution included),
+look up the recommendations and append the patient record to the shared
+record store. Sessions are threads, as Streamlit runs them; ``--processes``
+runs several app-like processes against the same store, the way replicas
+share ``PATIENT_DATA_FILE``::
+
+    python loadtest.py --sessions 32 --requests 2000
+    python loadtest.py --sessions 16 --processes 4 --backend csv --records /tmp/patient_records.csv
+    python loadtest.py --replay request_log.jsonl --url http://127.0.0.1:8502
+
+Requests are replayed from a JSON lines log (``--replay``) whose lines hold
+``"symptoms"`` or ``"symptom_sets"`` as in ``POST /predict``, optionally
+with ``"patient_name"`` and ``"patient_age"``; lines without symptoms are
+skipped. Without a log, symptom sets are drawn from ``symtoms_df.csv``
+(``benchmark.synthetic_symptom_sets``). With ``--url`` predictions go to a
+running prediction_server.py, as with ``MEDISCAN_PREDICTION_URL``.
+
+The report has throughput, p50/p95/p99 latency of the prediction, the save
+and the whole request, failed requests, and each process's RSS after
+loading the model, at the end and at its peak. After the run the store is
+read back and every saved record must be there exactly once and unchanged;
+lost, duplicated and corrupted records are counted and make the exit
+status non-zero. Without ``--records`` the store is a temporary directory
+that is removed afterwards.
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import traceback
+import uuid
+import warnings
+from datetime import datetime
+from urllib.parse import urlsplit
+
+import numpy as np
+
+from attribution import explain_top_k
+from benchmark import environment, latency_summary, synthetic_symptom_sets
+from inference import LiveArtifacts, parse_symptoms, predict_top_k
+from prediction_cache import PredictionCache
+from record_store import RECORD_COLUMNS, open_record_store
+
+LOAD_PERCENTILES = (50, 95, 99)
+LOADTEST_REPORT_PATH = "loadtest_report.json"
+PRECAUTION_COLUMNS = ["Precaution_1", "Precaution_2", "Precaution_3", "Precaution_4"]
+# Differential size, as DIFFERENTIAL_SIZE in app.py
+DIFFERENTIAL_SIZE = 3
+# Error messages kept per process in the report
+MAX_ERRORS = 20
+
+
+def read_request_log(path):
+    """``(requests, skipped_lines)`` from a JSON lines request log."""
+    requests, skipped = [], 0
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                skipped += 1
+                continue
+            symptom_sets = []
+            if isinstance(entry, dict):
+                symptom_sets = entry.get("symptom_sets") or ([entry["symptoms"]] if entry.get("symptoms") else [])
+            symptom_sets = [parse_symptoms(symptoms) for symptoms in symptom_sets]
+            symptom_sets = [symptoms for symptoms in symptom_sets if symptoms]
+            if not symptom_sets:
+                skipped += 1
+                continue
+            for symptoms in symptom_sets:
+                requests.append({"symptoms": symptoms, "patient_name": entry.get("patient_name"),
+                                 "patient_age": entry.get("patient_age")})
+    return requests, skipped
+
+
+def synthetic_requests(n, random_state=0):
+    rng = np.random.default_rng(random_state)
+    ages = rng.integers(1, 100, size=n)
+    return [{"symptoms": symptoms, "patient_name": None, "patient_age": int(age)}
+            for symptoms, age in zip(synthetic_symptom_sets(n, random_state), ages)]
+
+
+def patient_record(patient_name, patient_age, symptoms, disease_info):
+    """The record app.py's ``save_patient_data`` writes for one examination."""
+    precautions = [
+        disease_info[col] for col in PRECAUTION_COLUMNS
+        if isinstance(disease_info.get(col), str) and disease_info[col].strip()
+    ] or ["No specific precautions available"]
+    return {
+        "Timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "Patient Name": patient_name,
+        "Patient Age": patient_age,
+        "Symptoms": ", ".join(symptoms),
+        "Predicted Disease": disease_info["Disease"],
+        "Medications": str(disease_info["Medication"]),
+        "Diet Recommendations": str(disease_info["Diet"]),
+        "Workout Recommendations": disease_info["workout"],
+        "Precautions": ", ".join(precautions),
+    }
+
+
+def _text(value):
+    # How a record value reads back from any backend: a missing value (None,
+    # NaN, or "nan" from CSV) is an empty field
+    if value is None or (isinstance(value, float) and value != value) or value == "nan":
+        return ""
+    return str(value)
+
+
+def current_rss_mb():
+    # Resident set size now (benchmark.peak_rss_mb only has the peak); None without /proc
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1 << 20)
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class _MemorySampler:
+    """Samples the process RSS every ``interval`` seconds in a background thread."""
+
+    def __init__(self, interval=0.25):
+        self.interval = interval
+        self.samples = []
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="rss-sampler", daemon=True)
+
+    def _run(self):
+        while True:
+            rss = current_rss_mb()
+            if rss is not None:
+                self.samples.append(rss)
+            if self._stop.wait(self.interval):
+                return
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        rss = current_rss_mb()
+        if rss is not None:
+            self.samples.append(rss)
+        if not self.samples:
+            return None
+        return {"start_mb": self.samples[0], "end_mb": self.samples[-1], "peak_mb": max(self.samples),
+                "growth_mb": self.samples[-1] - self.samples[0]}
+
+
+def make_predict_fn(live, url=None, attribution="occlusion"):
+    """Predicted label per symptom set, computed as app.py's ``predict_symptom_sets`` does."""
+    if url:
+        from prediction_server import PredictionClient
+
+        parts = urlsplit(url)
+        local = threading.local()
+
+        def predict(symptom_sets):
+            # One kept-alive connection per session thread
+            if getattr(local, "client", None) is None:
+                local.client = PredictionClient(parts.hostname, parts.port or 80)
+            return [prediction["label"] for prediction in local.client.predict_many(symptom_sets)]
+        return predict
+
+    def predict(symptom_sets):
+        _, (model, symptom_encoder, _, _) = live.current()
+        if attribution:
+            labels = explain_top_k(symptom_sets, model, symptom_encoder, DIFFERENTIAL_SIZE, attribution)[0]
+        else:
+            labels = predict_top_k(symptom_sets, model, symptom_encoder, DIFFERENTIAL_SIZE)[0]
+        return [int(label) for label in labels]
+    return predict
+
+
+def run_sessions(requests, store, predict_fn, live, tag, sessions=8, think_ms=0, cache_size=0, start_barrier=None):
+    """Run ``requests`` over ``sessions`` threads; returns this process's timings, saves and errors."""
+    cache = PredictionCache(live.version, maxsize=cache_size) if cache_size else None
+    position = iter(range(len(requests)))
+    position_lock = threading.Lock()
+    timings = {"predict": [], "save": [], "total": []}
+    saved, errors = {}, []
+    results_lock = threading.Lock()
+    failed = [0]
+
+    def session(number):
+        while True:
+            with position_lock:
+                i = next(position, None)
+            if i is None:
+                return
+            request = requests[i]
+            name = f"{request['patient_name'] or 'Load test'} #{tag}-{number}-{i}"
+            try:
+                t0 = time.perf_counter()
+                if cache is not None:
+                    label = cache.predict([request["symptoms"]], predict_fn, live.version)[0]
+                else:
+                    label = predict_fn([request["symptoms"]])[0]
+                _, (_, _, _, recommendations) = live.current()
+                record = patient_record(name, request["patient_age"], request["symptoms"],
+                                        recommendations.by_label(label))
+                t1 = time.perf_counter()
+                store.append(record)
+                t2 = time.perf_counter()
+            except Exception as e:
+                with results_lock:
+                    failed[0] += 1
+                    if len(errors) < MAX_ERRORS:
+                        errors.append(f"{type(e).__name__}: {e}\n{traceback.format_exc(limit=3)}")
+                continue
+            with results_lock:
+                timings["predict"].append(t1 - t0)
+                timings["save"].append(t2 - t1)
+                timings["total"].append(t2 - t0)
+                saved[name] = [_text(record.get(col)) for col in RECORD_COLUMNS]
+            if think_ms:
+                time.sleep(think_ms / 1000)
+
+    threads = [threading.Thread(target=session, args=(n,), name=f"session-{n}") for n in range(sessions)]
+    if start_barrier is not None:
+        start_barrier.wait()
+    memory = _MemorySampler().start()
+    started = time.time()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    finished = time.time()
+    return {"started": started, "finished": finished, "timings": timings, "saved": saved,
+            "failed": failed[0], "errors": errors, "memory": memory.stop()}
+
+
+def _process_main(number, requests, records_path, backend, kind, url, attribution, sessions, think_ms, cache_size,
+                  tag, start_barrier, results):
+    # Under contention, predictions from session threads make scikit-learn warn about
+    # its joblib config on most calls. It swaps the warning filters inside every
+    # predict, which races with a filter set here, so the message is dropped on display.
+    show = warnings.showwarning
+
+    def showwarning(message, *args, **kwargs):
+        if "sklearn.utils.parallel.delayed" not in str(message):
+            show(message, *args, **kwargs)
+    warnings.showwarning = showwarning
+    try:
+        live = LiveArtifacts(kind, with_model=not url, log=lambda message: None)
+        store = open_record_store(records_path, backend)
+        predict_fn = make_predict_fn(live, url, attribution)
+        # Warm up outside the timed run, as an app process would be after its first request
+        predict_fn([requests[0]["symptoms"]])
+        result = run_sessions(requests, store, predict_fn, live, f"{tag}-{number}", sessions, think_ms, cache_size,
+                              start_barrier)
+    except Exception:
+        start_barrier.abort()
+        result = {"error": traceback.format_exc()}
+    results.put((number, result))
+
+
+def run_processes(requests, records_path, backend=None, kind=None, url=None, attribution="occlusion", processes=1,
+                  sessions=8, think_ms=0, cache_size=0, tag=None):
+    """Split ``requests`` over ``processes`` processes of ``sessions`` threads each; one result per process."""
+    tag = tag or uuid.uuid4().hex[:8]
+    context = multiprocessing.get_context()
+    barrier = context.Barrier(processes)
+    results = context.Queue()
+    workers = [
+        context.Process(target=_process_main, name=f"loadtest-{number}",
+                        args=(number, requests[number::processes], records_path, backend, kind, url, attribution,
+                              sessions, think_ms, cache_size, tag, barrier, results))
+        for number in range(processes)
+    ]
+    for worker in workers:
+        worker.start()
+    # Results are read before joining; a process does not exit while its queued result is unread
+    collected = dict(results.get() for _ in workers)
+    for worker in workers:
+        worker.join()
+    failures = [result["error"] for result in collected.values() if "error" in result]
+    if failures:
+        raise RuntimeError("A load test process failed:\n" + failures[0])
+    return tag, [collected[number] for number in range(processes)]
+
+
+def check_records(store, saved, tag):
+    """Compare the store's contents with the records the sessions saved.
+
+    Only records tagged with this run are checked, so the store may hold
+    other records. A row that does not have every record column is counted
+    as corrupted whoever wrote it, since a torn write can lose the tag.
+    """
+    found, duplicated, corrupted, unexpected, malformed, rows_read = set(), 0, 0, 0, 0, 0
+    position = None
+    while True:
+        rows, position = store.iter_since(position)
+        if not rows:
+            break
+        for row in rows:
+            rows_read += 1
+            if len(row) != len(RECORD_COLUMNS):
+                malformed += 1
+                continue
+            name = str(row[RECORD_COLUMNS.index("Patient Name")])
+            if f"#{tag}-" not in name:
+                continue
+            if name not in saved:
+                unexpected += 1
+            elif name in found:
+                duplicated += 1
+            else:
+                found.add(name)
+                if [_text(value) for value in row] != saved[name]:
+                    corrupted += 1
+    return {
+        "saved": len(saved),
+        "found": len(found),
+        "lost": len(saved) - len(found),
+        "duplicated": duplicated,
+        "corrupted": corrupted + malformed,
+        # Saves that raised but still reached the store
+        "unacknowledged": unexpected,
+        "store_count": store.count(),
+        "store_count_matches": store.count() == rows_read,
+    }
+
+
+def summarize(results, records):
+    def latency(values):
+        return latency_summary(values, LOAD_PERCENTILES) if values else None
+
+    completed = sum(len(result["timings"]["total"]) for result in results)
+    wall = max(result["finished"] for result in results) - min(result["started"] for result in results)
+    return {
+        "completed": completed,
+        "failed": sum(result["failed"] for result in results),
+        "wall_s": wall,
+        "throughput_rps": completed / wall if wall > 0 else None,
+        "latency": {
+            stage: latency([value for result in results for value in result["timings"][stage]])
+            for stage in ("predict", "save", "total")
+        },
+        "records": records,
+        "memory": {f"process-{number}": result["memory"] for number, result in enumerate(results)},
+        "errors": [error for result in results for error in result["errors"]][:MAX_ERRORS],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load test MediScan's predict-and-save path with concurrent sessions")
+    parser.add_argument("--sessions", type=int, default=8, help="Concurrent sessions (threads) per process")
+    parser.add_argument("--processes", type=int, default=1, help="App-like processes sharing the record store")
+    parser.add_argument("--requests", type=int, default=None,
+                        help="Requests to send (default: every replayed request, or 1000 synthetic ones)")
+    parser.add_argument("--replay", default=None, help="JSON lines request log to replay instead of synthetic sets")
+    parser.add_argument("--think-ms", type=float, default=0, help="Pause between a session's requests")
+    parser.add_argument("--records", default=None,
+                        help="Record store to save to (default: a temporary store removed afterwards)")
+    parser.add_argument("--backend", choices=["csv", "sqlite", "archive"], default=None,
+                        help="Record store backend (default: from the path or MEDISCAN_RECORD_BACKEND)")
+    parser.add_argument("--model-kind", choices=["hybrid", "fast"], help="hybrid (default) or fast")
+    parser.add_argument("--url", default=None, help="Send predictions to a prediction server at this URL")
+    parser.add_argument("--attribution", choices=["occlusion", "table", "none"], default="occlusion",
+                        help="Symptom attribution computed with each local prediction, as in the app")
+    parser.add_argument("--cache-size", type=int, default=0,
+                        help="Route predictions through a per-process prediction cache of this size, as the app does")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for synthetic requests")
+    parser.add_argument("--output", default=LOADTEST_REPORT_PATH, help="Where to write the JSON report")
+    args = parser.parse_args(argv)
+
+    if args.replay:
+        requests, skipped = read_request_log(args.replay)
+        print(f"Replaying {len(requests):,} request(s) from {args.replay} ({skipped:,} line(s) without symptoms skipped)")
+        if not requests:
+            parser.error(f"{args.replay} has no requests with symptoms")
+        if args.requests:
+            requests = [requests[i % len(requests)] for i in range(args.requests)]
+    else:
+        requests = synthetic_requests(args.requests or 1000, args.seed)
+    processes = max(1, min(args.processes, len(requests)))
+
+    directory = None
+    records_path = args.records
+    if records_path is None:
+        directory = tempfile.mkdtemp(prefix="mediscan-loadtest-")
+        records_path = os.path.join(directory, "patient_records.csv")
+    try:
+        print(f"{len(requests):,} request(s) over {processes} process(es) x {args.sessions} session(s)")
+        tag, results = run_processes(requests, records_path, args.backend, args.model_kind, args.url,
+                                     None if args.attribution == "none" else args.attribution, processes,
+                                     args.sessions, args.think_ms, args.cache_size)
+        store = open_record_store(records_path, args.backend)
+        saved = {name: row for result in results for name, row in result["saved"].items()}
+        report = {
+            "environment": environment(),
+            "config": {"requests": len(requests), "processes": processes, "sessions": args.sessions,
+                       "think_ms": args.think_ms, "replay": args.replay, "url": args.url,
+                       "model_kind": args.model_kind, "attribution": args.attribution,
+                       "cache_size": args.cache_size, "store": args.records, "backend": type(store).__name__},
+            "run": tag,
+            **summarize(results, check_records(store, saved, tag)),
+        }
+    finally:
+        if directory:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Completed {report['completed']:,}, failed {report['failed']:,} in {report['wall_s']:.2f}s "
+          f"({report['throughput_rps'] or 0:,.1f} requests/s)")
+    for stage, summary in report["latency"].items():
+        if summary:
+            print(f"  {stage:<8}" + "".join(f"  p{p} {summary[f'p{p}_ms']:8.2f}ms" for p in LOAD_PERCENTILES))
+    records = report["records"]
+    print(f"Records: {records['found']:,} of {records['saved']:,} found, {records['lost']:,} lost, "
+          f"{records['duplicated']:,} duplicated, {records['corrupted']:,} corrupted"
+          + ("" if records["store_count_matches"] else f"; store count {records['store_count']:,} is off"))
+    for name, memory in report["memory"].items():
+        if memory:
+            print(f"  {name}: RSS {memory['start_mb']:.1f} -> {memory['end_mb']:.1f} MB "
+                  f"(peak {memory['peak_mb']:.1f}, growth {memory['growth_mb']:+.1f})")
+    for error in report["errors"][:3]:
+        print(f"Error: {error}")
+    print(f"Wrote the load test report to {args.output}")
+    intact = not (records["lost"] or records["duplicated"] or records["corrupted"])
+    return 0 if intact and records["store_count_matches"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
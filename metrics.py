@@ -0,0 +1,204 @@
+"""Per-stage latency instrumentation for MediScan.
+
+Code marks the stages of a request with a timer::
+
+    with METRICS.timer("vectorize"):
+        X = symptom_encoder.transform(symptom_sets)
+
+Each stage gets a fixed-bucket latency histogram. Gauges such as the
+prediction cache hit rate come from collectors that are read only when
+metrics are exported. ``prometheus_text`` renders everything in the
+Prometheus text exposition format, for a scrape endpoint or a file.
+
+Instrumentation is off unless ``MEDISCAN_METRICS`` is set. A disabled timer
+is a shared no-op context manager, so timed code pays one attribute check.
+
+``profile_request`` writes a cProfile dump for each request to
+``MEDISCAN_PROFILE_DIR`` when that variable is set.
+"""
+
+import cProfile
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+from functools import wraps
+
+# Upper bounds in seconds; an implicit +Inf bucket follows
+DEFAULT_BUCKETS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_NULL_TIMER = nullcontext()
+
+
+class Histogram:
+    """Cumulative-bucket latency histogram, as Prometheus exposes it."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        """Estimate the ``q`` quantile by interpolating inside its bucket."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            if seen + count >= rank and count:
+                if i == len(self.buckets):
+                    return self.buckets[-1]  # beyond the last bound
+                lower = self.buckets[i - 1] if i else 0.0
+                return lower + (self.buckets[i] - lower) * (rank - seen) / count
+            seen += count
+        return self.buckets[-1]
+
+
+class _Timer:
+    __slots__ = ("metrics", "stage", "start")
+
+    def __init__(self, metrics, stage):
+        self.metrics = metrics
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.observe(self.stage, time.perf_counter() - self.start)
+        return False
+
+
+class Metrics:
+    """Registry of stage histograms and gauge collectors; safe to share between threads."""
+
+    def __init__(self, enabled=False, buckets=DEFAULT_BUCKETS, prefix="mediscan"):
+        self.enabled = enabled
+        self.buckets = tuple(buckets)
+        self.prefix = prefix
+        self._histograms = {}
+        self._collectors = {}
+        self._lock = threading.Lock()
+
+    def timer(self, stage):
+        """Context manager that records the time spent in its block under ``stage``."""
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(self, stage)
+
+    def timed(self, stage):
+        """Decorator form of ``timer``."""
+        def decorate(func):
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                with _Timer(self, stage):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorate
+
+    def observe(self, stage, seconds):
+        with self._lock:
+            histogram = self._histograms.get(stage)
+            if histogram is None:
+                histogram = self._histograms[stage] = Histogram(self.buckets)
+            histogram.observe(seconds)
+
+    def register_collector(self, name, collect):
+        """Add (or replace) ``collect``, a callable returning ``{gauge_name: value}`` read at export time."""
+        with self._lock:
+            self._collectors[name] = collect
+
+    def gauges(self):
+        with self._lock:
+            collectors = list(self._collectors.values())
+        values = {}
+        for collect in collectors:
+            values.update(collect())
+        return values
+
+    def snapshot(self):
+        """``{stage: {count, mean_ms, p50_ms, p95_ms, p99_ms}}`` for display."""
+        summary = {}
+        with self._lock:
+            for stage, h in sorted(self._histograms.items()):
+                summary[stage] = {
+                    "count": h.count,
+                    "mean_ms": h.sum / h.count * 1000 if h.count else None,
+                    "p50_ms": _ms(h.quantile(0.5)),
+                    "p95_ms": _ms(h.quantile(0.95)),
+                    "p99_ms": _ms(h.quantile(0.99)),
+                }
+        return summary
+
+    def prometheus_text(self):
+        name = f"{self.prefix}_stage_seconds"
+        lines = [f"# HELP {name} Time spent in each request stage.", f"# TYPE {name} histogram"]
+        with self._lock:
+            for stage, h in sorted(self._histograms.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float("inf"),), h.counts):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(f'{name}_bucket{{stage="{stage}",le="{le}"}} {cumulative}')
+                lines.append(f'{name}_sum{{stage="{stage}"}} {h.sum!r}')
+                lines.append(f'{name}_count{{stage="{stage}"}} {h.count}')
+        for gauge, value in sorted(self.gauges().items()):
+            lines.append(f"# TYPE {self.prefix}_{gauge} gauge")
+            lines.append(f"{self.prefix}_{gauge} {float(value)!r}")
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path):
+        """Write ``prometheus_text`` to ``path`` atomically, e.g. for node_exporter's textfile collector."""
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write(self.prometheus_text())
+        os.replace(tmp_path, path)
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+
+
+def _ms(seconds):
+    return None if seconds is None else seconds * 1000
+
+
+METRICS = Metrics(enabled=bool(os.environ.get("MEDISCAN_METRICS")))
+
+
+@contextmanager
+def profile_request(name="request", directory=None):
+    """Profile the block with cProfile and dump the stats to ``directory`` (``MEDISCAN_PROFILE_DIR``).
+
+    Yields the dump path, or None when profiling is off. Only one profiler can
+    run at a time, so a request that overlaps another profiled one is skipped.
+    """
+    directory = directory or os.environ.get("MEDISCAN_PROFILE_DIR")
+    if not directory:
+        yield None
+        return
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:  # another profiler is active in this process
+        yield None
+        return
+    stamp = datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+    path = os.path.join(directory, f"{name}-{stamp}-{threading.get_ident()}.prof")
+    try:
+        yield path
+    finally:
+        profiler.disable()
+        os.makedirs(directory, exist_ok=True)
+        profiler.dump_stats(path)
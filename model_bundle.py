@@ -0,0 +1,274 @@
+"""Versioned model bundle for MediScan.
+
+model_training.py writes every artifact the app needs into one directory
+per training run::
+
+    models/
+        LATEST                      <- name of the current version
+        20260101-120000-1a2b3c4d/
+            manifest.json           <- version, library versions, file hashes
+            model.joblib
+            fast_model.joblib       (only with --fast-model)
+            symptom_encoder.joblib
+            label_encoder.joblib
+            recommendations.feather (recommendations.csv without pyarrow)
+
+Arrays inside the joblib files are stored uncompressed so they can be
+memory-mapped on load and shared between processes through the page cache.
+Loading checks every file against the manifest and raises ``BundleError``
+when anything is missing, corrupt or inconsistent.
+"""
+
+import hashlib
+import json
+import os
+import platform
+import shutil
+import tempfile
+from datetime import datetime
+
+import joblib
+import pandas as pd
+
+from recommendations import RecommendationIndex
+
+BUNDLE_ROOT = "models"
+MANIFEST_NAME = "manifest.json"
+LATEST_NAME = "LATEST"
+FORMAT_VERSION = 1
+
+MODEL_FILES = {
+    "hybrid": "model.joblib",
+    "fast": "fast_model.joblib",
+}
+SYMPTOM_ENCODER_FILE = "symptom_encoder.joblib"
+LABEL_ENCODER_FILE = "label_encoder.joblib"
+
+
+class BundleError(RuntimeError):
+    """Raised when a model bundle is missing, corrupt or inconsistent."""
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _library_versions():
+    versions = {"python": platform.python_version(), "pandas": pd.__version__, "joblib": joblib.__version__}
+    for module in ("sklearn", "xgboost", "numpy"):
+        try:
+            versions[module] = __import__(module).__version__
+        except ImportError:
+            pass
+    return versions
+
+
+def _save_recommendations(index, directory):
+    try:
+        path = os.path.join(directory, "recommendations.feather")
+        index.table.to_feather(path)
+    except ImportError:
+        path = os.path.join(directory, "recommendations.csv")
+        index.table.to_csv(path, index=False)
+    return os.path.basename(path)
+
+
+def _load_recommendations(path):
+    if path.endswith(".feather"):
+        try:
+            table = pd.read_feather(path, memory_map=True)
+        except TypeError:  # older pandas without memory_map
+            table = pd.read_feather(path)
+    else:
+        table = pd.read_csv(path)
+    return RecommendationIndex(table)
+
+
+def save_bundle(model, symptom_encoder, label_encoder, recommendations, root=BUNDLE_ROOT,
+                fast_model=None, metadata=None):
+    """Write a new bundle version under ``root`` and point ``LATEST`` at it. Returns its directory."""
+    os.makedirs(root, exist_ok=True)
+    staging = tempfile.mkdtemp(prefix=".staging-", dir=root)
+
+    files = {"model": MODEL_FILES["hybrid"]}
+    joblib.dump(model, os.path.join(staging, MODEL_FILES["hybrid"]))
+    if fast_model is not None:
+        files["fast_model"] = MODEL_FILES["fast"]
+        joblib.dump(fast_model, os.path.join(staging, MODEL_FILES["fast"]))
+    files["symptom_encoder"] = SYMPTOM_ENCODER_FILE
+    joblib.dump(symptom_encoder, os.path.join(staging, SYMPTOM_ENCODER_FILE))
+    files["label_encoder"] = LABEL_ENCODER_FILE
+    joblib.dump(label_encoder, os.path.join(staging, LABEL_ENCODER_FILE))
+    files["recommendations"] = _save_recommendations(recommendations, staging)
+
+    hashes = {name: _sha256(os.path.join(staging, filename)) for name, filename in files.items()}
+    content_hash = hashlib.sha256("".join(hashes[name] for name in sorted(hashes)).encode()).hexdigest()
+    version = f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{content_hash[:8]}"
+
+    manifest = {
+        "format_version": FORMAT_VERSION,
+        "version": version,
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "libraries": _library_versions(),
+        "n_classes": len(label_encoder.classes_),
+        "n_features": len(symptom_encoder.vocabulary_),
+        "files": {name: {"path": files[name], "sha256": hashes[name]} for name in files},
+        "metadata": metadata or {},
+    }
+    with open(os.path.join(staging, MANIFEST_NAME), "w") as f:
+        json.dump(manifest, f, indent=2)
+
+    directory = os.path.join(root, version)
+    os.replace(staging, directory)
+    _write_latest(root, version)
+    return directory
+
+
+def _write_latest(root, version):
+    # Atomic pointer update so readers never see a half-written name
+    tmp_path = os.path.join(root, f".{LATEST_NAME}.tmp")
+    with open(tmp_path, "w") as f:
+        f.write(version)
+    os.replace(tmp_path, os.path.join(root, LATEST_NAME))
+
+
+def prune_bundles(root=BUNDLE_ROOT, keep=5):
+    """Delete all but the ``keep`` newest versions; the one ``LATEST`` points at is always kept.
+
+    Processes still serving a deleted version keep working: their files stay
+    open (or memory-mapped) until they are released.
+    """
+    current = os.path.basename(resolve_bundle(root))
+    versions = sorted(
+        name for name in os.listdir(root)
+        if not name.startswith(".") and os.path.isfile(os.path.join(root, name, MANIFEST_NAME))
+    )
+    removed = []
+    for name in versions[:max(len(versions) - keep, 0)]:
+        if name != current:
+            shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+            removed.append(name)
+    return removed
+
+
+def resolve_bundle(root=BUNDLE_ROOT):
+    """Directory of the current bundle version under ``root``."""
+    latest = os.path.join(root, LATEST_NAME)
+    if not os.path.exists(latest):
+        raise BundleError(f"No model bundle found: {latest} does not exist. Run model_training.py first.")
+    with open(latest) as f:
+        version = f.read().strip()
+    directory = os.path.join(root, version)
+    if not os.path.isdir(directory):
+        raise BundleError(f"{latest} points at missing bundle version {version!r}")
+    return directory
+
+
+class ModelBundle:
+    """A verified bundle; artifacts are loaded lazily on first access."""
+
+    def __init__(self, directory, mmap_mode="r", verify=True):
+        self.directory = directory
+        self.mmap_mode = mmap_mode
+        manifest_path = os.path.join(directory, MANIFEST_NAME)
+        try:
+            with open(manifest_path) as f:
+                self.manifest = json.load(f)
+        except FileNotFoundError:
+            raise BundleError(f"{manifest_path} is missing")
+        except ValueError as e:
+            raise BundleError(f"{manifest_path} is not valid JSON: {e}")
+        if self.manifest.get("format_version") != FORMAT_VERSION:
+            raise BundleError(
+                f"{directory}: bundle format {self.manifest.get('format_version')!r} "
+                f"is not supported (expected {FORMAT_VERSION})"
+            )
+        if verify:
+            self.verify()
+        self._loaded = {}
+
+    @property
+    def version(self):
+        return self.manifest["version"]
+
+    def has(self, name):
+        return name in self.manifest["files"]
+
+    def path(self, name):
+        if not self.has(name):
+            raise BundleError(f"Bundle {self.version} has no {name!r} artifact")
+        return os.path.join(self.directory, self.manifest["files"][name]["path"])
+
+    def verify(self):
+        for name, entry in self.manifest["files"].items():
+            path = os.path.join(self.directory, entry["path"])
+            if not os.path.exists(path):
+                raise BundleError(f"Bundle {self.manifest['version']}: {entry['path']} is missing")
+            if _sha256(path) != entry["sha256"]:
+                raise BundleError(f"Bundle {self.manifest['version']}: {entry['path']} does not match its manifest hash")
+
+    def _load(self, name):
+        if name not in self._loaded:
+            path = self.path(name)
+            try:
+                if name == "recommendations":
+                    value = _load_recommendations(path)
+                else:
+                    value = joblib.load(path, mmap_mode=self.mmap_mode)
+            except Exception as e:
+                raise BundleError(f"Bundle {self.version}: could not load {os.path.basename(path)}: {e}")
+            # Checked before caching, so a bad artifact is not served on the next access
+            self._check(name, value)
+            self._loaded[name] = value
+        return self._loaded[name]
+
+    def _check(self, name, value):
+        expected_classes = self.manifest["n_classes"]
+        if name == "label_encoder" and len(value.classes_) != expected_classes:
+            raise BundleError(f"Bundle {self.version}: label encoder has {len(value.classes_)} classes, manifest says {expected_classes}")
+        if name == "symptom_encoder" and len(value.vocabulary_) != self.manifest["n_features"]:
+            raise BundleError(f"Bundle {self.version}: symptom encoder has {len(value.vocabulary_)} features, manifest says {self.manifest['n_features']}")
+        if name == "recommendations" and len(value) != expected_classes:
+            raise BundleError(f"Bundle {self.version}: recommendation table has {len(value)} rows, manifest says {expected_classes}")
+        if name in ("model", "fast_model"):
+            classes = getattr(value, "classes_", None)
+            if classes is None or len(classes) != expected_classes:
+                found = "no" if classes is None else len(classes)
+                raise BundleError(f"Bundle {self.version}: {name} predicts {found} classes, manifest says {expected_classes}")
+
+    @property
+    def model(self):
+        return self._load("model")
+
+    @property
+    def fast_model(self):
+        return self._load("fast_model")
+
+    @property
+    def symptom_encoder(self):
+        return self._load("symptom_encoder")
+
+    @property
+    def label_encoder(self):
+        return self._load("label_encoder")
+
+    @property
+    def recommendations(self):
+        index = self._load("recommendations")
+        if index.diseases != list(self.label_encoder.classes_):
+            raise BundleError(f"Bundle {self.version}: recommendation table is out of step with the label encoder")
+        return index
+
+    def model_for(self, kind):
+        return self.fast_model if kind == "fast" else self.model
+
+
+def load_bundle(root=BUNDLE_ROOT, mmap_mode="r", verify=True):
+    """Load the bundle that ``root/LATEST`` points at (or ``root`` itself if it holds a manifest)."""
+    if os.path.exists(os.path.join(root, MANIFEST_NAME)):
+        return ModelBundle(root, mmap_mode=mmap_mode, verify=verify)
+    return ModelBundle(resolve_bundle(root), mmap_mode=mmap_mode, verify=verify)
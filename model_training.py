@@ -1,106 +1,224 @@
-
  # Importing required libraries
+import argparse
+import json
+import os
+import time
+
+import numpy as np
 import pandas as pd
 from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import LabelEncoder
-from sklearn.feature_extraction.text import CountVectorizer
 from sklearn.ensemble import RandomForestClassifier, GradientBoostingClassifier, VotingClassifier
 import xgboost as xgb
-import joblib
+from attribution import symptom_importance
+from dataset import load_dataset
+from recommendations import RecommendationIndex, build_recommendation_table
+from fast_model import FAST_MODEL_REPORT_PATH, LookupClassifier, parity_report
+from inference import fit_temperature, predict_proba
+from model_bundle import save_bundle
+from symptoms import SymptomEncoder, canonical_symptom_set
+from train_members import assemble_voting_classifier, fit_members, timed
 from sklearn.metrics import accuracy_score, precision_score, recall_score, f1_score
 
-# Importing data
-files = {
-    "workout": "workout_df.csv",
-    "description": "description.csv", 
-    "diets": "diets.csv",
-    "medications": "medications.csv",
-    "precautions": "precautions_df.csv",
-    "symptoms": "symtoms_df.csv",
+SYMPTOM_COLUMNS = ["Symptom_1", "Symptom_2", "Symptom_3", "Symptom_4"]
+
+# Hyperparameters of each ensemble member. tune.py searches them and writes
+# its choice to MODEL_CONFIG_PATH, which overrides these defaults.
+MODEL_CONFIG_PATH = "model_config.json"
+DEFAULT_MEMBER_PARAMS = {
+    "random_forest": {"n_estimators": 100},
+    "xgboost": {"n_estimators": 100},
+    "gradient_boosting": {"n_estimators": 100},
 }
 
-dfs = {name: pd.read_csv(path) for name, path in files.items()}
+# Importing data: the source CSVs, validated and compiled once into a binary cache
+def load_tables():
+    return load_dataset()
+
 
 # Data Preprocessing
-dfs["workout"].rename(columns={"disease": "Disease"}, inplace=True)
-merged_df = dfs["symptoms"].merge(dfs["description"], on="Disease", how="left") \
-    .merge(dfs["medications"], on="Disease", how="left") \
-    .merge(dfs["diets"], on="Disease", how="left") \
-    .merge(dfs["precautions"], on="Disease", how="left") \
-    .merge(dfs["workout"], on="Disease", how="left")
-
-req_cols = [
-    "Symptom_1",
-    "Symptom_2",
-    "Symptom_3",
-    "Symptom_4",
-    "Disease",
-    "Description",
-    "Medication",
-    "Diet",
-    "Precaution_1",
-    "Precaution_2",
-    "Precaution_3",
-    "Precaution_4",
-    "workout",
-]
-merged_df = merged_df[req_cols]
-
-merged_df["Combined_Symptoms"] = merged_df[["Symptom_1", "Symptom_2", "Symptom_3", "Symptom_4"]].apply(
-    lambda x: " ".join(x.dropna()), axis=1
-)
-
-# Splitting, vectorizing, and encoding the required data
-label_encoder = LabelEncoder()
-merged_df["Disease_Encoded"] = label_encoder.fit_transform(merged_df["Disease"])
-
-X = merged_df["Combined_Symptoms"]
-y = merged_df["Disease_Encoded"]
-X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42, stratify=y)
-
-vectorizer = CountVectorizer()
-X_train_vec = vectorizer.fit_transform(X_train)
-X_test_vec = vectorizer.transform(X_test)
-
-# Defining hybrid model
-rf_model = RandomForestClassifier(n_estimators=100, random_state=42)
-gx_model = xgb.XGBClassifier(n_estimators=100, random_state=42, eval_metric='mlogloss')
-gb_model = GradientBoostingClassifier(n_estimators=100, random_state=42)
-
-# Voting Classifier
-hybrid_model = VotingClassifier(estimators=[
-    ('random_forest', rf_model),
-    ('xgboost', gx_model),
-    ('gradient_boosting', gb_model)
-], voting='hard')
-
-# Training hybrid model
-hybrid_model.fit(X_train_vec, y_train)
-y_pred = hybrid_model.predict(X_test_vec)
-
-accuracy = accuracy_score(y_test, y_pred)
-precision = precision_score(y_test, y_pred, average='weighted')
-recall = recall_score(y_test, y_pred, average='weighted')
-
-print(f"Accuracy of the Hybrid Model: {accuracy * 100}")
-print(f"Precision of the Hybrid Model: {precision * 100}")
-print(f"Recall of the Hybrid Model: {recall * 100}")
-f1 = f1_score(y_test, y_pred, average='weighted')  # Calculate F1 score
-print(f"F1 Score of the Hybrid Model: {f1 * 100}")  # Print F1 score
-
-# Sav ng the model, vectorizer, and encoder
-model_path = "hybrid_model.pkl"
-vectorizer_path = "vectorizer.pkl"
-encoder_path = "encoder.pkl"
-
-joblib.dump(hybrid_model, model_path)
-joblib.dump(vectorizer, vectorizer_path)
-joblib.dump(label_encoder, encoder_path)
-print("Saved the hybrid model, vectorizer, and encoder successfully!")
+# Features come from the symptom table only. Joining the recommendation
+# tables here (workout_df has ~10 rows per disease) used to replicate every
+# symptom row ~10x without adding any information to the training matrix.
+def build_symptom_frame(symptoms_df):
+    frame = symptoms_df[["Disease"]].copy()
+    frame["Symptoms"] = [canonical_symptom_set(row) for row in symptoms_df[SYMPTOM_COLUMNS].itertuples(index=False)]
+    return frame[["Symptoms", "Disease"]]
+
+
+def legacy_merged_rows(dfs):
+    # Row count of the old symptoms x recommendations left join, without building it
+    per_disease = dfs["workout"]["Disease"].value_counts()
+    multiplicity = dfs["symptoms"]["Disease"].map(per_disease).fillna(1)
+    return int(multiplicity.sum())
+
+
+def deduplicate(X, y):
+    # Collapse identical (symptom set, disease) rows into one weighted sample
+    counts = pd.DataFrame({"X": X.values, "y": y.values}).value_counts(sort=False).reset_index(name="weight")
+    return counts["X"], counts["y"], counts["weight"].to_numpy()
+
+
+def load_member_params(path=MODEL_CONFIG_PATH):
+    """``{member: params}``: the defaults, updated from the tuned config file if there is one."""
+    member_params = {name: dict(params) for name, params in DEFAULT_MEMBER_PARAMS.items()}
+    if path and os.path.exists(path):
+        with open(path) as f:
+            for name, params in json.load(f).get("members", {}).items():
+                if name in member_params:
+                    member_params[name].update(params)
+    return member_params
+
+
+def make_member(name, **params):
+    if name == "random_forest":
+        return RandomForestClassifier(random_state=42, **params)
+    if name == "xgboost":
+        return xgb.XGBClassifier(random_state=42, eval_metric='mlogloss', **params)
+    if name == "gradient_boosting":
+        return GradientBoostingClassifier(random_state=42, **params)
+    raise ValueError(f"Unknown ensemble member: {name}")
+
+
+def make_hybrid_model(member_params=None):
+    # Defining hybrid model
+    member_params = member_params or load_member_params()
+
+    # Voting Classifier
+    return VotingClassifier(estimators=[
+        (name, make_member(name, **member_params[name])) for name in DEFAULT_MEMBER_PARAMS
+    ], voting='hard')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Train the MediScan hybrid model")
+    parser.add_argument("--no-dedupe", action="store_true",
+                        help="Train on every symptom row instead of weighted distinct rows")
+    parser.add_argument("--compare-legacy", action="store_true",
+                        help="Also time a fit on the old merged (replicated) training matrix")
+    parser.add_argument("--fast-model", action="store_true",
+                        help="Also distill the lookup/decision-tree fast model and write a parity report")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Processes used to fit ensemble members (default: one per member)")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Refit every ensemble member instead of reusing cached fits")
+    parser.add_argument("--config", default=MODEL_CONFIG_PATH,
+                        help="Member hyperparameters written by tune.py (ignored if missing)")
+    args = parser.parse_args(argv)
+
+    with timed("load"):
+        dfs = load_tables()
+
+    with timed("preprocess"):
+        symptom_frame = build_symptom_frame(dfs["symptoms"])
+
+        # Splitting, vectorizing, and encoding the required data
+        label_encoder = LabelEncoder()
+        symptom_frame["Disease_Encoded"] = label_encoder.fit_transform(symptom_frame["Disease"])
+
+        X = symptom_frame["Symptoms"]
+        y = symptom_frame["Disease_Encoded"]
+        X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42, stratify=y)
+
+        train_index = X_train.index
+        sample_weight = None
+        if not args.no_dedupe:
+            X_train, y_train, sample_weight = deduplicate(X_train, y_train)
+
+    print(f"Rows in legacy merged frame: {legacy_merged_rows(dfs):,}")
+    print(f"Rows in symptom table: {len(symptom_frame):,}")
+    print(f"Training rows: {len(X_train):,}" + ("" if sample_weight is None else " (deduplicated, weighted)"))
+
+    with timed("vectorize"):
+        symptom_encoder = SymptomEncoder()
+        X_train_vec = symptom_encoder.fit_transform(X_train)
+        X_test_vec = symptom_encoder.transform(X_test)
+    print(f"Symptom vocabulary: {len(symptom_encoder.vocabulary_)} features")
+
+    # Training hybrid model: members are fitted in parallel and cached on disk
+    member_params = load_member_params(args.config)
+    print(f"Member hyperparameters: {member_params}")
+    hybrid_model = make_hybrid_model(member_params)
+    start = time.perf_counter()
+    members = fit_members(hybrid_model.estimators, X_train_vec, y_train.to_numpy(), sample_weight,
+                          n_workers=args.workers, use_cache=not args.no_cache)
+    assemble_voting_classifier(hybrid_model, members, y_train)
+    print(f"Fit time: {time.perf_counter() - start:.2f}s")
+    with timed("evaluate"):
+        y_pred = hybrid_model.predict(X_test_vec)
+
+    accuracy = accuracy_score(y_test, y_pred)
+    precision = precision_score(y_test, y_pred, average='weighted')
+    recall = recall_score(y_test, y_pred, average='weighted')
+
+    print(f"Accuracy of the Hybrid Model: {accuracy * 100}")
+    print(f"Precision of the Hybrid Model: {precision * 100}")
+    print(f"Recall of the Hybrid Model: {recall * 100}")
+    f1 = f1_score(y_test, y_pred, average='weighted')  # Calculate F1 score
+    print(f"F1 Score of the Hybrid Model: {f1 * 100}")  # Print F1 score
+
+    if args.compare_legacy:
+        # Replicate each training row by its disease's workout count, as the old merge did
+        per_disease = dfs["workout"]["Disease"].value_counts()
+        train_rows = symptom_frame.loc[train_index]
+        legacy = train_rows.loc[train_rows.index.repeat(train_rows["Disease"].map(per_disease).fillna(1).astype(int))]
+        legacy_model = make_hybrid_model(member_params)
+        start = time.perf_counter()
+        legacy_model.fit(symptom_encoder.transform(legacy["Symptoms"]), legacy["Disease_Encoded"])
+        legacy_fit_time = time.perf_counter() - start
+        legacy_accuracy = accuracy_score(y_test, legacy_model.predict(X_test_vec))
+        print(f"Legacy training rows: {len(legacy):,}")
+        print(f"Legacy fit time: {legacy_fit_time:.2f}s")
+        print(f"Legacy accuracy: {legacy_accuracy * 100}")
+
+    # Differential scores: the members' mean probability, calibrated on the test rows
+    with timed("calibrate"):
+        test_proba = predict_proba(hybrid_model, X_test_vec)
+        hybrid_model.score_temperature_ = fit_temperature(
+            test_proba, np.searchsorted(hybrid_model.classes_, y_test.to_numpy())
+        )
+        soft_accuracy = accuracy_score(y_test, hybrid_model.classes_[test_proba.argmax(axis=1)])
+    print(f"Score temperature: {hybrid_model.score_temperature_:.3f}")
+    print(f"Accuracy of the soft vote (differential mode): {soft_accuracy * 100}")
+
+    # Per-disease symptom importance, used to explain predictions (attribution.py)
+    with timed("symptom importance"):
+        hybrid_model.symptom_importance_ = symptom_importance(hybrid_model, symptom_encoder)
+
+    fast_model = None
+    metadata = {"accuracy": accuracy, "precision": precision, "recall": recall, "f1": f1,
+                "soft_vote_accuracy": soft_accuracy, "score_temperature": hybrid_model.score_temperature_,
+                "training_rows": len(X_train), "member_params": member_params}
+    if args.fast_model:
+        # Distilled fast-inference model, labelled by the hybrid model
+        start = time.perf_counter()
+        fast_model = LookupClassifier.distill(hybrid_model, symptom_encoder, X_train)
+        fast_model.symptom_importance_ = symptom_importance(fast_model, symptom_encoder)
+        print(f"Fast model distill time: {time.perf_counter() - start:.2f}s")
+        report = parity_report(fast_model, hybrid_model, X_test_vec, y_test)
+        for key, value in report.items():
+            print(f"Fast model {key.replace('_', ' ')}: {value}")
+        with open(FAST_MODEL_REPORT_PATH, "w") as f:
+            json.dump(report, f, indent=2)
+        metadata["fast_model_report"] = report
+        print(f"Saved the fast model parity report to {FAST_MODEL_REPORT_PATH}")
+
+    # Compact per-disease recommendation table, one row per encoded label
+    recommendation_index = RecommendationIndex(build_recommendation_table(dfs, label_encoder.classes_))
+
+    # Sav ng the model, symptom encoder, label encoder and recommendations as one bundle
+    with timed("save"):
+        bundle_dir = save_bundle(hybrid_model, symptom_encoder, label_encoder, recommendation_index,
+                                 fast_model=fast_model, metadata=metadata)
+    print(f"Saved the model bundle to {bundle_dir} successfully!")
+
+
+if __name__ == "__main__":
+    main()
 
 #Accuracy of the Hybrid Model: 99.3798955613577
 #Precision of the Hybrid Model: 99.39792753686592
-#Recall of the Hybrid Model: 99.3798955613577 
+#Recall of the Hybrid Model: 99.3798955613577
 
 
 
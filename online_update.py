@@ -0,0 +1,286 @@
+"""Incremental model updates from saved patient records.
+
+Instead of a full ``model_training.py`` run, the updater reads only the
+records appended since the last update and folds them into the current
+model in mini-batches:
+
+* random forest       - ``trees_per_update`` new trees (warm start); the
+                        oldest are dropped beyond ``--max-forest-size``
+                        (200 by default)
+* XGBoost             - ``trees_per_update`` more boosting rounds
+* gradient boosting   - ``trees_per_update`` more stages (warm start)
+* fast lookup model   - the batch's symptom combinations are relabelled
+
+Every mini-batch is padded with a few training rows per disease, so each
+member sees every class and the cost of an update depends on the batch
+size, not on how much data the model has seen. The result is published as
+a new bundle version with the record position in its metadata; the app
+and the prediction server pick it up without a restart. When the new
+records hold nothing to learn, no version is published; the position is
+kept in ``<bundle>/online_update.json`` instead.
+
+Usage::
+
+    python online_update.py --records /tmp/patient_records.csv --once
+    python online_update.py --records records.db --interval 60 --batch-size 256
+
+Boosted members stop growing at ``--max-boosting-rounds``: their stages
+build on each other, so old ones cannot be dropped like forest trees.
+
+The model learns only from confirmed diagnoses: the record's "Confirmed
+Diagnosis" column, or another column named with ``--label-column``.
+Records without one are skipped. "Predicted Disease" is refused, since
+training on the model's own predictions reinforces its mistakes.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+import numpy as np
+import xgboost as xgb
+from sklearn.ensemble import GradientBoostingClassifier, RandomForestClassifier
+
+from attribution import symptom_importance
+from dataset import disease_key, load_dataset
+from fast_model import LookupClassifier
+from inference import SYMPTOM_COLUMNS
+from model_bundle import BUNDLE_ROOT, load_bundle, prune_bundles, save_bundle
+from record_store import RECORD_COLUMNS, open_record_store
+from symptoms import canonical_symptom_set
+from train_members import timed
+
+CONFIRMED_LABEL_COLUMN = "Confirmed Diagnosis"
+PREDICTED_LABEL_COLUMN = "Predicted Disease"
+DEFAULT_MAX_FOREST_SIZE = 200
+DEFAULT_MAX_BOOSTING_ROUNDS = 500
+# Record position reached by updates that did not publish a bundle
+POSITION_FILE = "online_update.json"
+
+
+def check_label_column(label_column):
+    if label_column == PREDICTED_LABEL_COLUMN:
+        raise ValueError(f"{PREDICTED_LABEL_COLUMN!r} holds the model's own predictions; "
+                         "learn from a column of confirmed diagnoses")
+    if label_column not in RECORD_COLUMNS:
+        raise ValueError(f"Unknown record column {label_column!r}")
+    return label_column
+
+
+def records_to_examples(rows, label_encoder, label_column=CONFIRMED_LABEL_COLUMN):
+    """Symptom sets and encoded labels for store rows (lists in ``RECORD_COLUMNS`` order).
+
+    Rows without symptoms, with an empty ``label_column`` or whose disease
+    the model does not know are skipped. Returns ``(symptom_sets, labels, skipped)``.
+    """
+    check_label_column(label_column)
+    symptoms_at = RECORD_COLUMNS.index("Symptoms")
+    label_at = RECORD_COLUMNS.index(label_column)
+    # Class names are not spelled consistently in the source data ("Diabetes ")
+    known = {disease_key(disease): i for i, disease in enumerate(label_encoder.classes_)}
+    symptom_sets, labels, skipped = [], [], 0
+    for row in rows:
+        symptoms = canonical_symptom_set(str(row[symptoms_at]).split(",")) if len(row) > symptoms_at else ()
+        # Rows from before the label column existed are shorter; None and "" are unconfirmed
+        confirmed = row[label_at] if len(row) > label_at and row[label_at] is not None else ""
+        label = known.get(disease_key(confirmed))
+        if not symptoms or label is None:
+            skipped += 1
+            continue
+        symptom_sets.append(symptoms)
+        labels.append(label)
+    return symptom_sets, np.asarray(labels, dtype=int), skipped
+
+
+def replay_sample(label_encoder, per_class=2, base_dir=".", random_state=0):
+    """``per_class`` training rows for every disease, mixed into each mini-batch."""
+    data = load_dataset(base_dir)["symptoms"]
+    data = data[data["Disease"].isin(label_encoder.classes_)]
+    sample = data.sample(frac=1, random_state=random_state).groupby("Disease").head(per_class)
+    symptom_sets = [canonical_symptom_set(row) for row in sample[SYMPTOM_COLUMNS].itertuples(index=False)]
+    return symptom_sets, label_encoder.transform(sample["Disease"])
+
+
+def update_member(member, X, y, trees_per_update=10, max_forest_size=DEFAULT_MAX_FOREST_SIZE,
+                  max_boosting_rounds=DEFAULT_MAX_BOOSTING_ROUNDS):
+    """Grow a fitted ensemble member on ``(X, y)``; the new trees see only this batch.
+
+    A boosted member already at ``max_boosting_rounds`` is left as it is.
+    """
+    if isinstance(member, RandomForestClassifier):
+        member.set_params(warm_start=True, n_estimators=len(member.estimators_) + trees_per_update)
+        member.fit(X, y)
+        if max_forest_size and len(member.estimators_) > max_forest_size:
+            # Forget the oldest trees so prediction cost stays constant
+            member.estimators_ = member.estimators_[-max_forest_size:]
+            member.set_params(n_estimators=max_forest_size)
+    elif isinstance(member, GradientBoostingClassifier):
+        rounds = _boosting_budget(len(member.estimators_), trees_per_update, max_boosting_rounds)
+        if rounds:
+            member.set_params(warm_start=True, n_estimators=len(member.estimators_) + rounds)
+            member.fit(X, y)
+    elif isinstance(member, xgb.XGBClassifier):
+        rounds = _boosting_budget(member.get_booster().num_boosted_rounds(), trees_per_update, max_boosting_rounds)
+        if rounds:
+            member.set_params(n_estimators=rounds)
+            member.fit(X, y, xgb_model=member.get_booster())
+    else:
+        raise TypeError(f"{type(member).__name__} does not support incremental updates")
+    return member
+
+
+def _boosting_budget(current, trees_per_update, max_boosting_rounds):
+    # Rounds a boosted member may still add
+    if not max_boosting_rounds:
+        return trees_per_update
+    return max(0, min(trees_per_update, max_boosting_rounds - current))
+
+
+def update_model(model, X, y, trees_per_update=10, max_forest_size=DEFAULT_MAX_FOREST_SIZE,
+                 max_boosting_rounds=DEFAULT_MAX_BOOSTING_ROUNDS):
+    """Update a fitted VotingClassifier (or single member) in place on one mini-batch."""
+    missing = np.setdiff1d(model.classes_, y)
+    if len(missing):
+        raise ValueError(f"Mini-batch is missing {len(missing)} class(es); pad it with replay_sample")
+    members = model.estimators_ if hasattr(model, "estimators_") and hasattr(model, "voting") else [model]
+    for member in members:
+        update_member(member, X, y, trees_per_update, max_forest_size, max_boosting_rounds)
+    return model
+
+
+class OnlineUpdater:
+    """Apply records appended to ``store`` since the last update and publish a new bundle."""
+
+    def __init__(self, store, bundle_root=BUNDLE_ROOT, batch_size=256, min_records=1,
+                 label_column=CONFIRMED_LABEL_COLUMN, trees_per_update=10, max_forest_size=DEFAULT_MAX_FOREST_SIZE,
+                 max_boosting_rounds=DEFAULT_MAX_BOOSTING_ROUNDS, replay_per_class=2, keep=5, log=print):
+        self.store = store
+        self.bundle_root = bundle_root
+        self.batch_size = batch_size
+        self.min_records = min_records
+        self.label_column = check_label_column(label_column)
+        self.trees_per_update = trees_per_update
+        self.max_forest_size = max_forest_size
+        self.max_boosting_rounds = max_boosting_rounds
+        self.replay_per_class = replay_per_class
+        self.keep = keep
+        self.log = log
+        self.position_path = os.path.join(bundle_root, POSITION_FILE)
+
+    def _unpublished_position(self, version):
+        # Position saved by an update that learned nothing on top of ``version``
+        try:
+            with open(self.position_path) as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return saved.get("record_position") if saved.get("bundle") == version else None
+
+    def _save_position(self, version, position):
+        tmp_path = f"{self.position_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"bundle": version, "record_position": position}, f)
+        os.replace(tmp_path, self.position_path)
+
+    def step(self):
+        """Run one update. Returns the new bundle directory, or None if there was nothing to learn."""
+        # Loaded without memory-mapping: the updater modifies these copies
+        bundle = load_bundle(self.bundle_root, mmap_mode=None)
+        metadata = dict(bundle.manifest.get("metadata", {}))
+        state = dict(metadata.get("online_update", {}))
+        start_position = self._unpublished_position(bundle.version) or state.get("record_position")
+        rows, position = self.store.iter_since(start_position)
+        if position.pop("reset", False):
+            self.log("Record store was replaced; reading it from the start")
+        if len(rows) < self.min_records:
+            return None
+
+        label_encoder, symptom_encoder = bundle.label_encoder, bundle.symptom_encoder
+        symptom_sets, labels, skipped = records_to_examples(rows, label_encoder, self.label_column)
+        if not symptom_sets:
+            # Publishing an unchanged model would make every app and server process swap to it
+            self._save_position(bundle.version, position)
+            self.log(f"No confirmed diagnoses in {len(rows)} new record(s); model unchanged")
+            return None
+
+        model = bundle.model
+        fast_model = bundle.fast_model if bundle.has("fast_model") else None
+        replay_sets, replay_labels = replay_sample(label_encoder, self.replay_per_class)
+        for start in range(0, len(symptom_sets), self.batch_size):
+            batch_sets = symptom_sets[start:start + self.batch_size]
+            batch_labels = labels[start:start + self.batch_size]
+            with timed(f"update {start // self.batch_size + 1}: {len(batch_sets)} records", log=self.log):
+                X = symptom_encoder.transform(list(batch_sets) + replay_sets)
+                update_model(model, X, np.concatenate([batch_labels, replay_labels]),
+                             self.trees_per_update, self.max_forest_size, self.max_boosting_rounds)
+        if isinstance(fast_model, LookupClassifier):
+            fast_model.update(model, symptom_encoder, symptom_sets)
+        # The importance tables describe the old trees; recompute them for the updated models
+        for updated in (model, fast_model):
+            if updated is not None:
+                updated.symptom_importance_ = symptom_importance(updated, symptom_encoder)
+
+        state.update({
+            "parent": bundle.version,
+            "record_position": position,
+            "records": len(rows),
+            "skipped": skipped,
+            "total_records": state.get("total_records", 0) + len(symptom_sets),
+            "updated": datetime.now().isoformat(timespec="seconds"),
+        })
+        metadata["online_update"] = state
+        with timed("save", log=self.log):
+            directory = save_bundle(model, symptom_encoder, label_encoder, bundle.recommendations,
+                                    root=self.bundle_root, fast_model=fast_model, metadata=metadata)
+        if self.keep:
+            prune_bundles(self.bundle_root, self.keep)
+        self.log(f"Learned from {len(symptom_sets)} record(s) ({skipped} skipped) -> {directory}")
+        return directory
+
+    def run(self, interval=60):
+        while True:
+            self.step()
+            time.sleep(interval)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Update the MediScan model from new patient records")
+    parser.add_argument("--records", required=True, help="Patient record store (CSV, SQLite or archive directory)")
+    parser.add_argument("--backend", choices=["csv", "sqlite", "archive"],
+                        help="Record store backend (default: from the path)")
+    parser.add_argument("--bundle", default=BUNDLE_ROOT, help="Model bundle directory")
+    parser.add_argument("--batch-size", type=int, default=256, help="Records per mini-batch")
+    parser.add_argument("--min-records", type=int, default=1, help="Wait for this many new records before updating")
+    parser.add_argument("--label-column", default=CONFIRMED_LABEL_COLUMN,
+                        choices=[col for col in RECORD_COLUMNS if col != PREDICTED_LABEL_COLUMN],
+                        help="Record column holding the confirmed diagnosis to learn")
+    parser.add_argument("--trees-per-update", type=int, default=10, help="Trees or boosting rounds added per mini-batch")
+    parser.add_argument("--max-forest-size", type=int, default=DEFAULT_MAX_FOREST_SIZE,
+                        help="Drop the oldest random forest trees beyond this many (0 for no limit)")
+    parser.add_argument("--max-boosting-rounds", type=int, default=DEFAULT_MAX_BOOSTING_ROUNDS,
+                        help="Stop growing the boosted members at this many rounds (0 for no limit)")
+    parser.add_argument("--keep", type=int, default=5, help="Bundle versions to keep (0 keeps all)")
+    parser.add_argument("--interval", type=float, default=60, help="Seconds between updates")
+    parser.add_argument("--once", action="store_true", help="Run a single update and exit")
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.records):
+        parser.error(f"{args.records} does not exist")
+    updater = OnlineUpdater(open_record_store(args.records, args.backend), args.bundle, args.batch_size,
+                            args.min_records, args.label_column, args.trees_per_update, args.max_forest_size,
+                            args.max_boosting_rounds, keep=args.keep)
+    if args.once:
+        updater.step()
+        return 0
+    try:
+        updater.run(args.interval)
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
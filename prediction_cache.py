@@ -0,0 +1,94 @@
+"""Memoized predictions for MediScan.
+
+Inputs are at most four symptoms from a fixed list and their order does
+not matter, so the same presentations come up again and again. The cache
+keys each prediction on the model version and the canonical (sorted,
+de-duplicated) symptom set, and evicts least-recently-used entries once it
+reaches ``maxsize``. One instance is shared by every Streamlit session.
+
+When the model is swapped while the app runs, callers pass the new version
+to ``predict``; entries for the old version are never hit again and age out.
+"""
+
+import threading
+from collections import OrderedDict
+
+from symptoms import canonical_symptom_set
+
+
+class PredictionCache:
+    """Thread-safe, size-bounded LRU cache of predicted labels."""
+
+    def __init__(self, model_version, maxsize=4096):
+        self.model_version = model_version
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def key(self, symptoms, model_version=None):
+        return model_version or self.model_version, canonical_symptom_set(symptoms)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _get(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+            return None
+
+    def _put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def predict(self, symptom_sets, predict_fn, model_version=None):
+        """Labels for ``symptom_sets``; cache misses go to ``predict_fn`` in one batch call.
+
+        ``model_version`` is the version ``predict_fn`` serves (default: the cache's own).
+        """
+        keys = [self.key(symptoms, model_version) for symptoms in symptom_sets]
+        results = [self._get(key) for key in keys]
+        missing = [i for i, result in enumerate(results) if result is None]
+        if missing:
+            # Predict each distinct missing key once
+            pending = list(dict.fromkeys(keys[i] for i in missing))
+            computed = dict(zip(pending, predict_fn([list(key[1]) for key in pending])))
+            for key, value in computed.items():
+                self._put(key, value)
+            for i in missing:
+                results[i] = computed[keys[i]]
+        return results
+
+    def warm(self, symptom_sets, predict_fn, model_version=None):
+        """Pre-populate the cache, e.g. with every symptom combination seen in training."""
+        pending = list(dict.fromkeys(self.key(symptoms, model_version) for symptoms in symptom_sets))
+        pending = [key for key in pending if key not in self._entries][:self.maxsize]
+        if pending:
+            for key, value in zip(pending, predict_fn([list(key[1]) for key in pending])):
+                self._put(key, value)
+        return len(pending)
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
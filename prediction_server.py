@@ -0,0 +1,535 @@
+"""Local HTTP prediction service for MediScan.
+
+Serves the model bundle over a small asyncio HTTP/1.1 server::
+
+    python prediction_server.py --port 8502 --max-batch-size 256 --max-wait-ms 5
+    python prediction_server.py --port 8502 --workers 4
+
+Endpoints:
+    POST /predict   {"symptoms": ["itching", "skin_rash"]} or {"symptoms": "itching, skin_rash"}
+                    or {"symptom_sets": [["itching"], ["cough", "high_fever"]]}
+    GET  /health
+    GET  /metrics   Prometheus text (stage latencies need MEDISCAN_METRICS=1)
+
+A symptom set that is empty, or in which the model recognizes no symptom,
+is answered with 400 rather than a diagnosis.
+
+Each prediction carries a ``--top-k`` differential and, unless
+``--attribution none``, the weight of every entered symptom (see
+attribution.py).
+
+Concurrent requests are merged by ``MicroBatcher``: symptom sets that
+arrive within ``max_wait_ms`` of each other (up to ``max_batch_size``) are
+encoded and predicted in one call. When more than ``max_queue`` symptom
+sets are waiting, new requests are rejected with 503 instead of queueing
+without bound.
+
+With ``--workers N`` batches are scored by a pool of N worker processes
+(``WorkerPool``). The model is loaded once in the server process and the
+workers are forked from it, so they share its memory copy-on-write:
+tree arrays, the XGBoost booster and the recommendation table are never
+written to after loading, so they stay as one physical copy whatever the
+worker count. Up to N batches are scored at once.
+
+Forking is only safe while the server has a single thread: a child forked
+from a multi-threaded process can inherit a lock another thread held (the
+``METRICS`` lock, say) and deadlock on it. So only the first pool, started
+before the server runs, is forked. Later pools, after a model swap or a
+crashed worker, start from a forkserver, and every worker loads the
+bundle itself, memory-mapped, so the arrays are still shared through the
+page cache. Platforms without ``fork`` always work that way.
+
+A new model bundle version is swapped in while the server runs (checked
+every ``--reload-interval`` seconds); batches already being scored finish
+on the model they started with. With workers, a fresh pool is started on
+the new model and the old one exits once its batches are done.
+
+Set ``MEDISCAN_PREDICTION_URL`` (e.g. ``http://127.0.0.1:8502``) for the
+Streamlit app to send predictions here instead of loading the model itself.
+
+``PredictionClient`` talks to a running server, e.g. from tests or scripts.
+"""
+
+import argparse
+import asyncio
+import gc
+import http.client
+import json
+import multiprocessing
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from attribution import explain_top_k
+from inference import LiveArtifacts, load_artifacts, parse_symptoms, predict_labels, predict_top_k, recognized
+from metrics import METRICS
+from model_bundle import MANIFEST_NAME
+from recommendations import RECOMMENDATION_COLUMNS
+
+
+class QueueFull(Exception):
+    """Raised when the batcher's queue limit is reached."""
+
+
+class MicroBatcher:
+    """Coalesce concurrent predictions into batched ``predict_fn`` calls.
+
+    ``predict_fn`` takes a list of symptom sets and returns one result per
+    set; it runs in a worker thread so the event loop keeps accepting
+    requests while a batch is being scored. Up to ``concurrency`` batches
+    are scored at the same time.
+    """
+
+    def __init__(self, predict_fn, max_batch_size=256, max_wait_ms=5, max_queue=10000, concurrency=1):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.max_queue = max_queue
+        self.concurrency = concurrency
+        self.batches = 0
+        self.items = 0
+        self._queue = None
+        self._task = None
+        self._slots = None
+        self._scoring = set()
+
+    def start(self):
+        self._queue = asyncio.Queue()
+        self._slots = asyncio.Semaphore(self.concurrency)
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def submit(self, symptom_sets):
+        """Predict ``symptom_sets``; resolves once the batch containing them has been scored."""
+        if self._queue.qsize() + len(symptom_sets) > self.max_queue:
+            raise QueueFull(f"more than {self.max_queue} symptom sets waiting")
+        loop = asyncio.get_running_loop()
+        futures = []
+        for symptoms in symptom_sets:
+            future = loop.create_future()
+            self._queue.put_nowait((symptoms, future))
+            futures.append(future)
+        return await asyncio.gather(*futures)
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            # Wait for a free scoring slot before collecting the next batch, so a
+            # busy server lets batches grow instead of queueing many small ones
+            await self._slots.acquire()
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            # Pick up anything that is already waiting without sleeping again
+            while len(batch) < self.max_batch_size and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+
+            task = loop.create_task(self._score(batch))
+            self._scoring.add(task)
+            task.add_done_callback(self._scoring.discard)
+
+    async def _score(self, batch):
+        loop = asyncio.get_running_loop()
+        symptom_sets = [symptoms for symptoms, _ in batch]
+        try:
+            with METRICS.timer("batch"):
+                results = await loop.run_in_executor(None, self.predict_fn, symptom_sets)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        finally:
+            self._slots.release()
+        self.batches += 1
+        self.items += len(batch)
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+
+def predict_payloads(symptom_sets, model, symptom_encoder, recommendations, top_k=0, attribution=None):
+    """JSON-ready result per symptom set, with a ``top_k`` differential when ``top_k`` > 0.
+
+    ``attribution`` ("occlusion" or "table") adds each symptom's weight in the prediction.
+    """
+    if attribution:
+        labels, top_labels, top_scores, attributions = explain_top_k(
+            symptom_sets, model, symptom_encoder, max(top_k, 1), attribution
+        )
+    elif top_k:
+        labels, top_labels, top_scores = predict_top_k(symptom_sets, model, symptom_encoder, top_k)
+    else:
+        labels = predict_labels(symptom_sets, model, symptom_encoder)
+    results = []
+    for i, label in enumerate(labels):
+        info = recommendations.by_label(label)
+        result = {"label": int(label), "disease": info["Disease"]}
+        for field in RECOMMENDATION_COLUMNS:
+            value = info.get(field)
+            result[field] = None if value is None or value != value else value  # NaN -> null
+        if top_k:
+            result["differential"] = [
+                {"label": int(top), "disease": recommendations.by_label(top)["Disease"], "score": float(score)}
+                for top, score in zip(top_labels[i], top_scores[i])
+            ]
+        if attribution:
+            result["attribution"] = [{"symptom": symptom, "weight": weight} for symptom, weight in attributions[i]]
+        results.append(result)
+    return results
+
+
+def make_predict_fn(live, top_k=0, attribution=None):
+    """Batch predict function over ``live.current()``, a ``LiveArtifacts``."""
+    def predict(symptom_sets):
+        _, (model, symptom_encoder, _, recommendations) = live.current()
+        return predict_payloads(symptom_sets, model, symptom_encoder, recommendations, top_k, attribution)
+    return predict
+
+
+# Set in each worker process by _init_worker: (model, symptom_encoder, recommendations, top_k, attribution)
+_worker_state = None
+
+
+def _init_worker(state):
+    global _worker_state
+    if state[0] == "bundle":  # not forked from the server: load (memory-mapped) from the bundle instead
+        _, kind, bundle_dir, top_k, attribution = state
+        model, symptom_encoder, _, recommendations = load_artifacts(kind, bundle_dir)
+        state = model, symptom_encoder, recommendations, top_k, attribution
+    _worker_state = state
+
+
+def _worker_predict(symptom_sets):
+    return predict_payloads(symptom_sets, *_worker_state)
+
+
+class WorkerPool:
+    """Score batches in ``workers`` processes that share the server's loaded model."""
+
+    def __init__(self, live, workers, top_k=0, attribution=None):
+        self.live = live
+        self.workers = workers
+        self.top_k = top_k
+        self.attribution = attribution
+        self.version = None
+        self._pool = None
+        self._lock = threading.Lock()
+        self._start(*live.current())
+
+    def _start(self, version, artifacts):
+        model, symptom_encoder, _, recommendations = artifacts
+        methods = multiprocessing.get_all_start_methods()
+        if "fork" in methods and threading.active_count() == 1:
+            context = multiprocessing.get_context("fork")
+            state = (model, symptom_encoder, recommendations, self.top_k, self.attribution)
+            # Move everything loaded so far out of the collector's reach, so
+            # collections in the workers do not write to (and copy) shared pages.
+            # Unfrozen first, so objects frozen by an earlier call can still be freed.
+            gc.unfreeze()
+            gc.collect()
+            gc.freeze()
+        else:
+            context = multiprocessing.get_context("forkserver" if "forkserver" in methods else methods[0])
+            if context.get_start_method() == "forkserver":
+                # Imported once in the forkserver instead of in every worker
+                context.set_forkserver_preload([__name__])
+            state = ("bundle", self.live.kind, self._bundle_dir(version), self.top_k, self.attribution)
+        pool = ProcessPoolExecutor(self.workers, mp_context=context, initializer=_init_worker, initargs=(state,))
+        # Start every worker now rather than on the first request
+        list(pool.map(len, [[]] * self.workers))
+        old_pool, self._pool, self.version = self._pool, pool, version
+        if old_pool is not None:
+            old_pool.shutdown(wait=False)
+
+    def _bundle_dir(self, version):
+        # The exact version to load; LATEST may have moved on by the time a worker starts
+        root = self.live.bundle_root
+        if os.path.exists(os.path.join(root, MANIFEST_NAME)):
+            return root
+        return os.path.join(root, version.split(":")[0])
+
+    def predict(self, symptom_sets):
+        version, artifacts = self.live.current()
+        if version != self.version:
+            with self._lock:
+                if version != self.version:
+                    self._start(version, artifacts)
+        rebuilt = False
+        while True:
+            pool = self._pool
+            if pool is None:
+                raise RuntimeError("the worker pool is closed")
+            try:
+                return pool.submit(_worker_predict, symptom_sets).result()
+            except BrokenProcessPool:
+                # A worker died (e.g. killed for memory); fork a fresh pool once, then give up
+                if rebuilt:
+                    raise
+                rebuilt = True
+                with self._lock:
+                    if self._pool is pool:
+                        self._start(*self.live.current())
+            except RuntimeError:
+                # Only a pool swapped out by a hot reload is retried; close() is final
+                if pool is self._pool:
+                    raise
+
+    def close(self):
+        pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown()
+
+
+def parse_predict_request(body):
+    """Symptom sets from a ``POST /predict`` body; ValueError describes what is wrong with it.
+
+    A set may be a list of names or one comma-separated string, as in the
+    batch input (``inference.parse_symptoms``).
+    """
+    request = json.loads(body or b"{}")
+    if not isinstance(request, dict):
+        raise ValueError("the request body must be a JSON object")
+    if "symptom_sets" in request:
+        symptom_sets = request["symptom_sets"]
+        if not isinstance(symptom_sets, list):
+            raise ValueError("'symptom_sets' must be a list of symptom sets")
+    elif "symptoms" in request:
+        symptom_sets = [request["symptoms"]]
+    else:
+        raise ValueError("expected 'symptoms' or 'symptom_sets'")
+    if not all(isinstance(s, str) or (isinstance(s, list) and all(isinstance(name, str) for name in s))
+               for s in symptom_sets):
+        raise ValueError("each symptom set must be a list of symptom names")
+    symptom_sets = [parse_symptoms(s) for s in symptom_sets]
+    empty = [i for i, symptoms in enumerate(symptom_sets) if not symptoms]
+    if empty:
+        raise ValueError(f"symptom set(s) {empty} have no symptoms")
+    return symptom_sets
+
+
+class PredictionServer:
+    """Minimal asyncio HTTP/1.1 server with keep-alive around a ``MicroBatcher``."""
+
+    def __init__(self, batcher, host="127.0.0.1", port=8502, live=None):
+        self.batcher = batcher
+        self.host = host
+        self.port = port
+        self.live = live
+        self.requests = 0
+        self._server = None
+        METRICS.register_collector("prediction_server", lambda: {
+            "server_requests": self.requests,
+            "server_batches": self.batcher.batches,
+            "server_batched_items": self.batcher.items,
+        })
+
+    async def start(self):
+        self.batcher.start()
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        # Port 0 picks a free port; report the real one
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        await self.batcher.stop()
+
+    @property
+    def model_version(self):
+        return None if self.live is None else self.live.version
+
+    def check_recognized(self, symptom_sets):
+        """Raise ValueError if a symptom set has no symptom the current model knows."""
+        if self.live is None:
+            return
+        symptom_encoder = self.live.current()[1][1]
+        unknown = [i for i, known in enumerate(recognized(symptom_sets, symptom_encoder)) if not known]
+        if unknown:
+            raise ValueError(f"symptom set(s) {unknown} have no recognized symptoms")
+
+    async def serve_forever(self):
+        await self.start()
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def _handle(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                try:
+                    method, path, _ = request_line.decode("latin-1").split(" ", 2)
+                except ValueError:
+                    await self._respond(writer, 400, {"error": "malformed request line"}, keep_alive=False)
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                try:
+                    length = int(headers.get("content-length", 0) or 0)
+                    if length < 0:
+                        raise ValueError
+                except ValueError:
+                    # The body cannot be skipped without its length, so the connection is closed
+                    await self._respond(writer, 400, {"error": "invalid Content-Length"}, keep_alive=False)
+                    break
+                body = await reader.readexactly(length) if length else b""
+                keep_alive = headers.get("connection", "").lower() != "close"
+                status, payload = await self._route(method, path, body)
+                await self._respond(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _route(self, method, path, body):
+        self.requests += 1
+        path = path.split("?", 1)[0]
+        if method == "GET" and path == "/health":
+            return 200, {
+                "status": "ok",
+                "model_version": self.model_version,
+                "requests": self.requests,
+                "batches": self.batcher.batches,
+                "batched_items": self.batcher.items,
+            }
+        if method == "GET" and path == "/metrics":
+            return 200, METRICS.prometheus_text()
+        if path != "/predict":
+            return 404, {"error": f"unknown path {path}"}
+        if method != "POST":
+            return 405, {"error": "use POST"}
+        try:
+            symptom_sets = parse_predict_request(body)
+            self.check_recognized(symptom_sets)
+        except ValueError as e:
+            return 400, {"error": str(e)}
+        try:
+            predictions = await self.batcher.submit(symptom_sets)
+        except QueueFull as e:
+            return 503, {"error": f"server busy: {e}"}
+        except Exception as e:
+            return 500, {"error": f"prediction failed: {type(e).__name__}: {e}"}
+        return 200, {"model_version": self.model_version, "predictions": predictions}
+
+    async def _respond(self, writer, status, payload, keep_alive=True):
+        if isinstance(payload, str):
+            body, content_type = payload.encode("utf-8"), "text/plain; version=0.0.4"
+        else:
+            body, content_type = json.dumps(payload).encode("utf-8"), "application/json"
+        reason = http.client.responses.get(status, "")
+        head = (
+            f"HTTP/1.1 {status} {reason}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+        )
+        writer.write(head.encode("latin-1") + body)
+        await writer.drain()
+
+
+class PredictionClient:
+    """Blocking client for a running ``PredictionServer`` (one connection, kept alive)."""
+
+    def __init__(self, host="127.0.0.1", port=8502, timeout=30):
+        self._conn = http.client.HTTPConnection(host, port, timeout=timeout)
+
+    def _request(self, method, path, payload=None):
+        body = None if payload is None else json.dumps(payload)
+        self._conn.request(method, path, body=body, headers={"Content-Type": "application/json"})
+        response = self._conn.getresponse()
+        data = json.loads(response.read() or b"{}")
+        if response.status != 200:
+            raise RuntimeError(f"{method} {path} failed with {response.status}: {data.get('error')}")
+        return data
+
+    def predict(self, symptoms):
+        return self._request("POST", "/predict", {"symptoms": list(symptoms)})["predictions"][0]
+
+    def predict_many(self, symptom_sets):
+        return self._request("POST", "/predict", {"symptom_sets": [list(s) for s in symptom_sets]})["predictions"]
+
+    def health(self):
+        return self._request("GET", "/health")
+
+    def metrics(self):
+        self._conn.request("GET", "/metrics")
+        response = self._conn.getresponse()
+        return response.read().decode("utf-8")
+
+    def close(self):
+        self._conn.close()
+
+
+def build_server(host="127.0.0.1", port=8502, kind=None, max_batch_size=256, max_wait_ms=5, max_queue=10000,
+                 reload_interval=5.0, workers=0, top_k=3, attribution="occlusion"):
+    live = LiveArtifacts(kind, check_interval=reload_interval)
+    if workers:
+        predict_fn = WorkerPool(live, workers, top_k, attribution).predict
+    else:
+        predict_fn = make_predict_fn(live, top_k, attribution)
+    batcher = MicroBatcher(predict_fn, max_batch_size=max_batch_size, max_wait_ms=max_wait_ms,
+                           max_queue=max_queue, concurrency=max(workers, 1))
+    return PredictionServer(batcher, host, port, live=live)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="MediScan HTTP prediction service")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8502)
+    parser.add_argument("--model-kind", choices=["hybrid", "fast"], help="hybrid (default) or fast")
+    parser.add_argument("--max-batch-size", type=int, default=256, help="Most symptom sets scored per model call")
+    parser.add_argument("--max-wait-ms", type=float, default=5, help="How long a batch waits to fill up")
+    parser.add_argument("--max-queue", type=int, default=10000, help="Waiting symptom sets before returning 503")
+    parser.add_argument("--reload-interval", type=float, default=5.0,
+                        help="Seconds between checks for a new model bundle version")
+    parser.add_argument("--workers", type=int, default=0,
+                        help="Worker processes scoring batches (0 scores in the server process)")
+    parser.add_argument("--top-k", type=int, default=3, help="Size of the differential returned per prediction")
+    parser.add_argument("--attribution", choices=["occlusion", "table", "none"], default="occlusion",
+                        help="How symptom weights are computed for each prediction (none leaves them out)")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    server = build_server(args.host, args.port, args.model_kind, args.max_batch_size, args.max_wait_ms, args.max_queue,
+                          args.reload_interval, args.workers, args.top_k,
+                          None if args.attribution == "none" else args.attribution)
+    print(f"Loaded model {server.model_version} in {time.perf_counter() - start:.2f}s")
+    print(f"Serving on http://{args.host}:{args.port} (POST /predict, GET /health)")
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
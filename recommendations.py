@@ -0,0 +1,94 @@
+"""Per-disease recommendation index for MediScan.
+
+Holds exactly one record per encoder class (description, medication, diet,
+workout and precautions), stored in label order so a prediction can be
+resolved with a list index instead of scanning the merged training frame.
+
+The table is built by model_training.py and stored in the model bundle.
+``RecommendationIndex.from_sources`` rebuilds it from the compiled dataset.
+Medication and Diet are lists of strings.
+"""
+
+import pandas as pd
+
+from dataset import disease_key, load_dataset, parse_list
+
+RECOMMENDATION_COLUMNS = [
+    "Description",
+    "Medication",
+    "Diet",
+    "workout",
+    "Precaution_1",
+    "Precaution_2",
+    "Precaution_3",
+    "Precaution_4",
+]
+
+
+LIST_COLUMNS = ["Medication", "Diet"]
+
+
+def load_source_tables(base_dir="."):
+    return load_dataset(base_dir)
+
+
+def build_recommendation_table(tables, classes):
+    """Build one row per class in ``classes`` (the encoder's label order).
+
+    Rows are matched on ``disease_key``, so ``"Diabetes "`` finds
+    ``"Diabetes"``; the Disease column keeps the class names. Raises
+    ValueError if a class has no row in one of the tables.
+
+    ``workout_df.csv`` lists several tips per disease; the first one is kept,
+    which is what the app showed when it took ``.iloc[0]`` of the merged frame.
+    """
+    table = pd.DataFrame({"Disease": list(classes)})
+    table["Key"] = table["Disease"].map(disease_key)
+    missing = {}
+    for name in ("description", "medications", "diets", "precautions", "workout"):
+        source = tables[name].assign(Key=tables[name]["Disease"].map(disease_key)).drop_duplicates("Key")
+        keep = ["Key"] + [col for col in RECOMMENDATION_COLUMNS if col in source.columns]
+        table = table.merge(source[keep], on="Key", how="left", indicator=True)
+        unmatched = table.loc[table["_merge"] == "left_only", "Disease"]
+        if len(unmatched):
+            missing[name] = list(unmatched)
+        table = table.drop(columns="_merge")
+    if missing:
+        raise ValueError("No recommendations for: " + "; ".join(
+            f"{name}: {', '.join(map(repr, diseases))}" for name, diseases in missing.items()
+        ))
+    table.index.name = "Label"
+    return table[["Disease"] + RECOMMENDATION_COLUMNS]
+
+
+class RecommendationIndex:
+    """O(1) lookup of recommendations by encoded label or disease name."""
+
+    def __init__(self, table):
+        self.table = table.reset_index(drop=True)
+        for col in LIST_COLUMNS:
+            # Older bundles hold stringified lists, and Feather returns list cells as arrays
+            self.table[col] = self.table[col].map(parse_list)
+        self._records = self.table.to_dict("records")
+        self._labels = {disease: label for label, disease in enumerate(self.table["Disease"])}
+
+    def __len__(self):
+        return len(self._records)
+
+    @property
+    def diseases(self):
+        return list(self._labels)
+
+    def by_label(self, label):
+        return self._records[int(label)]
+
+    def by_disease(self, disease):
+        return self._records[self._labels[disease]]
+
+    def lookup(self, labels):
+        # Vectorized lookup for batches: one row per label, in input order
+        return self.table.take(labels).reset_index(drop=True)
+
+    @classmethod
+    def from_sources(cls, classes, base_dir="."):
+        return cls(build_recommendation_table(load_source_tables(base_dir), classes))
@@ -0,0 +1,228 @@
+"""Background exports of patient records to CSV, Parquet or Excel.
+
+Exports stream out of the record search index in chunks, so memory stays
+bounded by the chunk size however long the history is:
+
+* CSV     - written row by row with ``csv.writer``
+* Parquet - one row group per chunk (needs pyarrow)
+* Excel   - openpyxl's write-only workbook (needs openpyxl)
+
+Every export is keyed on the record store version, the format and the
+filters, and kept under ``<records>.exports/``. A repeated request for the
+same records is answered from that file, and a request for an export that
+is still being written joins the running job. Jobs run on a small thread
+pool, so the UI only polls ``ExportJob.status``.
+
+Only the newest ``keep`` files are kept, but the file of a job that is still
+referenced (by a session offering it for download) is never evicted: the
+exporter tracks its jobs weakly, so a job is released once no session holds it.
+"""
+
+import csv
+import hashlib
+import json
+import os
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from importlib.util import find_spec
+
+from record_store import RECORD_COLUMNS
+
+EXPORT_FORMATS = {
+    "csv": {"extension": "csv", "mime": "text/csv", "requires": None},
+    "parquet": {"extension": "parquet", "mime": "application/vnd.apache.parquet", "requires": "pyarrow"},
+    "xlsx": {
+        "extension": "xlsx",
+        "mime": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        "requires": "openpyxl",
+    },
+}
+
+_AGE_POSITION = RECORD_COLUMNS.index("Patient Age")
+
+
+def available_formats():
+    """Export formats whose optional dependency is installed."""
+    return [fmt for fmt, spec in EXPORT_FORMATS.items() if spec["requires"] is None or find_spec(spec["requires"])]
+
+
+def _write_csv(path, chunks, progress):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(RECORD_COLUMNS)
+        for rows in chunks:
+            writer.writerows(rows)
+            progress(len(rows))
+
+
+def _write_parquet(path, chunks, progress):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([(col, pa.float64() if col == "Patient Age" else pa.string()) for col in RECORD_COLUMNS])
+    with pq.ParquetWriter(path, schema, compression="zstd") as writer:
+        wrote = False
+        for rows in chunks:
+            columns = list(zip(*rows))
+            writer.write_table(pa.Table.from_arrays(
+                [pa.array(values, type=field.type) for values, field in zip(columns, schema)], schema=schema
+            ))
+            wrote = True
+            progress(len(rows))
+        if not wrote:
+            writer.write_table(schema.empty_table())
+
+
+def _write_xlsx(path, chunks, progress):
+    from openpyxl import Workbook
+
+    # Write-only mode streams rows to disk instead of building the sheet in memory
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("Patient Records")
+    sheet.append(RECORD_COLUMNS)
+    for rows in chunks:
+        for row in rows:
+            sheet.append(row)
+        progress(len(rows))
+    workbook.save(path)
+
+
+_WRITERS = {"csv": _write_csv, "parquet": _write_parquet, "xlsx": _write_xlsx}
+
+
+class ExportJob:
+    """One export; ``status`` moves from "running" to "done" or "failed"."""
+
+    def __init__(self, key, fmt, path, total):
+        self.key = key
+        self.format = fmt
+        self.path = path
+        self.total = total
+        self.rows_written = 0
+        self.status = "running"
+        self.error = None
+        self._done = threading.Event()
+
+    @property
+    def done(self):
+        return self._done.is_set()
+
+    @property
+    def progress(self):
+        return 1.0 if self.done or not self.total else min(self.rows_written / self.total, 1.0)
+
+    @property
+    def mime(self):
+        return EXPORT_FORMATS[self.format]["mime"]
+
+    @property
+    def file_name(self):
+        return f"patient_records.{EXPORT_FORMATS[self.format]['extension']}"
+
+    @property
+    def available(self):
+        """True once the export is done and its file is still on disk."""
+        return self.status == "done" and os.path.exists(self.path)
+
+    def wait(self, timeout=None):
+        return self._done.wait(timeout)
+
+    def read(self):
+        with open(self.path, "rb") as f:
+            return f.read()
+
+
+class RecordExporter:
+    """Runs and caches exports of a ``RecordSearchIndex``."""
+
+    def __init__(self, index, directory=None, max_workers=2, keep=10, chunk_size=10000):
+        self.index = index
+        self.directory = directory or f"{index.store.path}.exports"
+        self.keep = keep
+        self.chunk_size = chunk_size
+        # Jobs live as long as a caller (or the running export) holds them
+        self._jobs = weakref.WeakValueDictionary()
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="record-export")
+
+    def _key(self, fmt, version, filters):
+        payload = json.dumps({"format": fmt, "version": version, **filters}, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode()).hexdigest()[:20]
+
+    def export(self, fmt="csv", term=None, start=None, end=None, diseases=None):
+        """Start (or reuse) an export of the matching records and return its ``ExportJob``."""
+        if fmt not in EXPORT_FORMATS:
+            raise ValueError(f"Unknown export format {fmt!r}; expected one of: {', '.join(EXPORT_FORMATS)}")
+        if fmt not in available_formats():
+            raise ImportError(f"{fmt} export requires the {EXPORT_FORMATS[fmt]['requires']} package")
+        filters = {"term": (term or "").strip(), "start": start, "end": end, "diseases": sorted(diseases or [])}
+        # Version first, then catch the index up: the export holds at least these records
+        version = self.index.store.version()
+        self.index.refresh()
+        key = self._key(fmt, version, filters)
+        path = os.path.join(self.directory, f"{key}.{EXPORT_FORMATS[fmt]['extension']}")
+
+        with self._lock:
+            job = self._jobs.get(key)
+            if job is not None and job.status != "failed" and (not job.done or os.path.exists(path)):
+                return job
+            job = ExportJob(key, fmt, path, self.index.count(**filters))
+            self._jobs[key] = job
+            if os.path.exists(path):
+                job.rows_written = job.total
+                job.status = "done"
+                job._done.set()
+                return job
+        self._pool.submit(self._run, job, filters)
+        return job
+
+    def _run(self, job, filters):
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = f"{job.path}.{threading.get_ident()}.tmp"
+        chunks = (
+            [self._row(row) for row in rows]
+            for rows in self.index.iter_records(chunk_size=self.chunk_size, **filters)
+        )
+
+        def progress(n):
+            job.rows_written += n
+
+        try:
+            _WRITERS[job.format](tmp_path, chunks, progress)
+            os.replace(tmp_path, job.path)
+            job.status = "done"
+            self._evict()
+        except Exception as e:
+            job.status = "failed"
+            job.error = str(e)
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        finally:
+            job._done.set()
+
+    @staticmethod
+    def _row(row):
+        row = list(row)
+        age = row[_AGE_POSITION]
+        if isinstance(age, float) and age.is_integer():
+            row[_AGE_POSITION] = int(age)
+        return row
+
+    def _evict(self):
+        # Keep only the newest ``keep`` finished exports on disk; files of jobs
+        # someone still holds are kept regardless, so an offered download stays readable
+        with self._lock:
+            in_use = {job.path for job in list(self._jobs.values())}
+        files = [
+            os.path.join(self.directory, name) for name in os.listdir(self.directory)
+            if not name.endswith(".tmp")
+        ]
+        files.sort(key=os.path.getmtime, reverse=True)
+        for path in files[self.keep:]:
+            if path in in_use:
+                continue
+            try:
+                os.remove(path)
+            except OSError:
+                pass
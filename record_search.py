@@ -0,0 +1,238 @@
+"""Indexed, paginated search over patient records.
+
+``RecordSearchIndex`` keeps a SQLite copy of the records next to the record
+store (``<records>.index.db``) with an FTS5 trigram index over patient name
+and predicted disease, and a B-tree index on the timestamp. It is brought
+up to date incrementally: each ``refresh`` reads only the records appended
+since the last one, so search cost depends on the size of a page and the
+number of matches, not on the size of the whole history. Running totals
+for ``summary`` are kept in side tables that ``refresh`` updates in the
+same transaction as the rows, so the dashboard figures do not scan the
+index either.
+
+Terms shorter than three characters cannot use the trigram index and fall
+back to a ``LIKE`` scan; SQLite builds without FTS5 use ``LIKE`` throughout.
+"""
+
+import json
+import sqlite3
+import threading
+from collections import Counter
+
+import pandas as pd
+
+from record_store import RECORD_COLUMNS
+
+# Index column for each record column
+_COLUMNS = {
+    "Timestamp": "timestamp",
+    "Patient Name": "patient_name",
+    "Patient Age": "patient_age",
+    "Symptoms": "symptoms",
+    "Predicted Disease": "predicted_disease",
+    "Medications": "medications",
+    "Diet Recommendations": "diet",
+    "Workout Recommendations": "workout",
+    "Precautions": "precautions",
+    "Confirmed Diagnosis": "confirmed_diagnosis",
+}
+_INDEX_COLUMNS = [_COLUMNS[col] for col in RECORD_COLUMNS]
+_AGE_POSITION = RECORD_COLUMNS.index("Patient Age")
+_DISEASE_POSITION = RECORD_COLUMNS.index("Predicted Disease")
+
+
+def _age(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class RecordSearchIndex:
+    """Incrementally maintained search index for a ``RecordStore``."""
+
+    def __init__(self, store, path=None):
+        self.store = store
+        self.path = path or f"{store.path}.index.db"
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._create_schema()
+
+    def _create_schema(self):
+        conn = self._conn
+        columns = ", ".join(f"{col} {'REAL' if col == 'patient_age' else 'TEXT'}" for col in _INDEX_COLUMNS)
+        with conn:
+            conn.execute(f"CREATE TABLE IF NOT EXISTS records (id INTEGER PRIMARY KEY, {columns})")
+            existing = {row[1] for row in conn.execute("PRAGMA table_info(records)")}
+            for col in _INDEX_COLUMNS:
+                if col not in existing:  # index built before the column was added
+                    try:
+                        conn.execute(f"ALTER TABLE records ADD COLUMN {col} TEXT")
+                    except sqlite3.OperationalError:  # added by another process meanwhile
+                        pass
+            conn.execute("CREATE INDEX IF NOT EXISTS records_timestamp ON records(timestamp)")
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+            conn.execute("CREATE TABLE IF NOT EXISTS totals (key TEXT PRIMARY KEY, value REAL NOT NULL)")
+            conn.execute("CREATE TABLE IF NOT EXISTS disease_counts (disease TEXT PRIMARY KEY, count INTEGER NOT NULL)")
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            if conn.execute("SELECT 1 FROM totals WHERE key = 'total'").fetchone() is None:
+                # Index built before the running totals existed
+                self._rebuild_totals(conn)
+        try:
+            with conn:
+                conn.execute(
+                    "CREATE VIRTUAL TABLE IF NOT EXISTS records_fts USING fts5("
+                    "patient_name, predicted_disease, content='records', content_rowid='id', tokenize='trigram')"
+                )
+            self.has_fts = True
+        except sqlite3.OperationalError:  # SQLite without FTS5 or the trigram tokenizer
+            self.has_fts = False
+
+    def _position(self):
+        row = self._conn.execute("SELECT value FROM meta WHERE key = 'position'").fetchone()
+        return json.loads(row[0]) if row else None
+
+    @staticmethod
+    def _rebuild_totals(conn):
+        conn.execute("DELETE FROM totals")
+        conn.execute("DELETE FROM disease_counts")
+        conn.execute(
+            "INSERT INTO totals SELECT 'total', COUNT(*) FROM records "
+            "UNION ALL SELECT 'age_sum', COALESCE(SUM(patient_age), 0) FROM records "
+            "UNION ALL SELECT 'age_count', COUNT(patient_age) FROM records"
+        )
+        conn.execute(
+            "INSERT INTO disease_counts SELECT predicted_disease, COUNT(*) FROM records "
+            "WHERE predicted_disease IS NOT NULL GROUP BY predicted_disease"
+        )
+
+    @staticmethod
+    def _add_totals(conn, values):
+        ages = [row[_AGE_POSITION] for row in values if row[_AGE_POSITION] is not None]
+        conn.executemany(
+            "UPDATE totals SET value = value + ? WHERE key = ?",
+            [(len(values), "total"), (sum(ages), "age_sum"), (len(ages), "age_count")],
+        )
+        diseases = Counter(row[_DISEASE_POSITION] for row in values if row[_DISEASE_POSITION] is not None)
+        conn.executemany(
+            "INSERT INTO disease_counts VALUES (?, ?) "
+            "ON CONFLICT(disease) DO UPDATE SET count = count + excluded.count",
+            diseases.items(),
+        )
+
+    def refresh(self):
+        """Index records appended to the store since the last refresh. Returns how many were added."""
+        added = 0
+        with self._lock:
+            while True:
+                with self._conn as conn:
+                    # Take the write lock before reading the position, so another
+                    # process refreshing the same index cannot insert the same rows
+                    conn.execute("BEGIN IMMEDIATE")
+                    rows, position = self.store.iter_since(self._position())
+                    if position.get("reset"):
+                        conn.execute("DELETE FROM records")
+                        if self.has_fts:
+                            conn.execute("INSERT INTO records_fts(records_fts) VALUES ('rebuild')")
+                        self._rebuild_totals(conn)
+                    if rows:
+                        placeholders = ", ".join("?" for _ in _INDEX_COLUMNS)
+                        values = []
+                        for row in rows:
+                            row = list(row) + [None] * (len(_INDEX_COLUMNS) - len(row))
+                            row[_AGE_POSITION] = _age(row[_AGE_POSITION])
+                            values.append(row[:len(_INDEX_COLUMNS)])
+                        cursor = conn.execute("SELECT COALESCE(MAX(id), 0) FROM records")
+                        first_id = cursor.fetchone()[0] + 1
+                        conn.executemany(
+                            f"INSERT INTO records (id, {', '.join(_INDEX_COLUMNS)}) VALUES (?, {placeholders})",
+                            [[first_id + i] + row for i, row in enumerate(values)],
+                        )
+                        if self.has_fts:
+                            conn.executemany(
+                                "INSERT INTO records_fts(rowid, patient_name, predicted_disease) VALUES (?, ?, ?)",
+                                [(first_id + i, row[1], row[4]) for i, row in enumerate(values)],
+                            )
+                        self._add_totals(conn, values)
+                    position.pop("reset", None)
+                    conn.execute("INSERT OR REPLACE INTO meta VALUES ('position', ?)", (json.dumps(position),))
+                added += len(rows)
+                if not rows:
+                    return added
+
+    def _where(self, term, start, end, diseases=None):
+        clauses, params = [], []
+        if term:
+            if self.has_fts and len(term) >= 3:
+                clauses.append("id IN (SELECT rowid FROM records_fts WHERE records_fts MATCH ?)")
+                params.append('"' + term.replace('"', '""') + '"')
+            else:
+                pattern = "%" + term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+                clauses.append("(patient_name LIKE ? ESCAPE '\\' OR predicted_disease LIKE ? ESCAPE '\\')")
+                params += [pattern, pattern]
+        if start:
+            clauses.append("timestamp >= ?")
+            params.append(str(start))
+        if end:
+            # Dates without a time include the whole end day
+            clauses.append("timestamp <= ?")
+            params.append(str(end) if len(str(end)) > 10 else f"{end} 23:59:59")
+        if diseases:
+            clauses.append(f"predicted_disease IN ({', '.join('?' for _ in diseases)})")
+            params += list(diseases)
+        return ("WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def search(self, term=None, start=None, end=None, page=1, page_size=50, refresh=True):
+        """Return ``(page_frame, total_matches)``, newest records first.
+
+        ``term`` matches a substring of patient name or predicted disease,
+        case-insensitively. ``start``/``end`` are dates or timestamps.
+        """
+        if refresh:
+            self.refresh()
+        where, params = self._where((term or "").strip(), start, end)
+        page = max(int(page), 1)
+        with self._lock:
+            total = self._conn.execute(f"SELECT COUNT(*) FROM records {where}", params).fetchone()[0]
+            rows = self._conn.execute(
+                f"SELECT {', '.join(_INDEX_COLUMNS)} FROM records {where} ORDER BY id DESC LIMIT ? OFFSET ?",
+                params + [page_size, (page - 1) * page_size],
+            ).fetchall()
+        return pd.DataFrame(rows, columns=RECORD_COLUMNS), total
+
+    def count(self, term=None, start=None, end=None, diseases=None):
+        where, params = self._where((term or "").strip(), start, end, diseases)
+        with self._lock:
+            return self._conn.execute(f"SELECT COUNT(*) FROM records {where}", params).fetchone()[0]
+
+    def iter_records(self, term=None, start=None, end=None, diseases=None, chunk_size=10000):
+        """Yield matching records, oldest first, as lists of at most ``chunk_size`` rows.
+
+        Reads through its own connection, so a long export does not hold up
+        searches; WAL mode lets it run alongside ``refresh``.
+        """
+        where, params = self._where((term or "").strip(), start, end, diseases)
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            cursor = conn.execute(f"SELECT {', '.join(_INDEX_COLUMNS)} FROM records {where} ORDER BY id", params)
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield rows
+        finally:
+            conn.close()
+
+    def summary(self, refresh=True):
+        """Total patients, distinct predicted diseases and mean age over all indexed records."""
+        if refresh:
+            self.refresh()
+        with self._lock:
+            totals = dict(self._conn.execute("SELECT key, value FROM totals"))
+            diseases = self._conn.execute("SELECT COUNT(*) FROM disease_counts").fetchone()[0]
+        total, age_count = int(totals.get("total", 0)), totals.get("age_count", 0)
+        mean_age = totals["age_sum"] / age_count if age_count else None
+        return {"total": total, "unique_diseases": diseases, "mean_age": mean_age}
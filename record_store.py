@@ -0,0 +1,725 @@
+"""Patient record storage for MediScan.
+
+Records are appended one at a time instead of re-reading and rewriting the
+whole history on every save. Three backends share the same interface:
+
+* ``CsvRecordStore``     - append-only CSV, one line per record
+* ``SqliteRecordStore``  - SQLite database in WAL mode
+* ``ArchiveRecordStore`` - daily or monthly CSV segments, gzip-compressed once
+  their period is over, with retention and running aggregates (``summary``)
+
+All three are safe to use from several Streamlit sessions at once. Excel is no
+longer written on save; call ``export_excel`` when a download is requested.
+
+``count`` and ``version`` are answered from store metadata without reading
+the records, so the UI can show totals and key caches cheaply.
+
+An existing store is copied into an archive with::
+
+    python record_store.py patient_records.csv patient_records.archive
+"""
+
+import argparse
+import csv
+import gzip
+import io
+import json
+import os
+import shutil
+import sqlite3
+import sys
+import threading
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+
+import pandas as pd
+
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to a process-local lock
+    fcntl = None
+
+RECORD_COLUMNS = [
+    "Timestamp",
+    "Patient Name",
+    "Patient Age",
+    "Symptoms",
+    "Predicted Disease",
+    "Medications",
+    "Diet Recommendations",
+    "Workout Recommendations",
+    "Precautions",
+    "Confirmed Diagnosis",
+]
+
+# Columns a record may leave out, with the value stored instead. The confirmed
+# diagnosis is filled in when it is known (e.g. records imported from the
+# clinic's system); online_update.py learns only from records that have one.
+OPTIONAL_COLUMNS = {"Confirmed Diagnosis": ""}
+# Header of files written before the optional columns were added
+_LEGACY_COLUMNS = [col for col in RECORD_COLUMNS if col not in OPTIONAL_COLUMNS]
+
+_process_lock = threading.Lock()
+
+# Batch sizes for incremental reads (iter_since)
+_READ_BATCH_BYTES = 16 << 20
+_READ_BATCH_ROWS = 100000
+
+
+@contextmanager
+def _locked(handle):
+    # Exclusive advisory lock on an open file, released when the block exits
+    with _process_lock:
+        if fcntl is not None:
+            fcntl.flock(handle.fileno(), fcntl.LOCK_EX)
+        try:
+            yield handle
+        finally:
+            if fcntl is not None:
+                fcntl.flock(handle.fileno(), fcntl.LOCK_UN)
+
+
+def _normalize_record(record):
+    missing = [col for col in RECORD_COLUMNS if col not in record and col not in OPTIONAL_COLUMNS]
+    if missing:
+        raise ValueError(f"Record is missing columns: {', '.join(missing)}")
+    return [record.get(col, OPTIONAL_COLUMNS.get(col)) for col in RECORD_COLUMNS]
+
+
+class RecordStore:
+    """Common interface for patient record backends."""
+
+    path = None
+
+    def append(self, record):
+        raise NotImplementedError
+
+    def read_all(self):
+        raise NotImplementedError
+
+    def count(self):
+        raise NotImplementedError
+
+    def version(self):
+        """Opaque tag that changes whenever a record is added."""
+        raise NotImplementedError
+
+    def iter_since(self, position):
+        """Records appended after ``position``.
+
+        Returns ``(rows, new_position)`` where rows are lists in
+        ``RECORD_COLUMNS`` order. ``position`` is opaque; start from ``None``.
+        Large backlogs are returned in batches; call again until no rows come back.
+        If the store was replaced since ``position`` was taken, rows start
+        again from the beginning and ``new_position["reset"]`` is True.
+        """
+        raise NotImplementedError
+
+    def summary(self):
+        """Precomputed dashboard aggregates, or None if the backend does not keep them."""
+        return None
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def export_excel(self, target):
+        # target may be a file path or a writable binary buffer
+        self.read_all().to_excel(target, index=False, engine="openpyxl")
+        return target
+
+
+class CsvRecordStore(RecordStore):
+    """Append-only CSV file; the header is written once when the file is created.
+
+    A sidecar ``<path>.meta.json`` holds the record count and the file size
+    it was taken at. It is updated under the append lock; if the CSV was
+    changed behind the store's back the sizes disagree and it is recounted.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.meta_path = path + ".meta.json"
+        self._header_checked = False
+
+    def _read_meta(self):
+        try:
+            with open(self.meta_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_meta(self, count, size):
+        tmp_path = f"{self.meta_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"count": count, "size": size}, f)
+        os.replace(tmp_path, self.meta_path)
+
+    def _count_rows(self):
+        with open(self.path, "rb") as handle:
+            lines = sum(chunk.count(b"\n") for chunk in iter(lambda: handle.read(1 << 20), b""))
+        return max(lines - 1, 0)
+
+    def _check_header(self, handle):
+        # Validate an existing file once per process; a file from before
+        # OPTIONAL_COLUMNS is upgraded in place, and a file with a different
+        # layout is moved aside so new records start a fresh file.
+        handle.seek(0)
+        first_line = handle.readline()
+        if not first_line:
+            return True
+        header = next(csv.reader([first_line]))
+        if header == RECORD_COLUMNS:
+            return True
+        if header == _LEGACY_COLUMNS:
+            self._add_optional_columns()
+            return False
+        stamp = datetime.now().strftime("%Y%m%d%H%M%S")
+        os.replace(self.path, f"{self.path}.invalid-{stamp}")
+        return False
+
+    def _add_optional_columns(self):
+        # Rewrite a file from before OPTIONAL_COLUMNS with those columns empty; done once, under the lock
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        padding = [OPTIONAL_COLUMNS[col] for col in RECORD_COLUMNS if col not in _LEGACY_COLUMNS]
+        with open(self.path, newline="", encoding="utf-8") as source, \
+                open(tmp_path, "w", newline="", encoding="utf-8") as target:
+            reader, writer = csv.reader(source), csv.writer(target)
+            next(reader, None)
+            writer.writerow(RECORD_COLUMNS)
+            for row in reader:
+                writer.writerow(row + padding)
+        os.replace(tmp_path, self.path)
+
+    def _same_file(self, handle):
+        # Whether the open handle is still the file at self.path
+        try:
+            return os.fstat(handle.fileno()).st_ino == os.stat(self.path).st_ino
+        except FileNotFoundError:
+            return False
+
+    def append(self, record):
+        row = _normalize_record(record)
+        buffer = io.StringIO()
+        csv.writer(buffer).writerow(row)
+        line = buffer.getvalue()
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        while True:
+            with open(self.path, "a+", newline="", encoding="utf-8") as handle, _locked(handle):
+                if not self._same_file(handle):
+                    continue  # replaced by another process while we waited for the lock
+                if not self._header_checked:
+                    self._header_checked = True
+                    if not self._check_header(handle):
+                        continue  # the old file was moved aside; reopen a fresh one
+                handle.seek(0, os.SEEK_END)
+                size = handle.tell()
+                if size == 0:
+                    csv.writer(handle).writerow(RECORD_COLUMNS)
+                handle.write(line)
+                handle.flush()
+
+                meta = self._read_meta()
+                if size == 0:
+                    count = 1
+                elif meta is not None and meta.get("size") == size:
+                    count = meta["count"] + 1
+                else:
+                    count = self._count_rows()
+                self._write_meta(count, handle.tell())
+                return record
+
+    def read_all(self):
+        if not self.exists():
+            return pd.DataFrame(columns=RECORD_COLUMNS)
+        return pd.read_csv(self.path)
+
+    def count(self):
+        if not self.exists():
+            return 0
+        size = os.path.getsize(self.path)
+        meta = self._read_meta()
+        if meta is not None and meta.get("size") == size:
+            return meta["count"]
+        count = self._count_rows()
+        self._write_meta(count, size)
+        return count
+
+    def version(self):
+        if not self.exists():
+            return "0"
+        stat = os.stat(self.path)
+        return f"{stat.st_ino}:{stat.st_size}"
+
+    def iter_since(self, position):
+        position = position or {}
+        if not self.exists():
+            return [], {"inode": None, "offset": 0, "reset": bool(position.get("offset"))}
+        stat = os.stat(self.path)
+        offset = position.get("offset", 0)
+        reset = position.get("inode") not in (None, stat.st_ino) or stat.st_size < offset
+        if reset:
+            offset = 0
+        with open(self.path, "rb") as handle:
+            handle.seek(offset)
+            chunk = handle.read(_READ_BATCH_BYTES)
+        # Only consume complete lines; a concurrent append may be half written
+        end = chunk.rfind(b"\n") + 1
+        rows = list(csv.reader(io.StringIO(chunk[:end].decode("utf-8"), newline="")))
+        if offset == 0 and rows and rows[0] in (RECORD_COLUMNS, _LEGACY_COLUMNS):
+            rows = rows[1:]
+        return rows, {"inode": stat.st_ino, "offset": offset + end, "reset": reset}
+
+
+class SqliteRecordStore(RecordStore):
+    """SQLite-backed store in WAL mode so readers never block the writer."""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._connect()
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            columns = ", ".join(f'"{col}" TEXT' for col in RECORD_COLUMNS)
+            conn.execute(f"CREATE TABLE IF NOT EXISTS patient_records ({columns})")
+            # Databases from before OPTIONAL_COLUMNS get the new columns, empty
+            existing = {row[1] for row in conn.execute("PRAGMA table_info(patient_records)")}
+            for col in RECORD_COLUMNS:
+                if col not in existing:
+                    try:
+                        conn.execute(f'ALTER TABLE patient_records ADD COLUMN "{col}" TEXT DEFAULT \'\'')
+                    except sqlite3.OperationalError:  # added by another process meanwhile
+                        pass
+            conn.commit()
+            self._local.conn = conn
+        return conn
+
+    def append(self, record):
+        row = _normalize_record(record)
+        columns = ", ".join(f'"{col}"' for col in RECORD_COLUMNS)
+        placeholders = ", ".join("?" for _ in RECORD_COLUMNS)
+        conn = self._connect()
+        with conn:
+            conn.execute(f"INSERT INTO patient_records ({columns}) VALUES ({placeholders})", row)
+        return record
+
+    def read_all(self):
+        frame = pd.read_sql_query("SELECT * FROM patient_records ORDER BY rowid", self._connect())
+        frame["Patient Age"] = pd.to_numeric(frame["Patient Age"], errors="coerce")
+        return frame
+
+    def count(self):
+        # Records are never deleted, so the highest rowid is the count (an index lookup)
+        return self._connect().execute("SELECT COALESCE(MAX(rowid), 0) FROM patient_records").fetchone()[0]
+
+    def version(self):
+        return str(self.count())
+
+    def iter_since(self, position):
+        last = (position or {}).get("rowid", 0)
+        reset = self.count() < last
+        if reset:
+            last = 0
+        columns = ", ".join(f'"{col}"' for col in RECORD_COLUMNS)
+        rows = self._connect().execute(
+            f"SELECT rowid, {columns} FROM patient_records WHERE rowid > ? ORDER BY rowid LIMIT ?",
+            (last, _READ_BATCH_ROWS),
+        ).fetchall()
+        if rows:
+            last = rows[-1][0]
+        return [list(row[1:]) for row in rows], {"rowid": last, "reset": reset}
+
+
+# Characters of the "%Y-%m-%d ..." timestamp that name a segment's period
+_PERIOD_LENGTH = {"day": 10, "month": 7}
+
+
+def _empty_stats():
+    return {"count": 0, "age_sum": 0.0, "age_count": 0, "diseases": {}, "days": {}}
+
+
+def _add_row(stats, row):
+    stats["count"] += 1
+    disease = str(row[RECORD_COLUMNS.index("Predicted Disease")])
+    stats["diseases"][disease] = stats["diseases"].get(disease, 0) + 1
+    day = str(row[RECORD_COLUMNS.index("Timestamp")])[:10]
+    stats["days"][day] = stats["days"].get(day, 0) + 1
+    try:
+        age = float(row[RECORD_COLUMNS.index("Patient Age")])
+    except (TypeError, ValueError):
+        return
+    if age == age:
+        stats["age_sum"] += age
+        stats["age_count"] += 1
+
+
+def _subtract(totals, stats):
+    for key in ("count", "age_sum", "age_count"):
+        totals[key] -= stats[key]
+    for key in ("diseases", "days"):
+        for name, count in stats[key].items():
+            remaining = totals[key].get(name, 0) - count
+            if remaining > 0:
+                totals[key][name] = remaining
+            else:
+                totals[key].pop(name, None)
+
+
+class ArchiveRecordStore(RecordStore):
+    """Records in daily or monthly CSV segments under the directory ``path``.
+
+    Only the newest segment is appended to. When a record for a later period
+    arrives, all but the newest ``retention`` periods are deleted
+    (``retention=None`` keeps everything) and the finished segments are
+    gzip-compressed by a background thread, outside the append lock, so no
+    save waits for a whole segment to be compressed. ``auto_compress=False``
+    leaves compression to ``compress`` or ``rotate``, e.g. from a scheduled
+    job. Readers take a segment in either form. A record with an earlier
+    timestamp than the newest segment goes into that segment, so segment
+    order is always append order.
+
+    ``rollup.json`` holds running aggregates per segment and in total:
+    record count, per-disease counts, age sum and a per-day histogram. It
+    is updated under the append lock on every save, so ``count``,
+    ``version`` and ``summary`` never read the records. If a save was cut
+    short between the segment and the rollup, the size recorded for the
+    newest segment no longer matches and the rollup is rebuilt from the
+    segments.
+    """
+
+    def __init__(self, path, granularity="month", retention=None, auto_compress=True):
+        if granularity not in _PERIOD_LENGTH:
+            raise ValueError(f"Unknown archive granularity {granularity!r}; expected one of: {', '.join(_PERIOD_LENGTH)}")
+        self.path = path
+        self.granularity = granularity
+        self.retention = retention
+        self.auto_compress = auto_compress
+        self.rollup_path = os.path.join(path, "rollup.json")
+        self.lock_path = os.path.join(path, ".lock")
+        self.compress_lock_path = os.path.join(path, ".compress.lock")
+        self._compress_lock = threading.Lock()
+
+    def _segment_path(self, period, compressed=False):
+        return os.path.join(self.path, f"records-{period}.csv" + (".gz" if compressed else ""))
+
+    def _open_segment(self, period):
+        # A segment being compressed exists in both forms until the plain one is removed
+        try:
+            return open(self._segment_path(period), "rb")
+        except FileNotFoundError:
+            return gzip.open(self._segment_path(period, compressed=True), "rb")
+
+    def _periods(self):
+        if not os.path.isdir(self.path):
+            return []
+        return sorted({
+            name[len("records-"):].split(".csv")[0] for name in os.listdir(self.path)
+            if name.startswith("records-") and name.endswith((".csv", ".csv.gz"))
+        })
+
+    def _period(self, timestamp):
+        period = str(timestamp)[:_PERIOD_LENGTH[self.granularity]]
+        try:
+            datetime.strptime(period, "%Y-%m-%d" if self.granularity == "day" else "%Y-%m")
+        except ValueError:
+            period = datetime.now().strftime("%Y-%m-%d" if self.granularity == "day" else "%Y-%m")
+        return period
+
+    def _read_state(self):
+        try:
+            with open(self.rollup_path) as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return None
+        latest = state.get("latest")
+        size = os.path.getsize(self._segment_path(latest)) if latest and os.path.exists(self._segment_path(latest)) else 0
+        return state if state.get("latest_size", 0) == size else None
+
+    def _load_state(self):
+        # Called with the lock held
+        state = self._read_state()
+        if state is None:
+            state = self._rebuild_state()
+            self._write_state(state)
+        return state
+
+    def _rebuild_state(self):
+        previous = None
+        try:
+            with open(self.rollup_path) as f:
+                previous = json.load(f)
+        except (OSError, ValueError):
+            pass
+        periods = self._periods()
+        state = {
+            "id": (previous or {}).get("id") or uuid.uuid4().hex,
+            "granularity": self.granularity,
+            "seq": (previous or {}).get("seq", 0) + 1,
+            "generation": (previous or {}).get("generation", 0),
+            "latest": periods[-1] if periods else None,
+            "latest_size": 0,
+            "totals": _empty_stats(),
+            "segments": {},
+        }
+        for period in periods:
+            stats = state["segments"][period] = _empty_stats()
+            with self._open_segment(period) as handle:
+                reader = csv.reader(io.TextIOWrapper(handle, encoding="utf-8", newline=""))
+                for row in reader:
+                    if row != RECORD_COLUMNS:
+                        _add_row(stats, row)
+                        _add_row(state["totals"], row)
+        if periods and os.path.exists(self._segment_path(periods[-1])):
+            state["latest_size"] = os.path.getsize(self._segment_path(periods[-1]))
+        return state
+
+    def _write_state(self, state):
+        tmp_path = f"{self.rollup_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self.rollup_path)
+
+    def _compress(self, period):
+        # Called with the compress lock held, so the plain file can only vanish through retention
+        plain = self._segment_path(period)
+        compressed = self._segment_path(period, compressed=True)
+        tmp_path = f"{compressed}.{os.getpid()}.tmp"
+        try:
+            with open(plain, "rb") as source, gzip.open(tmp_path, "wb", compresslevel=6) as target:
+                shutil.copyfileobj(source, target, 1 << 20)
+        except FileNotFoundError:
+            return False
+        os.replace(tmp_path, compressed)
+        try:
+            os.remove(plain)
+        except FileNotFoundError:
+            # Retention deleted the segment while it was compressed; do not bring it back
+            os.remove(compressed)
+            return False
+        return True
+
+    def compress(self):
+        """Gzip every finished segment; returns how many were compressed.
+
+        Takes its own lock rather than the append lock: finished segments are
+        never written again, and readers accept both forms.
+        """
+        if not os.path.isdir(self.path):
+            return 0
+        compressed = 0
+        with self._compress_lock, open(self.compress_lock_path, "a+") as lock:
+            if fcntl is not None:
+                fcntl.flock(lock.fileno(), fcntl.LOCK_EX)
+            periods = self._periods()
+            for period in periods[:-1]:
+                if os.path.exists(self._segment_path(period)):
+                    compressed += self._compress(period)
+        return compressed
+
+    def _expire(self, state, new_period=None):
+        # Apply retention; deleting whole segments costs the same whatever their size
+        periods = self._periods()
+        if self.retention:
+            kept = sorted(set(periods) | ({new_period} if new_period else set()))[-self.retention:]
+            expired = [period for period in periods if period not in kept]
+            for period in expired:
+                for compressed in (False, True):
+                    if os.path.exists(self._segment_path(period, compressed)):
+                        os.remove(self._segment_path(period, compressed))
+                _subtract(state["totals"], state["segments"].pop(period, _empty_stats()))
+            if expired:
+                state["generation"] += 1
+
+    def rotate(self):
+        """Apply retention and compress finished segments now, e.g. from a scheduled job."""
+        if not os.path.isdir(self.path):
+            return
+        with open(self.lock_path, "a+") as lock, _locked(lock):
+            state = self._load_state()
+            self._expire(state)
+            state["seq"] += 1
+            self._write_state(state)
+        self.compress()
+
+    def append(self, record):
+        self.append_many([record])
+        return record
+
+    def append_many(self, records):
+        """Append ``records`` under one lock and one rollup write. Returns how many were written."""
+        rows = [_normalize_record(record) for record in records]
+        if not rows:
+            return 0
+        os.makedirs(self.path, exist_ok=True)
+        rolled_over = False
+        with open(self.lock_path, "a+") as lock, _locked(lock):
+            state = self._load_state()
+            handle = None
+            try:
+                for row in rows:
+                    period = max(self._period(row[0]), state["latest"] or "")
+                    if period != state["latest"]:
+                        if handle is not None:
+                            handle.close()
+                            handle = None
+                        if state["latest"] is not None:
+                            self._expire(state, period)
+                            rolled_over = True
+                        state["latest"] = period
+                    if handle is None:
+                        path = self._segment_path(period)
+                        handle = open(path, "a", newline="", encoding="utf-8")
+                        writer = csv.writer(handle)
+                        if handle.tell() == 0:
+                            writer.writerow(RECORD_COLUMNS)
+                    writer.writerow(row)
+                    _add_row(state["segments"].setdefault(period, _empty_stats()), row)
+                    _add_row(state["totals"], row)
+            finally:
+                if handle is not None:
+                    handle.close()
+            state["latest_size"] = os.path.getsize(self._segment_path(state["latest"]))
+            state["seq"] += 1
+            self._write_state(state)
+        if rolled_over and self.auto_compress:
+            threading.Thread(target=self.compress, name="archive-compress", daemon=True).start()
+        return len(rows)
+
+    def _state(self):
+        state = self._read_state()
+        if state is None and os.path.isdir(self.path):
+            with open(self.lock_path, "a+") as lock, _locked(lock):
+                state = self._load_state()
+        return state
+
+    def read_all(self):
+        frames = []
+        for period in self._periods():
+            with self._open_segment(period) as handle:
+                frames.append(pd.read_csv(handle))
+        if not frames:
+            return pd.DataFrame(columns=RECORD_COLUMNS)
+        return pd.concat(frames, ignore_index=True)
+
+    def count(self):
+        state = self._state()
+        return state["totals"]["count"] if state else 0
+
+    def version(self):
+        state = self._state()
+        return f"{state['id']}:{state['seq']}" if state else "0"
+
+    def summary(self):
+        state = self._state()
+        totals = state["totals"] if state else _empty_stats()
+        return {
+            "total": totals["count"],
+            "unique_diseases": len(totals["diseases"]),
+            "mean_age": totals["age_sum"] / totals["age_count"] if totals["age_count"] else None,
+            "by_disease": dict(totals["diseases"]),
+            "by_day": dict(sorted(totals["days"].items())),
+        }
+
+    def iter_since(self, position):
+        position = position or {}
+        state = self._state()
+        if state is None:
+            return [], {"store": None, "period": None, "offset": 0, "generation": 0,
+                        "reset": bool(position.get("offset"))}
+        # Retention deleting segments since ``position`` counts as a reset, so
+        # readers keeping a copy drop the expired records (once per rotation)
+        reset = (position.get("store") not in (None, state["id"])
+                 or position.get("generation", state["generation"]) != state["generation"])
+        period, offset = (None, 0) if reset else (position.get("period"), position.get("offset", 0))
+        new_position = {"store": state["id"], "generation": state["generation"], "reset": reset}
+        rows = []
+        for current in self._periods():
+            if period is not None and current < period:
+                continue
+            if current != period:
+                offset = 0
+            with self._open_segment(current) as handle:
+                handle.seek(offset)
+                chunk = handle.read(_READ_BATCH_BYTES)
+            # Only consume complete lines; a concurrent append may be half written
+            end = chunk.rfind(b"\n") + 1
+            rows = list(csv.reader(io.StringIO(chunk[:end].decode("utf-8"), newline="")))
+            if offset == 0 and rows and rows[0] in (RECORD_COLUMNS, _LEGACY_COLUMNS):
+                rows = rows[1:]
+            period, offset = current, offset + end
+            if rows:
+                break
+        return rows, {**new_position, "period": period, "offset": offset}
+
+
+def open_record_store(path, backend=None):
+    """Open the record store for ``path``.
+
+    The backend is taken from ``backend``, then the ``MEDISCAN_RECORD_BACKEND``
+    environment variable ("csv", "sqlite" or "archive"), and finally the file
+    extension. Archives are directories; ``MEDISCAN_ARCHIVE_PERIOD`` ("month"
+    or "day") and ``MEDISCAN_ARCHIVE_RETENTION`` (periods kept) configure them.
+    """
+    backend = (backend or os.environ.get("MEDISCAN_RECORD_BACKEND") or "").lower()
+    if not backend:
+        if path.endswith(".archive") or os.path.isdir(path):
+            backend = "archive"
+        else:
+            backend = "sqlite" if path.endswith((".db", ".sqlite")) else "csv"
+    if backend == "archive":
+        root, ext = os.path.splitext(path)
+        if ext != ".archive" and not os.path.isdir(path):
+            path = root + ".archive"
+        retention = os.environ.get("MEDISCAN_ARCHIVE_RETENTION")
+        return ArchiveRecordStore(path, os.environ.get("MEDISCAN_ARCHIVE_PERIOD", "month"),
+                                  int(retention) if retention else None)
+    if backend == "sqlite":
+        root, ext = os.path.splitext(path)
+        if ext not in (".db", ".sqlite"):
+            path = root + ".db"
+        return SqliteRecordStore(path)
+    if backend == "csv":
+        return CsvRecordStore(path)
+    raise ValueError(f"Unknown record store backend: {backend}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Copy MediScan patient records into another store")
+    parser.add_argument("source", help="Existing store (.csv, .db or .archive)")
+    parser.add_argument("target", help="Store to append the records to")
+    parser.add_argument("--backend", default=None, help="Backend of the target (default: from its path)")
+    args = parser.parse_args(argv)
+
+    # The source's backend comes from its path alone, never from MEDISCAN_RECORD_BACKEND
+    if os.path.isdir(args.source) or args.source.endswith(".archive"):
+        source_backend = "archive"
+    else:
+        source_backend = "sqlite" if args.source.endswith((".db", ".sqlite")) else "csv"
+    source = open_record_store(args.source, source_backend)
+    if not source.exists():
+        parser.error(f"{args.source} does not exist")
+    target = open_record_store(args.target, args.backend)
+    records = source.read_all().astype(object).where(lambda frame: frame.notna(), "").to_dict("records")
+    if hasattr(target, "append_many"):
+        target.append_many(records)
+    else:
+        for record in records:
+            target.append(record)
+    print(f"Copied {len(records):,} record(s) from {source.path} to {target.path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
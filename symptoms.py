@@ -0,0 +1,293 @@
+"""Symptom vocabulary and multi-hot encoding for MediScan.
+
+The raw data spells the same symptom in several ways (" skin_rash",
+"dischromic _patches"), and joining symptoms into a sentence for
+CountVectorizer split or merged tokens. ``SymptomEncoder`` instead maps
+each canonical symptom ID to a fixed column, so encoding a symptom set is a
+dictionary lookup and the feature space has one column per symptom.
+
+The fitted encoder is saved in the model bundle next to the model and used
+by both model_training.py and the app.
+
+``SymptomIndex`` resolves free text to symptom IDs: exact IDs and known
+synonyms ("fever", "tiredness") by dictionary lookup, and typos through a
+trigram candidate search ranked by edit distance. The encoder falls back
+to it for symptoms outside its vocabulary, so the app, the batch path and
+training all map the same spelling to the same column.
+"""
+
+import re
+from bisect import bisect_left
+from collections import Counter
+
+import numpy as np
+from scipy import sparse
+
+_SPACE_AROUND_UNDERSCORE = re.compile(r"\s*_\s*")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def canonical_symptom(name):
+    """Normalize a raw symptom string to its canonical ID, e.g. "dischromic _patches" -> "dischromic_patches"."""
+    name = _SPACE_AROUND_UNDERSCORE.sub("_", str(name).strip().lower())
+    return _WHITESPACE.sub("_", name)
+
+
+def canonical_symptom_set(symptoms):
+    """Sorted, de-duplicated tuple of canonical IDs; empty and missing values are dropped."""
+    result = set()
+    for symptom in symptoms:
+        if symptom is None or symptom != symptom:  # None or NaN
+            continue
+        symptom = canonical_symptom(symptom)
+        if symptom:
+            result.add(symptom)
+    return tuple(sorted(result))
+
+
+def display_name(symptom_id):
+    """Human-readable label for a symptom ID, e.g. "skin_rash" -> "Skin rash"."""
+    return symptom_id.replace("_", " ").capitalize()
+
+
+# Everyday phrasings of symptoms in the training vocabulary
+SYMPTOM_SYNONYMS = {
+    "fever": "high_fever",
+    "temperature": "high_fever",
+    "rash": "skin_rash",
+    "itch": "itching",
+    "itchy": "itching",
+    "tired": "fatigue",
+    "tiredness": "fatigue",
+    "exhaustion": "fatigue",
+    "vomit": "vomiting",
+    "throwing_up": "vomiting",
+    "nauseous": "nausea",
+    "diarrhea": "diarrhoea",
+    "stomach_ache": "stomach_pain",
+    "stomachache": "stomach_pain",
+    "belly_pain": "abdominal_pain",
+    "abdominal_ache": "abdominal_pain",
+    "tummy_ache": "abdominal_pain",
+    "shortness_of_breath": "breathlessness",
+    "short_of_breath": "breathlessness",
+    "sneezing": "continuous_sneezing",
+    "dizzy": "dizziness",
+    "vertigo": "spinning_movements",
+    "jaundice": "yellowish_skin",
+    "yellow_skin": "yellowish_skin",
+    "yellow_eyes": "yellowing_of_eyes",
+    "joint_ache": "joint_pain",
+    "chest_ache": "chest_pain",
+    "blurred_vision": "blurred_and_distorted_vision",
+    "blurry_vision": "blurred_and_distorted_vision",
+    "watery_eyes": "watering_from_eyes",
+    "sweats": "sweating",
+    "chill": "chills",
+    "heartburn": "acidity",
+    "no_appetite": "loss_of_appetite",
+    "painful_urination": "burning_micturition",
+    "burning_urination": "burning_micturition",
+    "anxious": "anxiety",
+    "cold_hands": "cold_hands_and_feets",
+    "mouth_ulcers": "ulcers_on_tongue",
+    "scarring": "scurring",
+    "bloating": "distention_of_abdomen",
+    "gas": "passage_of_gases",
+    "flatulence": "passage_of_gases",
+    "pimples": "pus_filled_pimples",
+    "stiffness": "movement_stiffness",
+    "head_ache": "headache",
+    "migraine": "headache",
+}
+
+
+def _trigrams(term):
+    padded = f"  {term} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _edit_distance(a, b, limit):
+    # Damerau-Levenshtein (adjacent transpositions), giving up once every cell exceeds ``limit``
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous2, previous = None, list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i] + [0] * len(b)
+        for j, cb in enumerate(b, 1):
+            cost = ca != cb
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if previous2 is not None and i > 1 and j > 1 and ca == b[j - 2] and a[i - 2] == cb:
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        if min(current) > limit:
+            return limit + 1
+        previous2, previous = previous, current
+    return previous[-1]
+
+
+class SymptomIndex:
+    """Prefix, synonym and typo-tolerant lookup of symptom IDs.
+
+    ``resolve`` answers exact IDs and synonyms with one dictionary lookup;
+    only unknown terms go through the fuzzy search, and its answers are
+    memoized. Typos are accepted up to ``max_distance`` edits (default:
+    one per four characters, at least one).
+    """
+
+    def __init__(self, vocabulary, synonyms=SYMPTOM_SYNONYMS, max_distance=None):
+        self.vocabulary = sorted(vocabulary)
+        known = set(self.vocabulary)
+        # Every spelling that maps to an ID: the IDs themselves plus synonyms for IDs we know
+        self.terms = {symptom: symptom for symptom in self.vocabulary}
+        for synonym, symptom in synonyms.items():
+            synonym = canonical_symptom(synonym)
+            if symptom in known and synonym not in self.terms:
+                self.terms[synonym] = symptom
+        self.max_distance = max_distance
+
+        # (term or word, symptom) pairs sorted for prefix search on whole terms and single words
+        prefixes = set()
+        for term, symptom in self.terms.items():
+            prefixes.add((term, symptom))
+            prefixes.update((word, symptom) for word in term.split("_"))
+        self._prefixes = sorted(prefixes)
+
+        self._grams = {}
+        for term in self.terms:
+            for gram in _trigrams(term):
+                self._grams.setdefault(gram, []).append(term)
+        self._memo = {}
+
+    @classmethod
+    def from_encoder(cls, symptom_encoder, **kwargs):
+        return cls(symptom_encoder.vocabulary_, **kwargs)
+
+    def __len__(self):
+        return len(self.vocabulary)
+
+    def _limit(self, term):
+        return self.max_distance if self.max_distance is not None else max(1, len(term) // 4)
+
+    def suggest(self, text, limit=5):
+        """Closest symptom IDs to ``text`` as ``(symptom, distance)`` pairs, nearest first."""
+        term = canonical_symptom(text)
+        if not term:
+            return []
+        max_distance = self._limit(term)
+        # Candidates share trigrams with the term; only the best few get the exact distance
+        shared = Counter(candidate for gram in _trigrams(term) for candidate in self._grams.get(gram, ()))
+        best = {}
+        for candidate, _ in shared.most_common(30):
+            distance = _edit_distance(term, candidate, max_distance)
+            if distance <= max_distance:
+                symptom = self.terms[candidate]
+                best[symptom] = min(distance, best.get(symptom, distance))
+        return sorted(best.items(), key=lambda item: (item[1], item[0]))[:limit]
+
+    def resolve(self, text):
+        """The symptom ID ``text`` refers to, or None if nothing is close enough."""
+        term = canonical_symptom(text)
+        symptom = self.terms.get(term)
+        if symptom is not None or not term:
+            return symptom
+        if term not in self._memo:
+            if len(self._memo) >= 10000:
+                self._memo.clear()
+            matches = self.suggest(term, limit=2)
+            # Ambiguous typos (two IDs equally close) are not guessed
+            if matches and (len(matches) == 1 or matches[0][1] < matches[1][1]):
+                self._memo[term] = matches[0][0]
+            else:
+                self._memo[term] = None
+        return self._memo[term]
+
+    def resolve_all(self, symptoms):
+        """``(symptom_ids, unresolved)`` for a list of free-text symptoms; IDs are sorted and unique."""
+        resolved, unresolved = set(), []
+        for text in symptoms:
+            if text is None or text != text or not str(text).strip():
+                continue
+            symptom = self.resolve(text)
+            if symptom is None:
+                unresolved.append(str(text).strip())
+            else:
+                resolved.add(symptom)
+        return tuple(sorted(resolved)), unresolved
+
+    def complete(self, prefix, limit=10):
+        """Symptom IDs with a term or word starting with ``prefix``; whole-ID matches come first."""
+        prefix = canonical_symptom(prefix)
+        if not prefix:
+            return self.vocabulary[:limit]
+        start = bisect_left(self._prefixes, (prefix,))
+        leading, inner = [], []
+        for term, symptom in self._prefixes[start:]:
+            if not term.startswith(prefix):
+                break
+            (leading if symptom.startswith(prefix) else inner).append(symptom)
+        return list(dict.fromkeys(sorted(leading) + sorted(inner)))[:limit]
+
+
+class SymptomEncoder:
+    """Encode symptom sets as fixed-width multi-hot rows."""
+
+    def __init__(self):
+        self.vocabulary_ = {}
+
+    def fit(self, symptom_sets):
+        vocabulary = set()
+        for symptoms in symptom_sets:
+            vocabulary.update(canonical_symptom_set(symptoms))
+        self.vocabulary_ = {symptom: i for i, symptom in enumerate(sorted(vocabulary))}
+        return self
+
+    def fit_transform(self, symptom_sets):
+        symptom_sets = list(symptom_sets)
+        return self.fit(symptom_sets).transform(symptom_sets)
+
+    def get_feature_names_out(self):
+        return np.array(sorted(self.vocabulary_, key=self.vocabulary_.get), dtype=object)
+
+    def __getstate__(self):
+        # The lookup index is rebuilt on demand rather than stored in the bundle
+        state = self.__dict__.copy()
+        state.pop("_symptom_index", None)
+        return state
+
+    @property
+    def symptom_index(self):
+        index = self.__dict__.get("_symptom_index")
+        if index is None:
+            index = self._symptom_index = SymptomIndex(self.vocabulary_)
+        return index
+
+    def indices(self, symptoms):
+        # Column indices for one symptom set. Symptoms outside the vocabulary are
+        # resolved through the synonym / typo index, or ignored if nothing matches.
+        vocabulary = self.vocabulary_
+        columns = set()
+        for symptom in canonical_symptom_set(symptoms):
+            column = vocabulary.get(symptom)
+            if column is None:
+                symptom = self.symptom_index.resolve(symptom)
+                column = None if symptom is None else vocabulary[symptom]
+            if column is not None:
+                columns.add(column)
+        return sorted(columns)
+
+    def transform(self, symptom_sets):
+        """Return a CSR matrix with one multi-hot row per symptom set."""
+        indptr = [0]
+        indices = []
+        for symptoms in symptom_sets:
+            indices.extend(self.indices(symptoms))
+            indptr.append(len(indices))
+        data = np.ones(len(indices), dtype=np.float32)
+        return sparse.csr_matrix(
+            (data, np.asarray(indices, dtype=np.int32), np.asarray(indptr, dtype=np.int64)),
+            shape=(len(indptr) - 1, len(self.vocabulary_)),
+        )
+
+    def pack(self, symptom_sets):
+        """Bit-packed rows (uint8, ceil(n_symptoms / 8) bytes each) for compact storage or hashing."""
+        return np.packbits(self.transform(symptom_sets).toarray().astype(bool), axis=1)
@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+
+from attribution import explain_top_k, format_attribution
+from symptoms import SymptomEncoder
+
+ENCODER = SymptomEncoder().fit([["fever", "cough", "rash", "itching"]])
+# Probability of class "Flu" added by each symptom; "Allergy" gets the rest
+FLU_WEIGHTS = {"cough": 0.2, "fever": 0.5, "itching": -0.1, "rash": 0.0}
+
+
+class _Additive:
+    """Flu probability is 0.2 plus a fixed amount per symptom, so leaving one out is exact."""
+
+    classes_ = np.array(["Allergy", "Flu"])
+
+    def predict_proba(self, X):
+        weights = np.array([FLU_WEIGHTS[name] for name in ENCODER.get_feature_names_out()])
+        flu = 0.2 + np.asarray(X @ weights).ravel()
+        return np.column_stack([1 - flu, flu])
+
+    def predict(self, X):
+        return self.classes_[self.predict_proba(X).argmax(axis=1)]
+
+
+def test_occlusion_weights_are_the_probability_drop_without_each_symptom():
+    symptom_sets = [["fever", "cough", "rash"], ["itching", "rash"], ["fever"]]
+    labels, top_labels, top_scores, attributions = explain_top_k(symptom_sets, _Additive(), ENCODER, k=2)
+    assert labels.tolist() == ["Flu", "Allergy", "Flu"]
+    assert top_labels.tolist() == [["Flu", "Allergy"], ["Allergy", "Flu"], ["Flu", "Allergy"]]
+    assert top_scores[:, 0] == pytest.approx([0.9, 0.9, 0.7])
+
+    fever_cough_rash, itching_rash, fever = attributions
+    assert [name for name, _ in fever_cough_rash] == ["fever", "cough", "rash"]
+    assert [weight for _, weight in fever_cough_rash] == pytest.approx([0.5, 0.2, 0.0])
+    # Weights are for the predicted disease: itching lowers Flu, so it supports Allergy
+    assert itching_rash == [("itching", pytest.approx(0.1)), ("rash", pytest.approx(0.0))]
+    # Without its only symptom the row is empty: Flu falls back to the 0.2 baseline
+    assert fever == [("fever", pytest.approx(0.5))]
+    assert format_attribution(fever_cough_rash) == "fever:+0.500; cough:+0.200; rash:+0.000"
+
+
+def test_chunks_give_the_same_attribution():
+    symptom_sets = [["fever", "cough"], ["rash"], ["itching", "fever"], ["cough", "rash", "itching"]]
+    whole = explain_top_k(symptom_sets, _Additive(), ENCODER, k=2)
+    chunked = explain_top_k(symptom_sets, _Additive(), ENCODER, k=2, chunk_size=1)
+    assert whole[0].tolist() == chunked[0].tolist()
+    assert whole[3] == chunked[3]
+
+
+def test_table_method_reads_the_single_symptom_probabilities():
+    model = _Additive()
+    labels, _, _, attributions = explain_top_k([["fever", "cough"]], model, ENCODER, k=2, method="table")
+    assert labels.tolist() == ["Flu"]
+    assert attributions == [[("fever", pytest.approx(0.7)), ("cough", pytest.approx(0.4))]]
+    assert model.symptom_importance_.shape == (2, 4)
+    with pytest.raises(ValueError):
+        explain_top_k([["fever"]], model, ENCODER, method="shap")
@@ -0,0 +1,47 @@
+import os
+
+import pytest
+from sklearn.preprocessing import LabelEncoder
+
+from dataset import disease_key, read_sources, validate_tables
+from recommendations import RECOMMENDATION_COLUMNS, build_recommendation_table
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture(scope="module")
+def tables():
+    return read_sources(BASE_DIR)[0]
+
+
+@pytest.mark.parametrize("name, other", [
+    ("Diabetes ", "Diabetes"),
+    ("Hypertension ", "Hypertension"),
+    ("Peptic ulcer diseae", "Peptic ulcer disease"),
+    ("(vertigo) Paroymsal  Positional Vertigo", "(vertigo) Paroymsal Positional Vertigo"),
+])
+def test_misspelled_names_share_a_key(name, other):
+    assert disease_key(name) == disease_key(other)
+
+
+def test_every_class_gets_recommendations(tables):
+    classes = LabelEncoder().fit(tables["symptoms"]["Disease"]).classes_
+    table = build_recommendation_table(tables, classes)
+    assert list(table["Disease"]) == list(classes)
+    assert table[["Description", "workout", "Precaution_1"]].notna().all().all()
+    assert table["Medication"].map(len).gt(0).all()
+    row = table.set_index("Disease").loc["Peptic ulcer diseae"]
+    assert row["Description"].startswith("Peptic ulcer")
+    assert set(RECOMMENDATION_COLUMNS) <= set(table.columns)
+
+
+def test_class_without_recommendations_fails(tables):
+    with pytest.raises(ValueError, match="Unknown disease"):
+        build_recommendation_table(tables, ["Diabetes ", "Unknown disease"])
+
+
+def test_validation_fails_when_a_table_misses_a_disease(tables):
+    tables = dict(tables)
+    tables["diets"] = tables["diets"][tables["diets"]["Disease"] != "Diabetes"]
+    with pytest.raises(ValueError, match="diets.csv has no rows for: 'Diabetes '"):
+        validate_tables(tables)
@@ -0,0 +1,54 @@
+import numpy as np
+from sklearn.linear_model import LogisticRegression
+
+from fast_model import LookupClassifier
+from inference import predict_proba
+from symptoms import SymptomEncoder
+
+SYMPTOM_SETS = [
+    ["itching", "skin_rash", "nodal_skin_eruptions"],
+    ["continuous_sneezing", "chills", "cough"],
+    ["cough", "high_fever", "headache"],
+    ["vomiting", "stomach_pain", "acidity"],
+]
+LABELS = ["Fungal infection", "Allergy", "Common Cold", "GERD"]
+
+
+def _teacher():
+    encoder = SymptomEncoder().fit(SYMPTOM_SETS)
+    teacher = LogisticRegression(max_iter=1000).fit(encoder.transform(SYMPTOM_SETS), LABELS)
+    return teacher, encoder
+
+
+def test_lookup_agrees_with_teacher_on_training_combinations():
+    teacher, encoder = _teacher()
+    fast = LookupClassifier.distill(teacher, encoder, SYMPTOM_SETS, synthetic_rows=200)
+    # Every seen set and each non-empty subset of it is in the table ("cough" is in two sets)
+    assert len(fast.table) == 4 * 7 - 1
+    subsets = [symptoms[:1] for symptoms in SYMPTOM_SETS] + [symptoms[1:] for symptoms in SYMPTOM_SETS] + SYMPTOM_SETS
+    X = encoder.transform(subsets)
+    np.testing.assert_array_equal(fast.predict(X), teacher.predict(X))
+    np.testing.assert_allclose(fast.predict_proba(X), predict_proba(teacher, X), rtol=1e-6)
+    np.testing.assert_array_equal(fast.classes_, teacher.classes_)
+
+
+def test_unseen_combinations_fall_back_to_the_tree():
+    teacher, encoder = _teacher()
+    fast = LookupClassifier.distill(teacher, encoder, SYMPTOM_SETS, synthetic_rows=200)
+    X = encoder.transform([["itching", "cough"], ["skin_rash"], ["acidity", "headache", "chills"]])
+    labels = fast.predict(X)
+    assert labels[1] == teacher.predict(X[1])[0]
+    np.testing.assert_array_equal(labels[[0, 2]], fast.fallback.predict(X[[0, 2]]))
+    proba = fast.predict_proba(X)
+    np.testing.assert_allclose(proba.sum(axis=1), 1, rtol=1e-6)
+    np.testing.assert_array_equal(fast.classes_[proba.argmax(axis=1)], labels)
+
+
+def test_update_relabels_only_the_given_combinations():
+    teacher, encoder = _teacher()
+    fast = LookupClassifier.distill(teacher, encoder, SYMPTOM_SETS, synthetic_rows=0)
+    relabelled = LogisticRegression(max_iter=1000).fit(encoder.transform(SYMPTOM_SETS), LABELS[::-1])
+    fast.update(relabelled, encoder, [["itching", "cough"], SYMPTOM_SETS[0]])
+    assert len(fast.table) == 4 * 7  # only itching + cough is new
+    X = encoder.transform([["itching", "cough"], SYMPTOM_SETS[0], SYMPTOM_SETS[3]])
+    assert fast.predict(X).tolist() == relabelled.predict(X[:2]).tolist() + [teacher.predict(X[2])[0]]
@@ -0,0 +1,95 @@
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.tree import DecisionTreeClassifier
+
+from inference import _OutputWriter, calibrate_proba, fit_temperature, predict_labels, predict_top_k, run_batch
+from recommendations import RECOMMENDATION_COLUMNS, RecommendationIndex
+from symptoms import SymptomEncoder
+
+
+def test_parquet_output_keeps_native_dtypes(tmp_path):
+    pq = pytest.importorskip("pyarrow.parquet")
+    path = str(tmp_path / "predictions.parquet")
+    writer = _OutputWriter(path)
+    writer.write(pd.DataFrame({
+        "age": [30, 41], "symptoms": ["itching", "cough"], "Medication": [["a", "b"], ["c"]],
+        "note": [None, None], "Top_1_Score": [0.75, 0.5],
+    }))
+    writer.write(pd.DataFrame({
+        "age": [52, np.nan], "symptoms": ["fever", None], "Medication": [["d"], None],
+        "note": ["follow up", None], "Top_1_Score": [0.25, 1.0],
+    }))
+    writer.close()
+
+    table = pq.read_table(path)
+    types = {field.name: str(field.type) for field in table.schema}
+    assert types["age"] == "int64"
+    assert types["Top_1_Score"] == "double"
+    assert "string" in types["symptoms"] and "string" in types["Medication"] and "string" in types["note"]
+    assert table.column("age").to_pylist() == [30, 41, 52, None]
+    assert table.column("Medication").to_pylist() == ["['a', 'b']", "['c']", "['d']", None]
+    assert table.column("note").to_pylist() == [None, None, "follow up", None]
+
+
+def test_rows_without_recognized_symptoms_get_no_prediction(tmp_path):
+    diseases = ["Common Cold", "Fungal infection"]
+    encoder = SymptomEncoder()
+    X = encoder.fit_transform([["cough"], ["itching"]])
+    model = DecisionTreeClassifier().fit(X, [0, 1])
+    table = pd.DataFrame({"Disease": diseases})
+    for col in RECOMMENDATION_COLUMNS:
+        table[col] = [[disease] for disease in diseases] if col in ("Medication", "Diet") else "-"
+    source = tmp_path / "patients.csv"
+    source.write_text('id,Symptoms\n1,itching\n2,\n3,"zzz, qqq"\n4,"cough, zzz"\n')
+    output = str(tmp_path / "predictions.csv")
+
+    assert run_batch(str(source), output, (model, encoder, None, RecommendationIndex(table))) == 4
+    result = pd.read_csv(output)
+    assert result["Status"].tolist() == ["ok", "no symptoms", "no recognized symptoms", "ok"]
+    assert result["Predicted Disease"].fillna("").tolist() == ["Fungal infection", "", "", "Common Cold"]
+    assert result.loc[[1, 2], "Description"].isna().all()
+
+
+class _Member:
+    def __init__(self, proba):
+        self.proba = np.asarray([proba])
+
+    def predict_proba(self, X):
+        return np.repeat(self.proba, X.shape[0], axis=0)
+
+
+class _HardVote:
+    # Two members narrowly prefer class 1, one is sure of class 0
+    voting = "hard"
+    weights = None
+    classes_ = np.array([0, 1, 2])
+    estimators = [("a", None), ("b", None), ("c", None)]
+    estimators_ = [_Member([0.45, 0.55, 0.0]), _Member([0.45, 0.55, 0.0]), _Member([1.0, 0.0, 0.0])]
+
+
+def test_differential_label_heads_its_own_differential():
+    encoder = SymptomEncoder().fit([["cough"]])
+    model = _HardVote()
+    assert predict_labels([["cough"]], model, encoder).tolist() == [1]
+    labels, top_labels, top_scores = predict_top_k([["cough"]], model, encoder, k=2)
+    assert labels.tolist() == [0] and top_labels.tolist() == [[0, 1]]
+    assert top_scores[0].tolist() == pytest.approx([1.9 / 3, 1.1 / 3])
+
+
+def test_temperature_scaling_keeps_the_ranking_and_fits_a_known_temperature():
+    rng = np.random.default_rng(0)
+    logits = rng.normal(size=(4000, 5)) * 2
+    true = np.exp(logits) / np.exp(logits).sum(axis=1, keepdims=True)
+    y = np.array([rng.choice(5, p=row) for row in true])
+    # Scores that are too flat: the true probabilities at temperature 2
+    flat = np.exp(logits / 2) / np.exp(logits / 2).sum(axis=1, keepdims=True)
+    temperature = fit_temperature(flat, y)
+    assert temperature == pytest.approx(0.5, rel=0.1)
+
+    model = _HardVote()
+    model.score_temperature_ = temperature
+    calibrated = calibrate_proba(model, flat)
+    assert (calibrated.argmax(axis=1) == flat.argmax(axis=1)).all()
+    assert calibrated.sum(axis=1) == pytest.approx(np.ones(len(flat)))
+    assert np.abs(calibrated - true).mean() < np.abs(flat - true).mean()
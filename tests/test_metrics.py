@@ -0,0 +1,46 @@
+import pytest
+
+from metrics import Histogram, Metrics
+
+
+def test_quantile_interpolates_inside_its_bucket():
+    h = Histogram(buckets=(1.0, 2.0, 4.0))
+    assert h.quantile(0.5) is None
+    for value in (0.5, 1.0, 1.5, 1.5):
+        h.observe(value)
+    # A value equal to a bound belongs to that bucket (le="1.0")
+    assert h.counts == [2, 2, 0, 0]
+    assert h.quantile(0) == 0.0
+    assert h.quantile(0.5) == pytest.approx(1.0)
+    assert h.quantile(0.75) == pytest.approx(1.5)
+    assert h.quantile(1) == pytest.approx(2.0)
+
+
+def test_quantile_beyond_the_last_bound_is_capped():
+    h = Histogram(buckets=(1.0, 2.0))
+    h.observe(0.5)
+    h.observe(30.0)
+    assert h.quantile(0.99) == 2.0
+    assert h.sum == 30.5 and h.count == 2
+
+
+def test_disabled_metrics_record_nothing():
+    metrics = Metrics(enabled=False)
+    with metrics.timer("predict"):
+        pass
+    assert metrics.timed("predict")(lambda x: x + 1)(1) == 2
+    assert metrics.snapshot() == {}
+
+
+def test_prometheus_text_has_cumulative_buckets_and_gauges():
+    metrics = Metrics(enabled=True, buckets=(0.1, 1.0))
+    for seconds in (0.05, 0.5, 0.5, 3.0):
+        metrics.observe("predict", seconds)
+    metrics.register_collector("cache", lambda: {"cache_hit_rate": 0.25})
+    text = metrics.prometheus_text()
+    assert 'mediscan_stage_seconds_bucket{stage="predict",le="0.1"} 1' in text
+    assert 'mediscan_stage_seconds_bucket{stage="predict",le="1.0"} 3' in text
+    assert 'mediscan_stage_seconds_bucket{stage="predict",le="+Inf"} 4' in text
+    assert 'mediscan_stage_seconds_count{stage="predict"} 4' in text
+    assert "mediscan_cache_hit_rate 0.25" in text
+    assert metrics.snapshot()["predict"]["count"] == 4
@@ -0,0 +1,38 @@
+import pandas as pd
+import pytest
+from sklearn.dummy import DummyClassifier
+from sklearn.feature_extraction.text import CountVectorizer
+from sklearn.preprocessing import LabelEncoder
+
+from model_bundle import BundleError, load_bundle, save_bundle
+from recommendations import RECOMMENDATION_COLUMNS, RecommendationIndex
+
+DISEASES = ["Allergy", "Diabetes", "Malaria"]
+
+
+def _save(root, model):
+    table = pd.DataFrame({"Disease": DISEASES})
+    for col in RECOMMENDATION_COLUMNS:
+        table[col] = [[disease] for disease in DISEASES] if col in ("Medication", "Diet") else "-"
+    return save_bundle(
+        model,
+        CountVectorizer().fit(["itching cough fever"]),
+        LabelEncoder().fit(DISEASES),
+        RecommendationIndex(table),
+        root=str(root),
+    )
+
+
+def test_model_with_the_wrong_classes_is_never_served(tmp_path):
+    _save(tmp_path, DummyClassifier().fit([[0], [1]], [0, 1]))
+    bundle = load_bundle(str(tmp_path))
+    for _ in range(2):
+        with pytest.raises(BundleError, match="model predicts 2 classes, manifest says 3"):
+            bundle.model
+    assert len(bundle.label_encoder.classes_) == 3
+
+
+def test_model_without_classes_is_rejected(tmp_path):
+    _save(tmp_path, {"not": "a model"})
+    with pytest.raises(BundleError, match="model predicts no classes"):
+        load_bundle(str(tmp_path)).model
@@ -0,0 +1,66 @@
+import os
+
+import numpy as np
+import pandas as pd
+from sklearn.dummy import DummyClassifier
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.feature_extraction.text import CountVectorizer
+from sklearn.preprocessing import LabelEncoder
+
+from model_bundle import save_bundle
+from online_update import DEFAULT_MAX_FOREST_SIZE, OnlineUpdater, records_to_examples, update_member
+from record_store import RECORD_COLUMNS, CsvRecordStore
+from recommendations import RECOMMENDATION_COLUMNS, RecommendationIndex
+
+DISEASES = ["Diabetes ", "Malaria", "Peptic ulcer diseae"]
+
+
+def _row(disease, confirmed=""):
+    record = dict.fromkeys(RECORD_COLUMNS, "")
+    record.update({"Symptoms": "itching, cough", "Predicted Disease": disease, "Confirmed Diagnosis": confirmed})
+    return [record[col] for col in RECORD_COLUMNS]
+
+
+def _versions(root):
+    return sorted(name for name in os.listdir(root) if os.path.isdir(os.path.join(root, name)))
+
+
+def test_confirmed_labels_are_matched_on_the_disease_key():
+    encoder = LabelEncoder().fit(DISEASES)
+    rows = [_row("Malaria", "Diabetes"), _row("Malaria", " Peptic ulcer disease "), _row("Malaria"), _row("Malaria", "Flu")]
+    symptom_sets, labels, skipped = records_to_examples(rows, encoder)
+    assert list(encoder.classes_[labels]) == ["Diabetes ", "Peptic ulcer diseae"]
+    assert skipped == 2
+
+
+def test_forest_is_capped_by_default():
+    X, y = np.eye(4), np.array([0, 1, 0, 1])
+    forest = RandomForestClassifier(n_estimators=DEFAULT_MAX_FOREST_SIZE - 5, random_state=0).fit(X, y)
+    update_member(forest, X, y, trees_per_update=10)
+    assert len(forest.estimators_) == DEFAULT_MAX_FOREST_SIZE
+
+
+def test_records_without_confirmed_diagnoses_publish_no_bundle(tmp_path):
+    root = str(tmp_path / "models")
+    table = pd.DataFrame({"Disease": DISEASES})
+    for col in RECOMMENDATION_COLUMNS:
+        table[col] = [[disease] for disease in DISEASES] if col in ("Medication", "Diet") else "-"
+    save_bundle(DummyClassifier().fit([[0], [1], [2]], [0, 1, 2]), CountVectorizer().fit(["itching cough"]),
+                LabelEncoder().fit(DISEASES), RecommendationIndex(table), root=root)
+    store = CsvRecordStore(str(tmp_path / "records.csv"))
+    record = dict(zip(RECORD_COLUMNS, _row("Malaria")))
+    store.append(record)
+    versions = _versions(root)
+
+    logs = []
+    updater = OnlineUpdater(store, root, log=logs.append)
+    assert updater.step() is None
+    assert _versions(root) == versions
+    assert os.path.exists(updater.position_path)
+    # The skipped record is not read again
+    assert updater.step() is None
+    assert logs == ["No confirmed diagnoses in 1 new record(s); model unchanged"]
+    store.append(record)
+    assert updater.step() is None
+    assert logs[-1] == "No confirmed diagnoses in 1 new record(s); model unchanged"
+    assert _versions(root) == versions
@@ -0,0 +1,57 @@
+from prediction_cache import PredictionCache
+
+
+class _Model:
+    """Counts the symptom sets it is asked about; predicts the joined set."""
+
+    def __init__(self, version="v1"):
+        self.version = version
+        self.calls = []
+
+    def __call__(self, symptom_sets):
+        self.calls.append(symptom_sets)
+        return [f"{self.version}:{'+'.join(symptoms)}" for symptoms in symptom_sets]
+
+
+def test_hits_and_misses_are_counted_on_the_canonical_set():
+    cache = PredictionCache("v1")
+    model = _Model()
+    assert cache.predict([["Cough", "itching"], ["itching", "cough"], ["headache"]], model) == [
+        "v1:cough+itching", "v1:cough+itching", "v1:headache"
+    ]
+    # One batch call, each distinct set once
+    assert model.calls == [[["cough", "itching"], ["headache"]]]
+    assert cache.predict([["cough", " itching", "cough"], ["headache"]], model) == ["v1:cough+itching", "v1:headache"]
+    assert len(model.calls) == 1
+    assert cache.stats() == {"hits": 2, "misses": 3, "hit_rate": 0.4, "size": 2, "maxsize": 4096}
+
+
+def test_new_model_version_is_not_served_old_entries():
+    cache = PredictionCache("v1")
+    old, new = _Model("v1"), _Model("v2")
+    cache.predict([["cough"]], old)
+    assert cache.predict([["cough"]], new, model_version="v2") == ["v2:cough"]
+    assert cache.predict([["cough"]], new, model_version="v2") == ["v2:cough"]
+    assert len(new.calls) == 1
+    assert cache.stats()["misses"] == 2
+
+
+def test_least_recently_used_entries_are_evicted():
+    cache = PredictionCache("v1", maxsize=2)
+    model = _Model()
+    cache.predict([["a"], ["b"]], model)
+    cache.predict([["a"]], model)
+    cache.predict([["c"]], model)
+    assert len(cache) == 2
+    cache.predict([["a"], ["b"]], model)
+    assert model.calls[-1] == [["b"]]
+
+
+def test_warm_skips_cached_sets_and_clear_resets_counts():
+    cache = PredictionCache("v1", maxsize=3)
+    model = _Model()
+    cache.predict([["a"]], model)
+    assert cache.warm([["a"], ["b"], ["B"], ["c"], ["d"]], model) == 3
+    assert model.calls[-1] == [["b"], ["c"], ["d"]]
+    cache.clear()
+    assert len(cache) == 0 and cache.stats()["hits"] == cache.stats()["misses"] == 0
@@ -0,0 +1,111 @@
+import asyncio
+import json
+
+import pytest
+
+from prediction_server import MicroBatcher, PredictionServer, parse_predict_request
+from symptoms import SymptomEncoder
+
+
+def _predict(symptom_sets):
+    if any("explode" in symptoms for symptoms in symptom_sets):
+        raise RuntimeError("model failed")
+    return [{"label": len(symptoms)} for symptoms in symptom_sets]
+
+
+async def _exchange(port, request):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(request)
+    await writer.drain()
+    status_line = await reader.readline()
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    body = await reader.readexactly(int(headers["content-length"]))
+    writer.close()
+    return int(status_line.split()[1]), json.loads(body)
+
+
+def _post(body, content_length=None):
+    length = len(body) if content_length is None else content_length
+    return (f"POST /predict HTTP/1.1\r\nContent-Length: {length}\r\nConnection: close\r\n\r\n").encode() + body
+
+
+class _Live:
+    """Stands in for ``LiveArtifacts``: only the symptom encoder is used by the server itself."""
+
+    version = "test"
+
+    def __init__(self):
+        self.symptom_encoder = SymptomEncoder().fit([["itching", "skin_rash", "cough", "headache", "explode"]])
+
+    def current(self):
+        return self.version, (None, self.symptom_encoder, None, None)
+
+
+def _run(*requests, live=None):
+    async def main():
+        server = await PredictionServer(MicroBatcher(_predict, max_wait_ms=1), port=0, live=live).start()
+        try:
+            return [await _exchange(server.port, request) for request in requests]
+        finally:
+            await server.stop()
+    return asyncio.run(main())
+
+
+@pytest.mark.parametrize("body", [b"5", b"null", b"[]", b'"itching"', b"{not json", b"{}",
+                                  b'{"symptom_sets": 5}', b'{"symptom_sets": [[1, 2]]}',
+                                  b'{"symptoms": {"a": 1}}', b"\xff\xfe", b'{"symptoms": []}',
+                                  b'{"symptoms": " , "}', b'{"symptom_sets": [["cough"], []]}'])
+def test_malformed_body_is_400(body):
+    [(status, payload)] = _run(_post(body))
+    assert status == 400
+    assert payload["error"]
+
+
+@pytest.mark.parametrize("length", ["abc", "-1"])
+def test_invalid_content_length_is_400(length):
+    [(status, payload)] = _run(_post(b"", content_length=length))
+    assert status == 400
+    assert "Content-Length" in payload["error"]
+
+
+def test_prediction_failure_is_500():
+    [(status, payload)] = _run(_post(b'{"symptoms": ["explode"]}'))
+    assert status == 500
+    assert "model failed" in payload["error"]
+
+
+def test_valid_requests_still_predict():
+    responses = _run(_post(b'{"symptoms": ["itching", "skin_rash"]}'),
+                     _post(b'{"symptom_sets": [["cough"], "headache"]}'))
+    assert responses[0] == (200, {"model_version": None, "predictions": [{"label": 2}]})
+    assert responses[1][1]["predictions"] == [{"label": 1}, {"label": 1}]
+
+
+def test_empty_symptom_set_is_400():
+    [(status, payload)] = _run(_post(b'{"symptom_sets": [["cough"], "headache", []]}'))
+    assert status == 400
+    assert "[2]" in payload["error"]
+
+
+def test_unrecognized_symptoms_are_400():
+    live = _Live()
+    responses = _run(_post(b'{"symptoms": ["itchng", "not a symptom"]}'),
+                     _post(b'{"symptom_sets": [["cough"], ["sore elbow", "zzz"]]}'), live=live)
+    assert responses[0] == (200, {"model_version": "test", "predictions": [{"label": 2}]})
+    assert responses[1][0] == 400
+    assert "[1]" in responses[1][1]["error"] and "recognized" in responses[1][1]["error"]
+
+
+def test_comma_separated_symptoms_are_split():
+    assert parse_predict_request(b'{"symptoms": "itching, skin rash"}') == [["itching", "skin rash"]]
+    assert parse_predict_request(b'{"symptom_sets": ["itching", ["cough"], "a,b"]}') == [
+        ["itching"], ["cough"], ["a", "b"]
+    ]
+    [(status, payload)] = _run(_post(b'{"symptoms": "itching, skin_rash"}'))
+    assert payload["predictions"] == [{"label": 2}]
@@ -0,0 +1,90 @@
+import csv
+import os
+
+import pytest
+
+from record_export import RecordExporter
+from record_search import RecordSearchIndex
+from record_store import RECORD_COLUMNS, CsvRecordStore
+
+
+def _record(i, disease="Fungal infection", day=1):
+    return {
+        "Timestamp": f"2026-10-{day:02d} 10:00:{i % 60:02d}",
+        "Patient Name": f"Patient {i}",
+        "Patient Age": 30.0 + i,
+        "Symptoms": "itching, skin_rash",
+        "Predicted Disease": disease,
+        "Medications": "['Antifungal Cream']",
+        "Diet Recommendations": "['Probiotics']",
+        "Workout Recommendations": "Avoid sugary foods",
+        "Precautions": "bath twice",
+    }
+
+
+@pytest.fixture
+def exporter(tmp_path):
+    store = CsvRecordStore(str(tmp_path / "records.csv"))
+    for i in range(6):
+        store.append(_record(i, disease="Malaria" if i % 2 else "Fungal infection", day=1 + i // 2))
+    exporter = RecordExporter(RecordSearchIndex(store), keep=1, chunk_size=2)
+    yield exporter
+    exporter._pool.shutdown(wait=True)
+
+
+def _rows(job):
+    assert job.wait(30) and job.status == "done", job.error
+    with open(job.path, newline="", encoding="utf-8") as f:
+        return list(csv.reader(f))
+
+
+def test_export_applies_the_filters(exporter):
+    rows = _rows(exporter.export("csv"))
+    assert rows[0] == RECORD_COLUMNS
+    assert [row[1] for row in rows[1:]] == [f"Patient {i}" for i in range(6)]
+    # Whole-number ages are written without a trailing ".0"
+    assert rows[1][2] == "30"
+
+    job = exporter.export("csv", term="malaria", start="2026-10-02", end="2026-10-03")
+    assert job.total == 2
+    assert [row[1] for row in _rows(job)[1:]] == ["Patient 3", "Patient 5"]
+    job = exporter.export("csv", diseases=["Fungal infection"], end="2026-10-01")
+    assert [row[1] for row in _rows(job)[1:]] == ["Patient 0"]
+
+    with pytest.raises(ValueError):
+        exporter.export("pdf")
+
+
+def test_repeated_export_reuses_the_file_until_records_change(exporter):
+    first = exporter.export("csv", term="Patient")
+    _rows(first)
+    assert exporter.export("csv", term=" Patient ") is first
+    exporter.index.store.append(_record(6))
+    second = exporter.export("csv", term="Patient")
+    assert second is not first
+    assert len(_rows(second)) == 1 + 7
+
+
+def test_eviction_keeps_files_still_held_by_a_session(exporter):
+    held = exporter.export("csv", term="Patient 1")
+    _rows(held)
+    released = exporter.export("csv", term="Patient 2")
+    _rows(released)
+    released_path = released.path
+    os.utime(released_path, (0, 0))  # oldest on disk, whatever the clock resolution
+    del released
+    latest = exporter.export("csv", term="Patient 3")
+    _rows(latest)
+    assert not os.path.exists(released_path)
+    assert held.available and latest.available
+    assert [row[1] for row in _rows(held)[1:]] == ["Patient 1"]
+
+
+def test_missing_file_is_reported_and_exported_again(exporter):
+    job = exporter.export("csv")
+    _rows(job)
+    os.remove(job.path)
+    assert not job.available
+    again = exporter.export("csv")
+    assert again is not job
+    assert len(_rows(again)) == 1 + 6
@@ -0,0 +1,87 @@
+import multiprocessing
+
+import pytest
+
+from record_search import RecordSearchIndex
+from record_store import CsvRecordStore
+
+
+def _record(i, disease="Fungal infection", age=30):
+    return {
+        "Timestamp": f"2026-10-01 10:{i // 60 % 60:02d}:{i % 60:02d}",
+        "Patient Name": f"Patient {i}",
+        "Patient Age": age,
+        "Symptoms": "itching, skin_rash",
+        "Predicted Disease": disease,
+        "Medications": "['Antifungal Cream']",
+        "Diet Recommendations": "['Probiotics']",
+        "Workout Recommendations": "Avoid sugary foods",
+        "Precautions": "bath twice",
+    }
+
+
+def _expected(index):
+    total, diseases, mean_age = index._conn.execute(
+        "SELECT COUNT(*), COUNT(DISTINCT predicted_disease), AVG(patient_age) FROM records"
+    ).fetchone()
+    return {"total": total, "unique_diseases": diseases, "mean_age": pytest.approx(mean_age)}
+
+
+def _refresh(path):
+    RecordSearchIndex(CsvRecordStore(path)).refresh()
+
+
+def test_summary_follows_appends_and_resets(tmp_path):
+    store = CsvRecordStore(str(tmp_path / "records.csv"))
+    index = RecordSearchIndex(store)
+    assert index.summary() == {"total": 0, "unique_diseases": 0, "mean_age": None}
+
+    for i in range(5):
+        store.append(_record(i, age=20 + i))
+    store.append(_record(5, disease="Malaria", age="unknown"))
+    summary = index.summary()
+    assert summary == _expected(index)
+    assert summary == {"total": 6, "unique_diseases": 2, "mean_age": pytest.approx(22)}
+
+    # Replacing the file makes the next refresh start over
+    (tmp_path / "records.csv").unlink()
+    store = CsvRecordStore(str(tmp_path / "records.csv"))
+    index.store = store
+    store.append(_record(0, disease="Malaria", age=50))
+    assert index.summary() == {"total": 1, "unique_diseases": 1, "mean_age": 50}
+
+
+def test_totals_are_built_for_an_index_created_without_them(tmp_path):
+    store = CsvRecordStore(str(tmp_path / "records.csv"))
+    for i in range(4):
+        store.append(_record(i, disease="Malaria" if i % 2 else "Typhoid", age=40))
+    index = RecordSearchIndex(store)
+    index.refresh()
+    with index._conn as conn:
+        conn.execute("DROP TABLE totals")
+        conn.execute("DROP TABLE disease_counts")
+    index._conn.close()
+
+    index = RecordSearchIndex(store)
+    assert index.summary(refresh=False) == {"total": 4, "unique_diseases": 2, "mean_age": 40}
+
+
+def test_concurrent_refreshes_index_each_record_once(tmp_path):
+    path = str(tmp_path / "records.csv")
+    store = CsvRecordStore(path)
+    for i in range(500):
+        store.append(_record(i, disease=f"Disease {i % 7}", age=i % 90))
+
+    context = multiprocessing.get_context("fork")
+    workers = [context.Process(target=_refresh, args=(path,)) for _ in range(4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(60)
+        assert worker.exitcode == 0
+
+    index = RecordSearchIndex(store)
+    names = [row[0] for row in index._conn.execute("SELECT patient_name FROM records")]
+    assert sorted(names) == sorted(f"Patient {i}" for i in range(500))
+    assert index.summary(refresh=False) == _expected(index)
+    assert index.summary(refresh=False)["total"] == 500
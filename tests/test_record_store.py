@@ -0,0 +1,171 @@
+import csv
+import multiprocessing
+import os
+import time
+
+import pytest
+
+from record_store import _LEGACY_COLUMNS, RECORD_COLUMNS, ArchiveRecordStore, CsvRecordStore, SqliteRecordStore
+
+
+def _record(i, day, disease="Fungal infection", age=30):
+    return {
+        "Timestamp": f"2026-10-{day:02d} 10:00:{i % 60:02d}",
+        "Patient Name": f"Patient {i}",
+        "Patient Age": age,
+        "Symptoms": "itching, skin_rash",
+        "Predicted Disease": disease,
+        "Medications": "['Antifungal Cream', 'Fluconazole']",
+        "Diet Recommendations": "['Probiotics']",
+        "Workout Recommendations": "Avoid sugary foods",
+        "Precautions": "bath twice, keep infected area dry",
+    }
+
+
+def _assert_summary_matches(store, frame):
+    summary = store.summary()
+    assert summary["total"] == len(frame)
+    assert summary["unique_diseases"] == frame["Predicted Disease"].nunique()
+    assert summary["mean_age"] == pytest.approx(frame["Patient Age"].mean())
+    assert summary["by_disease"] == frame["Predicted Disease"].value_counts().to_dict()
+    assert summary["by_day"] == frame["Timestamp"].str[:10].value_counts().sort_index().to_dict()
+
+
+def _segments(store):
+    return sorted(name for name in os.listdir(store.path) if name.startswith("records-"))
+
+
+def _fill(store, days, per_day=3):
+    i = 0
+    for day in days:
+        for n in range(per_day):
+            store.append(_record(i, day, "Acne" if n == 0 else "Fungal infection", age=20 + i))
+            i += 1
+
+
+def test_rollup_matches_records_after_rotation(tmp_path):
+    store = ArchiveRecordStore(str(tmp_path / "records.archive"), "day", auto_compress=False)
+    _fill(store, [1, 2, 3])
+    # Saves only switch segments; compression is left to compress()/rotate()
+    assert _segments(store) == ["records-2026-10-01.csv", "records-2026-10-02.csv", "records-2026-10-03.csv"]
+    store.rotate()
+    assert _segments(store) == ["records-2026-10-01.csv.gz", "records-2026-10-02.csv.gz", "records-2026-10-03.csv"]
+    frame = store.read_all()
+    assert store.count() == len(frame) == 9
+    _assert_summary_matches(store, frame)
+
+
+def test_retention_expires_segments_and_their_totals(tmp_path):
+    store = ArchiveRecordStore(str(tmp_path / "records.archive"), "day", retention=2, auto_compress=False)
+    _fill(store, [1, 2])
+    _, position = store.iter_since(None)
+    _fill(store, [3, 4])
+    assert _segments(store) == ["records-2026-10-03.csv", "records-2026-10-04.csv"]
+    frame = store.read_all()
+    assert store.count() == len(frame) == 6
+    _assert_summary_matches(store, frame)
+    # Readers holding a position from before the expiry start over
+    rows, position = store.iter_since(position)
+    assert position["reset"]
+    while True:
+        more, position = store.iter_since(position)
+        if not more:
+            break
+        rows += more
+    assert len(rows) == 6
+
+
+def test_late_records_go_to_the_newest_segment(tmp_path):
+    store = ArchiveRecordStore(str(tmp_path / "records.archive"), "day", auto_compress=False)
+    store.append(_record(0, 2))
+    store.append(_record(1, 1))
+    assert _segments(store) == ["records-2026-10-02.csv"]
+    assert store.summary()["by_day"] == {"2026-10-01": 1, "2026-10-02": 1}
+
+
+def test_finished_segments_are_compressed_in_the_background(tmp_path):
+    store = ArchiveRecordStore(str(tmp_path / "records.archive"), "day")
+    _fill(store, [1, 2])
+    deadline = time.monotonic() + 10
+    while "records-2026-10-01.csv.gz" not in _segments(store) and time.monotonic() < deadline:
+        time.sleep(0.05)
+    store.compress()  # waits for a compression in progress
+    assert _segments(store) == ["records-2026-10-01.csv.gz", "records-2026-10-02.csv"]
+    assert len(store.read_all()) == store.count() == 6
+
+
+def test_rollup_is_rebuilt_after_an_interrupted_save(tmp_path):
+    store = ArchiveRecordStore(str(tmp_path / "records.archive"), "day", auto_compress=False)
+    _fill(store, [1, 2])
+    store.rotate()
+    # A row written without the rollup update, as if the process died in between
+    with open(os.path.join(store.path, "records-2026-10-02.csv"), "a", newline="", encoding="utf-8") as f:
+        csv.writer(f).writerow([_record(99, 2, "Acne", 50).get(col, "") for col in RECORD_COLUMNS])
+    frame = store.read_all()
+    assert store.count() == len(frame) == 7
+    _assert_summary_matches(store, frame)
+
+
+_STORES = {
+    "csv": lambda tmp_path: CsvRecordStore(str(tmp_path / "records.csv")),
+    "sqlite": lambda tmp_path: SqliteRecordStore(str(tmp_path / "records.db")),
+    "archive": lambda tmp_path: ArchiveRecordStore(str(tmp_path / "records.archive"), "day"),
+}
+_WORKERS = 4
+_PER_WORKER = 60
+
+
+def _append_from_worker(make_store, tmp_path, worker, start):
+    store = make_store(tmp_path)
+    start.wait()
+    for n in range(_PER_WORKER):
+        # Days advance as the workers go, so the archive rolls over between them
+        store.append(_record(worker * _PER_WORKER + n, 1 + n // 20, disease=f"Disease {worker}"))
+    if isinstance(store, ArchiveRecordStore):
+        store.compress()
+
+
+def _run_workers(make_store, tmp_path):
+    context = multiprocessing.get_context("fork")
+    start = context.Event()
+    workers = [
+        context.Process(target=_append_from_worker, args=(make_store, tmp_path, worker, start))
+        for worker in range(_WORKERS)
+    ]
+    for worker in workers:
+        worker.start()
+    start.set()
+    for worker in workers:
+        worker.join(60)
+        assert worker.exitcode == 0
+
+
+@pytest.mark.parametrize("backend", sorted(_STORES))
+def test_concurrent_appends_from_several_processes(tmp_path, backend):
+    _run_workers(_STORES[backend], tmp_path)
+    store = _STORES[backend](tmp_path)
+    frame = store.read_all()
+    expected = sorted(f"Patient {i}" for i in range(_WORKERS * _PER_WORKER))
+    assert sorted(frame["Patient Name"]) == expected
+    assert store.count() == len(expected)
+    assert frame["Predicted Disease"].value_counts().to_dict() == {
+        f"Disease {worker}": _PER_WORKER for worker in range(_WORKERS)
+    }
+    if backend == "archive":
+        _assert_summary_matches(store, frame)
+
+
+def test_concurrent_appends_while_a_legacy_file_is_upgraded(tmp_path):
+    # Every worker finds the old header; one rewrites the file while the others,
+    # holding handles on the old file, wait for the lock
+    path = tmp_path / "records.csv"
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(_LEGACY_COLUMNS)
+        for i in range(-20000, 0):
+            writer.writerow([_record(i, 1).get(col, "") for col in _LEGACY_COLUMNS])
+    _run_workers(_STORES["csv"], tmp_path)
+    frame = CsvRecordStore(str(path)).read_all()
+    assert list(frame.columns) == RECORD_COLUMNS
+    assert frame["Confirmed Diagnosis"].isna().all()
+    assert sorted(frame["Patient Name"]) == sorted(f"Patient {i}" for i in range(-20000, _WORKERS * _PER_WORKER))
@@ -0,0 +1,66 @@
+import numpy as np
+
+from symptoms import SymptomEncoder, SymptomIndex, canonical_symptom_set
+
+
+def test_spellings_of_a_symptom_share_one_column():
+    assert canonical_symptom_set([" skin_rash", "Skin Rash", "dischromic _patches", None, float("nan"), ""]) == (
+        "dischromic_patches", "skin_rash"
+    )
+    encoder = SymptomEncoder().fit([["itching", " skin_rash"], ["dischromic _patches"]])
+    X = encoder.transform([["skin rash", "ITCHING"], ["dischromic_patches", "unknown_symptom"], []])
+    assert list(encoder.get_feature_names_out()) == ["dischromic_patches", "itching", "skin_rash"]
+    assert X.toarray().tolist() == [[0, 1, 1], [1, 0, 0], [0, 0, 0]]
+
+
+def test_pack_round_trips_through_unpackbits():
+    vocabulary = [f"symptom_{i:02d}" for i in range(13)]
+    encoder = SymptomEncoder().fit([vocabulary])
+    symptom_sets = [vocabulary[:1], vocabulary[3:11], vocabulary[-1:], vocabulary, []]
+    packed = encoder.pack(symptom_sets)
+    assert packed.dtype == np.uint8 and packed.shape == (5, 2)
+    unpacked = np.unpackbits(packed, axis=1, count=len(vocabulary))
+    np.testing.assert_array_equal(unpacked, encoder.transform(symptom_sets).toarray())
+
+
+VOCABULARY = ["abdominal_pain", "chills", "cough", "fatigue", "high_fever", "itching", "joint_pain",
+              "skin_rash", "stomach_pain", "vomiting"]
+
+
+def test_index_resolves_ids_and_synonyms():
+    index = SymptomIndex(VOCABULARY)
+    assert index.resolve("Skin Rash") == "skin_rash"
+    assert index.resolve("fever") == "high_fever"
+    assert index.resolve("tiredness") == "fatigue"
+    assert index.resolve("throwing up") == "vomiting"
+    # Synonyms of symptoms outside the vocabulary are not offered
+    assert "dizzy" not in index.terms
+
+
+def test_index_resolves_typos_by_trigram_search():
+    index = SymptomIndex(VOCABULARY)
+    assert index.resolve("itchng") == "itching"
+    assert index.resolve("vomitting") == "vomiting"
+    assert index.resolve("stomache pain") == "stomach_pain"
+    assert index.suggest("coughh")[0] == ("cough", 1)
+    assert index.resolve_all(["fevr", "cough", "", None, "chils"]) == (("chills", "cough", "high_fever"), [])
+
+
+def test_index_rejects_unknown_and_ambiguous_terms():
+    index = SymptomIndex(VOCABULARY)
+    assert index.resolve("sore elbow") is None
+    assert index.resolve("zzz") is None
+    assert index.resolve("") is None
+    assert index.resolve_all(["cough", "not a symptom"]) == (("cough",), ["not a symptom"])
+    # Equally close to two IDs: no guess
+    assert SymptomIndex(["pain_a", "pain_b"]).resolve("pain_c") is None
+    # The encoder uses the index for words outside its vocabulary
+    encoder = SymptomEncoder().fit([VOCABULARY])
+    assert encoder.transform([["itchng", "sore elbow"]]).nnz == 1
+
+
+def test_index_completes_prefixes_of_ids_and_words():
+    index = SymptomIndex(VOCABULARY)
+    assert index.complete("st") == ["stomach_pain"]
+    assert index.complete("pain") == ["abdominal_pain", "joint_pain", "stomach_pain"]
+    assert index.complete("fev") == ["high_fever"]
@@ -0,0 +1,63 @@
+import gc
+import threading
+
+import pandas as pd
+from sklearn.tree import DecisionTreeClassifier
+from sklearn.preprocessing import LabelEncoder
+
+from inference import LiveArtifacts
+from model_bundle import save_bundle
+from prediction_server import WorkerPool
+from recommendations import RECOMMENDATION_COLUMNS, RecommendationIndex
+from symptoms import SymptomEncoder
+
+DISEASES = ["Common Cold", "Fungal infection"]
+
+
+def _save(root):
+    encoder = SymptomEncoder()
+    model = DecisionTreeClassifier().fit(encoder.fit_transform([["cough"], ["itching"]]), [0, 1])
+    table = pd.DataFrame({"Disease": DISEASES})
+    for col in RECOMMENDATION_COLUMNS:
+        table[col] = [[disease] for disease in DISEASES] if col in ("Medication", "Diet") else "-"
+    return save_bundle(model, encoder, LabelEncoder().fit(DISEASES), RecommendationIndex(table), root=str(root))
+
+
+def test_pool_is_not_forked_while_other_threads_run(tmp_path):
+    _save(tmp_path)
+    live = LiveArtifacts("hybrid", bundle_root=str(tmp_path), check_interval=None)
+    stop = threading.Event()
+    other = threading.Thread(target=stop.wait)
+    other.start()
+    frozen = gc.get_freeze_count()
+    try:
+        pool = WorkerPool(live, 1)
+        try:
+            assert pool._pool._mp_context.get_start_method() != "fork"
+            assert gc.get_freeze_count() == frozen
+            assert [p["disease"] for p in pool.predict([["itching"], ["cough"]])] == ["Fungal infection", "Common Cold"]
+        finally:
+            pool.close()
+    finally:
+        stop.set()
+        other.join()
+
+
+def test_fork_unfreezes_objects_frozen_by_an_earlier_start(tmp_path):
+    _save(tmp_path)
+    live = LiveArtifacts("hybrid", bundle_root=str(tmp_path), check_interval=None)
+    garbage = [[] for _ in range(10000)]
+    for item in garbage:
+        item.append(item)  # cycles, so only a collection can free them
+    gc.freeze()
+    del garbage
+    frozen = gc.get_freeze_count()
+    try:
+        pool = WorkerPool(live, 1)
+        try:
+            if pool._pool._mp_context.get_start_method() == "fork":
+                assert gc.get_freeze_count() < frozen
+        finally:
+            pool.close()
+    finally:
+        gc.unfreeze()
@@ -0,0 +1,125 @@
+"""Parallel, cached fitting of the hybrid model's ensemble members.
+
+Each member (random forest, XGBoost, gradient boosting) is fitted in its own
+worker process with a share of the machine's cores, and the fitted member
+is stored under ``.model_cache/`` keyed by a hash of the member's
+parameters and the training data. Re-running training only refits members
+whose parameters or data changed; the rest are loaded from the cache.
+"""
+
+import hashlib
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+
+import joblib
+import numpy as np
+from sklearn.preprocessing import LabelEncoder
+from sklearn.utils import Bunch
+
+MEMBER_CACHE_DIR = ".model_cache"
+
+# Parameters that only change how fast a member trains, not what it learns
+_THREAD_PARAMS = ("n_jobs", "nthread", "verbose")
+
+
+@contextmanager
+def timed(phase, log=print):
+    """Log the wall-clock time of a training phase."""
+    start = time.perf_counter()
+    yield
+    log(f"[{phase}] {time.perf_counter() - start:.2f}s")
+
+
+def _hash_array(digest, array):
+    array = np.ascontiguousarray(array)
+    digest.update(str(array.dtype).encode())
+    digest.update(str(array.shape).encode())
+    digest.update(array.tobytes())
+
+
+def member_cache_key(name, estimator, X, y, sample_weight=None):
+    digest = hashlib.sha256()
+    digest.update(name.encode())
+    digest.update(type(estimator).__qualname__.encode())
+    params = {k: v for k, v in estimator.get_params(deep=False).items() if k not in _THREAD_PARAMS}
+    digest.update(repr(sorted(params.items())).encode())
+    X = X.tocsr()
+    for array in (X.data, X.indices, X.indptr, np.asarray(X.shape), np.asarray(y)):
+        _hash_array(digest, array)
+    if sample_weight is not None:
+        _hash_array(digest, np.asarray(sample_weight))
+    return digest.hexdigest()[:16]
+
+
+def _set_thread_budget(estimator, threads):
+    params = estimator.get_params(deep=False)
+    if "n_jobs" in params:
+        estimator.set_params(n_jobs=threads)
+    elif "nthread" in params:
+        estimator.set_params(nthread=threads)
+    return estimator
+
+
+def _fit_member(name, estimator, X, y, sample_weight):
+    start = time.perf_counter()
+    if sample_weight is None:
+        estimator.fit(X, y)
+    else:
+        estimator.fit(X, y, sample_weight=sample_weight)
+    return name, estimator, time.perf_counter() - start
+
+
+def fit_members(estimators, X, y, sample_weight=None, n_workers=None,
+                cache_dir=MEMBER_CACHE_DIR, use_cache=True, log=print):
+    """Fit ``estimators`` (a list of ``(name, estimator)``) concurrently.
+
+    Returns ``{name: fitted_estimator}`` in the order given.
+    """
+    cpus = os.cpu_count() or 1
+    n_workers = n_workers or min(len(estimators), cpus)
+    threads = max(1, cpus // n_workers)
+
+    fitted = {}
+    pending = []
+    for name, estimator in estimators:
+        key = member_cache_key(name, estimator, X, y, sample_weight)
+        path = os.path.join(cache_dir, f"{name}-{key}.pkl")
+        if use_cache and os.path.exists(path):
+            fitted[name] = joblib.load(path)
+            log(f"[{name}] loaded from cache ({path})")
+        else:
+            pending.append((name, _set_thread_budget(estimator, threads), path))
+
+    if pending:
+        log(f"Fitting {len(pending)} member(s) on {min(n_workers, len(pending))} worker(s), {threads} thread(s) each")
+        if len(pending) == 1 or n_workers == 1:
+            results = [_fit_member(name, est, X, y, sample_weight) for name, est, _ in pending]
+        else:
+            with ProcessPoolExecutor(max_workers=min(n_workers, len(pending))) as pool:
+                futures = [pool.submit(_fit_member, name, est, X, y, sample_weight) for name, est, _ in pending]
+                results = [future.result() for future in futures]
+        paths = {name: path for name, _, path in pending}
+        for name, estimator, seconds in results:
+            log(f"[{name}] fit {seconds:.2f}s")
+            fitted[name] = estimator
+            if use_cache:
+                os.makedirs(cache_dir, exist_ok=True)
+                joblib.dump(estimator, paths[name])
+
+    return {name: fitted[name] for name, _ in estimators}
+
+
+def assemble_voting_classifier(voting_classifier, fitted_members, y):
+    """Populate an unfitted VotingClassifier with already-fitted members.
+
+    ``y`` must be the encoded labels the members were trained on, so the
+    classifier's internal label encoder maps them back unchanged.
+    """
+    names = [name for name, _ in voting_classifier.estimators]
+    voting_classifier.estimators_ = [fitted_members[name] for name in names]
+    voting_classifier.named_estimators_ = Bunch(**{name: fitted_members[name] for name in names})
+    voting_classifier.le_ = LabelEncoder().fit(y)
+    voting_classifier.classes_ = voting_classifier.le_.classes_
+    return voting_classifier
@@ -0,0 +1,205 @@
+"""Budgeted hyperparameter search for the hybrid model's ensemble members.
+
+Each member's candidates (tree count, depth, learning rate) are raced with
+successive halving: every round scores the surviving candidates with
+cross-validation on ``factor`` times more of the training rows than the
+round before, starting from ``--min-fraction``, and keeps the best
+``1 / factor`` of them, so only a few candidates are fitted on all the
+data. The (candidate, fold) fits of a round run in parallel processes.
+The table has only ~200 distinct symptom sets for 41 diseases, so rounds
+much below a third of the rows rank candidates on noise.
+
+A candidate's objective trades accuracy against what it costs to serve::
+
+    objective = accuracy - latency_weight * single-request ms - size_weight * MB
+
+The winners are written to ``model_config.json``, which
+``model_training.py`` reads on its next run::
+
+    python tune.py
+    python tune.py --members gradient_boosting --latency-weight 0.02
+    python tune.py --dry-run
+
+Folds are grouped on the symptom combination, as in ``evaluate.py``;
+otherwise every candidate scores ~99.5% and only the cost terms decide.
+Latency is measured inside the worker that fitted the candidate, so on a
+machine with fewer cores than ``--workers`` it includes contention.
+"""
+
+import argparse
+import json
+import math
+import os
+import sys
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from itertools import product
+
+import numpy as np
+import pandas as pd
+from sklearn.metrics import accuracy_score
+from sklearn.preprocessing import LabelEncoder
+
+from evaluate import inference_cost, make_folds
+from model_training import (DEFAULT_MEMBER_PARAMS, MODEL_CONFIG_PATH, build_symptom_frame, deduplicate, load_tables,
+                            make_member)
+from symptoms import SymptomEncoder
+from train_members import _set_thread_budget, timed
+
+SEARCH_SPACE = {
+    "random_forest": {"n_estimators": [10, 25, 50, 100, 200], "max_depth": [None, 10, 20]},
+    "xgboost": {"n_estimators": [10, 25, 50, 100, 200], "max_depth": [3, 6], "learning_rate": [0.1, 0.3]},
+    "gradient_boosting": {"n_estimators": [10, 25, 50, 100], "max_depth": [2, 3, 5], "learning_rate": [0.1, 0.3]},
+}
+
+
+def candidates(space):
+    """Every combination in a ``{param: [values]}`` grid, as a list of param dicts."""
+    names = list(space)
+    return [dict(zip(names, values)) for values in product(*(space[name] for name in names))]
+
+
+def stratified_subsample(index, y, fraction, rng):
+    """``fraction`` of the rows in ``index``, keeping at least one row of every class."""
+    picked = []
+    for label in np.unique(y[index]):
+        rows = index[y[index] == label]
+        picked.append(rng.choice(rows, max(1, round(fraction * len(rows))), replace=False))
+    return np.sort(np.concatenate(picked))
+
+
+def objective(score, latency_weight, size_weight):
+    return score["accuracy"] - latency_weight * score["single_request_ms"] - size_weight * score["size_mb"]
+
+
+def _score_candidate(name, params, X, y, weight, train, test, threads):
+    estimator = _set_thread_budget(make_member(name, **params), threads)
+    # Labels re-encoded per fold: XGBoost needs contiguous classes and a fold may miss one
+    classes, y_fit = np.unique(y[train], return_inverse=True)
+    with warnings.catch_warnings():
+        # Subsampled rounds have few rows per class, which sklearn flags on every tree
+        warnings.filterwarnings("ignore", message="The number of unique classes is greater than 50%")
+        estimator.fit(X[train], y_fit, sample_weight=weight[train])
+    y_pred = classes[estimator.predict(X[test])]
+    cost = inference_cost(estimator, X[test], requests=50)
+    # Weighted by row multiplicity, so this is accuracy over the original symptom table
+    return {"accuracy": float(accuracy_score(y[test], y_pred, sample_weight=weight[test])),
+            "single_request_ms": cost["single_request_ms"], "size_mb": cost["size_mb"]}
+
+
+def successive_halving(name, grid, X, y, weight, folds, factor=3, min_fraction=1 / 3, n_workers=None,
+                       latency_weight=0.005, size_weight=0.001, random_state=42, log=print):
+    """Race ``grid`` (a list of param dicts) for one member.
+
+    Returns the candidates scored in the final round, best first, each as
+    ``{"params", "accuracy", "single_request_ms", "size_mb", "objective"}``.
+    """
+    cpus = os.cpu_count() or 1
+    n_workers = n_workers or cpus
+    threads = max(1, cpus // n_workers)
+    # Rounds are laid out so the last one uses every training row
+    rounds = max(1, math.ceil(math.log(1 / min_fraction, factor) - 1e-9) + 1)
+    survivors = list(grid)
+    with ProcessPoolExecutor(max_workers=n_workers) as pool:
+        for round_ in range(rounds):
+            fraction = factor ** (round_ - rounds + 1)
+            rng = np.random.default_rng([random_state, round_])
+            # Every candidate of a round sees the same subsample of each fold
+            subsets = [stratified_subsample(train, y, fraction, rng) for train, _ in folds]
+            futures = [
+                [pool.submit(_score_candidate, name, params, X, y, weight, subset, test, threads)
+                 for subset, (_, test) in zip(subsets, folds)]
+                for params in survivors
+            ]
+            results = []
+            for params, fold_futures in zip(survivors, futures):
+                scores = [future.result() for future in fold_futures]
+                result = {"params": params, **{key: float(np.mean([s[key] for s in scores])) for key in scores[0]}}
+                result["objective"] = objective(result, latency_weight, size_weight)
+                results.append(result)
+            results.sort(key=lambda result: result["objective"], reverse=True)
+            best = results[0]
+            log(f"[{name}] round {round_ + 1}/{rounds}: {len(results)} candidate(s) on {fraction:.0%} of rows, "
+                f"best {best['params']} accuracy {best['accuracy']:.4f} {best['single_request_ms']:.2f}ms")
+            if round_ == rounds - 1:
+                return results
+            survivors = [result["params"] for result in results[:max(1, math.ceil(len(results) / factor))]]
+
+
+def tune(members=tuple(SEARCH_SPACE), n_folds=3, factor=3, min_fraction=1 / 3, n_workers=None,
+         latency_weight=0.005, size_weight=0.001, random_state=42, log=print):
+    """Search every member in ``members``; returns ``{member: final_round_results}``."""
+    with timed("prepare", log=log):
+        symptom_frame = build_symptom_frame(load_tables()["symptoms"])
+        y = pd.Series(LabelEncoder().fit_transform(symptom_frame["Disease"]), index=symptom_frame.index)
+        # Searched on distinct (symptom set, disease) rows, weighted by how often each occurs
+        rows, y, weight = deduplicate(symptom_frame["Symptoms"], y)
+        X = SymptomEncoder().fit_transform(rows).tocsr()
+        y = y.to_numpy()
+        folds = make_folds(y, pd.factorize(rows.map(",".join))[0], n_folds, random_state)
+
+    results = {}
+    for name in members:
+        grid = candidates(SEARCH_SPACE[name])
+        with timed(f"{name}: {len(grid)} candidates", log=log):
+            results[name] = successive_halving(name, grid, X, y, weight, folds, factor, min_fraction, n_workers,
+                                               latency_weight, size_weight, random_state, log)
+    return results
+
+
+def write_config(results, path=MODEL_CONFIG_PATH, **search):
+    """Merge the winning params into ``path``; members not searched keep their current params."""
+    config = {}
+    if os.path.exists(path):
+        with open(path) as f:
+            config = json.load(f)
+    member_params, tuned = config.get("members", {}), config.get("tuned", {})
+    for name, ranked in results.items():
+        member_params[name] = ranked[0]["params"]
+        tuned[name] = ranked[0]
+    config.update({
+        "members": member_params,
+        "tuned": tuned,
+        "search": {**search, "updated": datetime.now().isoformat(timespec="seconds")},
+    })
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(config, f, indent=2)
+    os.replace(tmp_path, path)
+    return config
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Tune the MediScan ensemble members with successive halving")
+    parser.add_argument("--members", nargs="+", choices=list(SEARCH_SPACE), default=list(SEARCH_SPACE))
+    parser.add_argument("--folds", type=int, default=3)
+    parser.add_argument("--factor", type=int, default=3, help="Keep 1/factor of the candidates each round")
+    parser.add_argument("--min-fraction", type=float, default=1 / 3,
+                        help="Share of the training rows used in the first round")
+    parser.add_argument("--workers", type=int, default=None, help="Processes fitting candidates (default: one per core)")
+    parser.add_argument("--latency-weight", type=float, default=0.005,
+                        help="Accuracy given up per millisecond of single-request latency")
+    parser.add_argument("--size-weight", type=float, default=0.001, help="Accuracy given up per MB of model size")
+    parser.add_argument("--config", default=MODEL_CONFIG_PATH, help="Config file read by model_training.py")
+    parser.add_argument("--dry-run", action="store_true", help="Print the winners without writing the config")
+    args = parser.parse_args(argv)
+
+    results = tune(args.members, args.folds, args.factor, args.min_fraction, args.workers, args.latency_weight,
+                   args.size_weight)
+    for name, ranked in results.items():
+        print(f"{name} (default {DEFAULT_MEMBER_PARAMS[name]}):")
+        for result in ranked:
+            marker = "*" if result is ranked[0] else " "
+            print(f"  {marker} {result['params']}  accuracy {result['accuracy']:.4f}  "
+                  f"{result['single_request_ms']:.2f}ms  {result['size_mb']:.2f}MB  objective {result['objective']:.4f}")
+    if args.dry_run:
+        return 0
+    write_config(results, args.config, folds=args.folds, factor=args.factor, min_fraction=args.min_fraction,
+                 latency_weight=args.latency_weight, size_weight=args.size_weight)
+    print(f"Wrote the tuned hyperparameters to {args.config}; run model_training.py to retrain with them")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())